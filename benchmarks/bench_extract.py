@@ -0,0 +1,99 @@
+"""
+Сравнение прежнего подсчёта метрик (отдельный find_all на каждый тег)
+с однопроходным extract_page_metrics на больших страницах.
+
+Запуск:
+    python benchmarks/bench_extract.py --cards 2000 --repeat 5
+    python benchmarks/bench_extract.py --pages saved_pages/
+"""
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from page_metrics import extract_page_metrics
+
+
+def legacy_metrics(soup):
+    """Прежний подсчёт из analyze_url"""
+    headings = {}
+    for i in range(1, 7):
+        elements = soup.find_all(f'h{i}')
+        headings[f'h{i}_total'] = len(elements)
+        headings[f'h{i}_non_empty'] = len([el for el in elements if el.get_text(strip=True)])
+    titles = [t for t in soup.find_all('title')
+              if (t.get_text() or '').strip() and not re.search(r'error', t.get_text(), re.IGNORECASE)]
+    descriptions = soup.find_all('meta', attrs={'name': re.compile(r'^description$', re.IGNORECASE)})
+    return headings, len(titles), len(descriptions)
+
+
+def synthetic_page(cards: int) -> bytes:
+    """Страница-листинг в духе /rates: много карточек тарифов с вложенной разметкой"""
+    card = (
+        '<div class="card"><div class="card__head"><h3 class="card__title">Тариф {i}</h3>'
+        '<span class="badge">Хит</span></div><ul class="card__features">'
+        '<li><span>Скорость</span><b>{i}00 Мбит/с</b></li><li><span>ТВ</span><b>{i} каналов</b></li>'
+        '<li><span>Цена</span><b>{i}90 ₽/мес</b></li></ul>'
+        '<a class="btn" href="/orders/tohome?tariff={i}">Подключить</a></div>'
+    )
+    body = ''.join(card.format(i=i) for i in range(cards))
+    html = (
+        '<html><head><title>Тарифы на домашний интернет</title>'
+        '<meta name="description" content="Все тарифы провайдеров"></head>'
+        f'<body><h1>Тарифы</h1><h2>Популярные</h2><section>{body}</section></body></html>'
+    )
+    return html.encode('utf-8')
+
+
+def load_pages(args) -> list:
+    if args.pages:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.pages, '*.htm*'))):
+            with open(path, 'rb') as f:
+                pages.append(f.read())
+        return pages
+    return [synthetic_page(args.cards)]
+
+
+def measure(func, soups, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for soup in soups:
+            func(soup)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк подсчёта метрик страницы')
+    parser.add_argument('--pages', help='Папка с сохранёнными страницами (*.html)')
+    parser.add_argument('--cards', type=int, default=2000, help='Число карточек в синтетической странице')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    if not pages:
+        print('Нет страниц для замера')
+        return
+    size_kb = sum(len(p) for p in pages) / 1024
+
+    start = time.perf_counter()
+    soups = [BeautifulSoup(p, 'html.parser') for p in pages]
+    build = time.perf_counter() - start
+
+    legacy = measure(legacy_metrics, soups, args.repeat)
+    single = measure(extract_page_metrics, soups, args.repeat)
+
+    print(f'Страниц: {len(pages)}, объём: {size_kb:.0f} КБ')
+    print(f'Построение дерева (html.parser): {build * 1000:.1f} мс')
+    print(f'Подсчёт, прежний (8 обходов):    {legacy * 1000:.1f} мс')
+    print(f'Подсчёт, один проход:            {single * 1000:.1f} мс  (x{legacy / single:.1f})')
+    print(f'Всего на страницу: {(build + legacy) * 1000:.1f} мс -> {(build + single) * 1000:.1f} мс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Сравнение бэкендов разбора HTML (html.parser, lxml, selectolax) на одних и тех же страницах.
+Каждый бэкенд запускается в отдельном процессе, чтобы пиковая память не смешивалась.
+
+Запуск:
+    python benchmarks/bench_parsers.py --pages saved_pages/ --repeat 3
+    python benchmarks/bench_parsers.py --cards 2000
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_extract import load_pages
+from page_metrics import PARSER_BACKENDS, parse_page_metrics, resolve_parser
+
+
+def max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт КБ, macOS — байты
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def run_backend(parser: str, args, queue):
+    pages = load_pages(args)
+    baseline = max_rss_mb()
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for page in pages:
+            parse_page_metrics(page, parser)
+    elapsed = time.perf_counter() - start
+    queue.put({
+        'parser': parser,
+        'pages_per_sec': len(pages) * args.repeat / elapsed,
+        'peak_rss_mb': max_rss_mb(),
+        'parse_rss_mb': max_rss_mb() - baseline,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк бэкендов разбора HTML')
+    parser.add_argument('--pages', help='Папка с сохранёнными страницами (*.html)')
+    parser.add_argument('--cards', type=int, default=2000, help='Число карточек в синтетической странице')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--parsers', nargs='+', default=list(PARSER_BACKENDS), choices=PARSER_BACKENDS)
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    if not pages:
+        print('Нет страниц для замера')
+        return
+    print(f'Страниц: {len(pages)}, объём: {sum(len(p) for p in pages) / 1024:.0f} КБ, повторов: {args.repeat}')
+    print(f"{'парсер':<12} {'стр/с':>10} {'пик RSS, МБ':>12} {'прирост, МБ':>12}")
+
+    ctx = multiprocessing.get_context('spawn')
+    for name in args.parsers:
+        if resolve_parser(name) != name:
+            print(f'{name:<12} не установлен')
+            continue
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_backend, args=(name, args, queue))
+        process.start()
+        stats = queue.get()
+        process.join()
+        print(f"{name:<12} {stats['pages_per_sec']:>10.2f} {stats['peak_rss_mb']:>12.1f} {stats['parse_rss_mb']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+Сквозной бенчмарк прогона без сети: два локальных HTTP-сервера изображают прод и стейдж
+(синтетические или сохранённые страницы, заданный размер и задержка ответа), через них проходит
+весь конвейер run_sites — загрузка, analyze_url, сравнение пар, локальный файл результатов,
+Google Sheets и Telegram (заглушки). Итог — стр/с, p50/p95 задержки страницы и пиковый RSS;
+он сохраняется в JSON, чтобы сравнивать коммиты между собой.
+
+Запуск:
+    python benchmarks/bench_pipeline.py --pairs 200 --cards 500 --prod-latency 20 --stage-latency 40
+    python benchmarks/bench_pipeline.py --pages saved_pages/ --output bench_new.json --baseline bench_old.json
+"""
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_extract import load_pages
+from bench_parsers import max_rss_mb
+from result_types import PendingParse
+from page_metrics import PARSER_BACKENDS
+from stage_timings import percentile
+import multi_site_analyzer
+
+# Метрики, по которым сравниваются прогоны: True — больше значит лучше
+COMPARED_METRICS = {'pages_per_sec': True, 'latency_p50_ms': False, 'latency_p95_ms': False, 'peak_rss_mb': False}
+
+
+def stage_variant(page: bytes) -> bytes:
+    """Стейдж-версия страницы с одним потерянным заголовком — чтобы в отчёте были различия"""
+    return page.replace(b'<h2>', b'<div>', 1).replace(b'</h2>', b'</div>', 1)
+
+
+def start_server(pages, latency: float) -> ThreadingHTTPServer:
+    """
+    Поднимает сервер на свободном порту: GET /<номер> отдаёт pages[номер % len(pages)] через latency секунд.
+    В конец тела дописывается номер, чтобы страницы не совпадали побайтно и не уходили в ContentMemo.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            try:
+                number = int(self.path.strip('/'))
+                body = pages[number % len(pages)] + f'<!-- {number} -->'.encode()
+            except ValueError:
+                self.send_error(404)
+                return
+            if latency:
+                time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # Очередь accept с запасом: переполнение даёт повтор SYN через секунду и ложный хвост p95
+        request_queue_size = 128
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class StubSheets:
+    """Google Sheets без сети: запоминает только объём записанного"""
+
+    def __init__(self, *args, **kwargs):
+        self.cells = 0
+
+    def batch_update_values(self, spreadsheet_id, data):
+        self.cells += sum(len(row) for block in data for row in block['values'])
+        return {}
+
+    def update_sheet(self, spreadsheet_id, range_name, values):
+        self.cells += sum(len(row) for row in values)
+        return {}
+
+
+class StubBot:
+    """Telegram без сети"""
+
+    bot_token = 'bench'
+    chat_id = 'bench'
+
+    def __init__(self):
+        self.messages = 0
+
+    def send_message(self, message):
+        self.messages += 1
+        return True
+
+    def send_document(self, filename, content, caption=None):
+        self.messages += 1
+        return True
+
+    def close(self):
+        pass
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def run_benchmark(args) -> dict:
+    pages = load_pages(args)
+    prod_server = start_server(pages, args.prod_latency / 1000)
+    stage_server = start_server([stage_variant(page) for page in pages], args.stage_latency / 1000)
+    prod_base = f'http://127.0.0.1:{prod_server.server_address[1]}'
+    stage_base = f'http://127.0.0.1:{stage_server.server_address[1]}'
+
+    # Прогрев вне замера: импорты парсера и первые соединения не должны попадать в p95
+    analyze_url = multi_site_analyzer.analyze_url
+    for url in (f'{prod_base}/0', f'{stage_base}/0'):
+        analyze_url(url, parser=args.parser)
+
+    # Время каждой страницы: обёртка над analyze_url, который вызывает конвейер
+    latencies = []
+
+    def timed_analyze(url, **kwargs):
+        start = time.perf_counter()
+
+        def done(result):
+            latencies.append(time.perf_counter() - start)
+            return result
+
+        result = analyze_url(url, **kwargs)
+        # С пулом разбора страница готова только после разбора в процессе
+        if isinstance(result, PendingParse):
+            return result.then(done)
+        return done(result)
+
+    multi_site_analyzer.analyze_url = timed_analyze
+    multi_site_analyzer.GoogleSheetsServiceAccount = StubSheets
+    multi_site_analyzer.TelegramBot = StubBot
+    multi_site_analyzer.load_site_urls = lambda site: (site['prod'], site['stage'])
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config = {
+            'default_settings': {
+                'max_concurrency': args.concurrency,
+                'per_host_concurrency': args.per_host,
+                'parse_workers': args.parse_workers,
+                'html_parser': args.parser,
+                'upload_to_sheets': True,
+                'save_local': True,
+                'local_format': 'jsonl',
+                'results_dir': workdir,
+            },
+            'sites': {'bench': {
+                'name': 'bench',
+                'prod': [f'{prod_base}/{i}' for i in range(args.pairs)],
+                'stage': [f'{stage_base}/{i}' for i in range(args.pairs)],
+            }},
+        }
+        baseline_rss = max_rss_mb()
+        start = time.perf_counter()
+        results = multi_site_analyzer.run_sites(config=config)
+        elapsed = time.perf_counter() - start
+        # Сводка этапов, которую прогон пишет рядом с локальными результатами
+        stages = {}
+        for path in glob.glob(os.path.join(workdir, '*.summary.json')):
+            with open(path, 'r', encoding='utf-8') as f:
+                stages = json.load(f).get('stages', {})
+
+    prod_server.shutdown()
+    stage_server.shutdown()
+    pairs = results['bench']
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'params': {
+            'pairs': args.pairs, 'page_kb': round(sum(len(p) for p in pages) / len(pages) / 1024, 1),
+            'prod_latency_ms': args.prod_latency, 'stage_latency_ms': args.stage_latency,
+            'parser': args.parser, 'concurrency': args.concurrency, 'per_host': args.per_host,
+            'parse_workers': args.parse_workers,
+        },
+        'elapsed_sec': round(elapsed, 3),
+        'pages': len(latencies),
+        'pages_per_sec': round(len(latencies) / elapsed, 2),
+        'latency_p50_ms': round(percentile(sorted(latencies), 0.5) * 1000, 2),
+        'latency_p95_ms': round(percentile(sorted(latencies), 0.95) * 1000, 2),
+        'peak_rss_mb': round(max_rss_mb(), 1),
+        'run_rss_mb': round(max_rss_mb() - baseline_rss, 1),
+        'errors': sum(1 for r in pairs if r.has_error),
+        'diffs': sum(1 for r in pairs if r.has_diff),
+        'stages': stages,
+    }
+
+
+def print_comparison(report: dict, baseline: dict):
+    print(f"Сравнение с {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '')}):")
+    for name, higher_is_better in COMPARED_METRICS.items():
+        old, new = baseline.get(name), report[name]
+        if not old:
+            continue
+        change = (new - old) / old * 100
+        better = change > 0 if higher_is_better else change < 0
+        print(f"  {name:<16} {old:>10} -> {new:<10} {change:+.1f}% {'лучше' if better else 'хуже' if change else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сквозной бенчмарк прогона на локальных серверах')
+    parser.add_argument('--pages', help='Папка с сохранёнными страницами (*.html)')
+    parser.add_argument('--cards', type=int, default=100, help='Число карточек в синтетической странице')
+    parser.add_argument('--pairs', type=int, default=100, help='Сколько пар прод/стейдж проверить')
+    parser.add_argument('--prod-latency', type=float, default=20, help='Задержка ответа прода, мс')
+    parser.add_argument('--stage-latency', type=float, default=20, help='Задержка ответа стейджа, мс')
+    parser.add_argument('--parser', default='html.parser', choices=PARSER_BACKENDS)
+    parser.add_argument('--concurrency', type=int, default=8, help='default_settings.max_concurrency')
+    parser.add_argument('--per-host', type=int, default=4, help='default_settings.per_host_concurrency')
+    parser.add_argument('--parse-workers', type=int, default=0, help='default_settings.parse_workers')
+    parser.add_argument('--output', default='bench_pipeline.json', help='Куда сохранить результат (JSON)')
+    parser.add_argument('--baseline', help='JSON прошлого замера для сравнения')
+    parser.add_argument('--verbose', action='store_true', help='Не глушить лог конвейера')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    if not load_pages(args):
+        print('Нет страниц для замера')
+        return
+
+    report = run_benchmark(args)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Пар: {args.pairs}, страниц: {report['pages']} за {report['elapsed_sec']} с")
+    print(f"{report['pages_per_sec']} стр/с, p50 {report['latency_p50_ms']} мс, p95 {report['latency_p95_ms']} мс, "
+          f"пик RSS {report['peak_rss_mb']} МБ (прирост {report['run_rss_mb']} МБ)")
+    print(f"Ошибок: {report['errors']}, пар с разницей: {report['diffs']}; результат в {args.output}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            print_comparison(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+import time
+import asyncio
+import logging
+import multiprocessing
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, List, Dict, Any, Tuple, Optional, Awaitable, AsyncIterator
+from urllib.parse import urlsplit
+
+from result_types import PendingParse
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию, если в sites_config.json ничего не задано
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_PER_HOST_CONCURRENCY = 2
+# Процессов-разборщиков (0 — разбор в потоке загрузки, как раньше)
+DEFAULT_PARSE_WORKERS = 0
+
+# (результат, время начала, время окончания) одного запуска analyze
+Timed = Tuple[Dict[str, Any], float, float]
+# Колбэк готовой пары: (номер пары, prod_result, stage_result, время пары)
+PairCallback = Callable[[int, Any, Any, float], None]
+
+
+def pair_time(prod: Timed, stage: Timed) -> float:
+    """Время пары: от старта первой стороны до окончания последней (без ожидания в очереди)"""
+    return max(prod[2], stage[2]) - min(prod[1], stage[1])
+
+
+class FetchEngine:
+    """
+    Асинхронный движок: параллельно запускает analyze_url с общим лимитом и лимитом на хост.
+    С parse_workers > 0 — конвейер: загрузка в пуле потоков, разбор в пуле процессов
+    (BeautifulSoup упирается в GIL). Загруженные тела ждут разбора в очереди на parse_queue_size мест;
+    пока очередь полна, загрузка не отпускает свой слот и новые страницы не качаются.
+    """
+
+    def __init__(self, analyze: Callable[[str], Dict[str, Any]],
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 per_host_concurrency: int = DEFAULT_PER_HOST_CONCURRENCY,
+                 parse_workers: int = DEFAULT_PARSE_WORKERS,
+                 parse_queue_size: Optional[int] = None,
+                 analyze_stage: Optional[Callable[[str], Dict[str, Any]]] = None):
+        """
+        Args:
+            analyze: Функция анализа одной страницы (блокирующая, вызывается в пуле потоков);
+                в режиме конвейера может вернуть PendingParse
+            max_concurrency: Сколько страниц всего может анализироваться одновременно
+            per_host_concurrency: Сколько одновременных запросов допускается к одному хосту
+            parse_workers: Сколько процессов разбирают страницы (0 — без пула процессов)
+            parse_queue_size: Сколько загруженных тел может ждать разбора (по умолчанию 2 * parse_workers)
+            analyze_stage: Функция анализа стейдж-стороны пар (по умолчанию analyze) — например,
+                чтобы различать окружения, когда URL прода и стейджа совпадают
+        """
+        self.analyze = analyze
+        self.analyze_stage = analyze_stage or analyze
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.per_host_concurrency = max(1, int(per_host_concurrency))
+        self.parse_workers = max(0, int(parse_workers))
+        self.parse_queue_size = max(1, int(parse_queue_size or 2 * self.parse_workers or 1))
+        # Время обработки каждой пары (секунды) после последнего analyze_pairs
+        self.pair_timings: List[float] = []
+
+    @classmethod
+    def from_settings(cls, analyze: Callable[[str], Dict[str, Any]],
+                      settings: Optional[Dict[str, Any]] = None,
+                      analyze_stage: Optional[Callable[[str], Dict[str, Any]]] = None) -> 'FetchEngine':
+        """Создаёт движок по блоку default_settings из sites_config.json"""
+        settings = settings or {}
+        return cls(
+            analyze,
+            analyze_stage=analyze_stage,
+            max_concurrency=settings.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+            per_host_concurrency=settings.get('per_host_concurrency', DEFAULT_PER_HOST_CONCURRENCY),
+            parse_workers=settings.get('parse_workers', DEFAULT_PARSE_WORKERS),
+            parse_queue_size=settings.get('parse_queue_size'),
+        )
+
+    def _limited_runner(self, executor: ThreadPoolExecutor,
+                        parse_queue: Optional[asyncio.Queue] = None) -> Callable[[str], Awaitable[Timed]]:
+        """Возвращает корутину-обёртку над analyze с общим лимитом и лимитом на хост"""
+        loop = asyncio.get_running_loop()
+        global_limit = asyncio.Semaphore(self.max_concurrency)
+        host_limits: Dict[str, asyncio.Semaphore] = {}
+
+        async def run_one(url: str, analyze: Optional[Callable[[str], Dict[str, Any]]] = None) -> Timed:
+            host = urlsplit(url).netloc
+            host_limit = host_limits.setdefault(host, asyncio.Semaphore(self.per_host_concurrency))
+            parsed = None
+            # Сначала ждём слот хоста, чтобы не держать общий слот впустую
+            async with host_limit:
+                async with global_limit:
+                    started = time.perf_counter()
+                    result = await loop.run_in_executor(executor, analyze or self.analyze, url)
+                    if parse_queue is not None and isinstance(result, PendingParse):
+                        # Полная очередь держит слоты загрузки: тела не копятся в памяти
+                        parsed = loop.create_future()
+                        await parse_queue.put((result, parsed))
+            if parsed is not None:
+                result = result.complete(await parsed)
+            return result, started, time.perf_counter()
+
+        return run_one
+
+    @staticmethod
+    async def _parse_consumer(queue: asyncio.Queue, pool: ProcessPoolExecutor):
+        """Берёт тела из очереди и отдаёт их процессу-разборщику; ошибка разбора уходит в finish"""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending, parsed = await queue.get()
+            try:
+                outcome = await loop.run_in_executor(pool, pending.func, *pending.args)
+            except Exception as e:
+                outcome = e
+            if not parsed.done():
+                parsed.set_result(outcome)
+            queue.task_done()
+
+    @asynccontextmanager
+    async def _runner(self) -> AsyncIterator[Callable[[str], Awaitable[Timed]]]:
+        """Пулы на время одного запуска: потоки загрузки и, в режиме конвейера, процессы разбора"""
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            if not self.parse_workers:
+                yield self._limited_runner(executor)
+                return
+            # spawn: fork процесса с живыми потоками небезопасен
+            with ProcessPoolExecutor(max_workers=self.parse_workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                queue = asyncio.Queue(maxsize=self.parse_queue_size)
+                consumers = [asyncio.create_task(self._parse_consumer(queue, pool))
+                             for _ in range(self.parse_workers)]
+                try:
+                    yield self._limited_runner(executor, queue)
+                finally:
+                    for consumer in consumers:
+                        consumer.cancel()
+                    await asyncio.gather(*consumers, return_exceptions=True)
+
+    async def analyze_many(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """Анализирует все URL параллельно, результаты возвращаются в порядке urls"""
+        async with self._runner() as run_one:
+            timed = await asyncio.gather(*(run_one(url) for url in urls))
+        return [result for result, _, _ in timed]
+
+    async def analyze_pairs_async(self, urls_prod: List[str], urls_stage: List[str],
+                                  on_pair: Optional[PairCallback] = None) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Обе стороны каждой пары загружаются одновременно и дожидаются друг друга.
+        on_pair(номер пары, prod_result, stage_result, время пары) вызывается сразу по готовности пары.
+        """
+        async with self._runner() as run_one:
+
+            async def run_pair(index: int, prod_url: str, stage_url: str) -> Tuple[Timed, Timed]:
+                prod, stage = await asyncio.gather(run_one(prod_url), run_one(stage_url, self.analyze_stage))
+                if on_pair is not None:
+                    on_pair(index, prod[0], stage[0], pair_time(prod, stage))
+                return prod, stage
+
+            outcomes = await asyncio.gather(*(run_pair(i, p, s)
+                                              for i, (p, s) in enumerate(zip(urls_prod, urls_stage))))
+        self.pair_timings = [pair_time(prod, stage) for prod, stage in outcomes]
+        return [(prod[0], stage[0]) for prod, stage in outcomes]
+
+    def run(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """Синхронная обёртка над analyze_many для вызова из main()"""
+        logger.info(f"Анализирую {len(urls)} URL (параллельно: {self.max_concurrency}, "
+                    f"на хост: {self.per_host_concurrency})")
+        return asyncio.run(self.analyze_many(urls))
+
+    def analyze_pairs(self, urls_prod: List[str], urls_stage: List[str],
+                      on_pair: Optional[PairCallback] = None) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Анализирует пары прод/стейдж, возвращает список (prod_result, stage_result)"""
+        logger.info(f"Анализирую {len(urls_prod)} пар (параллельно: {self.max_concurrency}, "
+                    f"на хост: {self.per_host_concurrency}, процессов разбора: {self.parse_workers})")
+        started = time.perf_counter()
+        pairs = asyncio.run(self.analyze_pairs_async(urls_prod, urls_stage, on_pair))
+        elapsed = time.perf_counter() - started
+        if self.pair_timings:
+            average = sum(self.pair_timings) / len(self.pair_timings)
+            logger.info(f"Пар: {len(pairs)} за {elapsed:.1f} с; время пары в среднем {average:.2f} с, "
+                        f"максимум {max(self.pair_timings):.2f} с")
+        return pairs
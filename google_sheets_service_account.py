@@ -1,12 +1,12 @@
-import os
 import json
+import time
 import logging
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional
 from datetime import datetime
-from google.auth.transport.requests import Request
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from sheets_client import get_sheets_service, DEFAULT_TOKEN_CACHE_FILE
+from rate_limiter import TokenBucket
+from retry_policy import RetryPolicy, RETRY_STATUSES, retry_after_seconds
 
 # Попытка загрузить .env файл (только для Telegram)
 try:
@@ -20,16 +20,39 @@ logger = logging.getLogger(__name__)
 # Области доступа для Google Sheets API
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 
+# Квота Sheets API по умолчанию — 60 запросов в минуту на пользователя
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_MAX_RETRIES = 5
+# Задержка повторов 429/5xx (retry_policy.RETRY_STATUSES): квота считается поминутно, поэтому база больше, чем у страниц
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 64.0
+
 
 class GoogleSheetsServiceAccount:
     """Класс для работы с Google Sheets API через Service Account"""
     
-    def __init__(self, service_account_file: str = 'service-account-key.json', spreadsheet_id: str = '', sheet_name: str = ''):
+    def __init__(self, service_account_file: str = 'service-account-key.json', spreadsheet_id: str = '', sheet_name: str = '',
+                 token_cache_file: Optional[str] = DEFAULT_TOKEN_CACHE_FILE,
+                 requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 max_retries: int = DEFAULT_MAX_RETRIES):
         """
         Инициализация Google Sheets API с Service Account
+
+        Args:
+            requests_per_minute: Бюджет запросов к API в минуту (0 — без ограничения)
+            max_retries: Сколько раз повторять запрос при 429/5xx
         """
         self.spreadsheet_id = spreadsheet_id
         self.sheet_name = sheet_name
+        self.quota = TokenBucket(requests_per_minute / 60.0, 1) if requests_per_minute else None
+        self.max_retries = max_retries
+        self.retry = RetryPolicy(max_retries, BACKOFF_BASE, BACKOFF_MAX)
+        # Статистика для сводки прогона
+        self.requests_sent = 0
+        self.retries = 0
+        self.quota_wait = 0.0
+        # Длительность каждой попытки запроса к API, секунды (для метрик прогона)
+        self.call_latencies: List[float] = []
         
         try:
             # Проверяем существование файла
@@ -57,27 +80,8 @@ class GoogleSheetsServiceAccount:
             # if missing_fields:
             #     raise ValueError(f"В файле Service Account отсутствуют обязательные поля: {', '.join(missing_fields)}")
             #
-            # Создаем credentials
-            service_account_info = {
-                "type": os.getenv("TYPE"),
-                "project_id": os.getenv("PROJECT_ID"),
-                "client_email": os.getenv("CLIENT_EMAIL"),
-                "token_uri": os.getenv("TOKEN_URI"),
-                "private_key": os.getenv("PRIVATE_KEY"),
-                "private_key_id": os.getenv("PRIVATE_KEY_ID"),
-                "client_id": os.getenv("CLIENT_ID"),
-                "auth_uri": os.getenv("AUTH_URI"),
-                "auth_provider_x509_cert_url": os.getenv("AUTH_PROVIDER_X509_CERT_URL"),
-                "client_x509_cert_url": os.getenv("CLIENT_X509_CERT_URL"),
-                "universe_domain": os.getenv("UNIVERSE_DOMAIN"),
-            }
-            print(service_account_info)
-            credentials = service_account.Credentials.from_service_account_info(
-                service_account_info,
-                scopes=['https://www.googleapis.com/auth/spreadsheets']
-            )
-
-            self.service = build('sheets', 'v4', credentials=credentials)
+            # Клиент общий на процесс: discovery, транспорт и токен не создаются заново
+            self.service = get_sheets_service(token_cache_file=token_cache_file)
             logger.info(f"Google Sheets API инициализирован успешно")
             
         except json.JSONDecodeError as e:
@@ -87,6 +91,41 @@ class GoogleSheetsServiceAccount:
             logger.error(f"Ошибка инициализации Google Sheets API: {e}")
             raise
     
+    def execute(self, request):
+        """
+        Выполняет запрос к API в рамках бюджета запросов в минуту;
+        429 и 5xx повторяются с экспоненциальной задержкой и случайным разбросом (full jitter)
+        """
+        attempt = 0
+        while True:
+            if self.quota:
+                self.quota_wait += self.quota.acquire()
+            self.requests_sent += 1
+            started = time.perf_counter()
+            try:
+                result = request.execute()
+            except HttpError as error:
+                self.call_latencies.append(time.perf_counter() - started)
+                status = error.resp.status
+                if status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    raise
+                delay = self.retry.delay(attempt, retry_after_seconds(error.resp.get('retry-after')))
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Google Sheets ответил {status}, повтор {attempt}/{self.max_retries} "
+                               f"через {delay:.1f} с")
+                time.sleep(delay)
+            else:
+                self.call_latencies.append(time.perf_counter() - started)
+                return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests_sent,
+            'retries': self.retries,
+            'quota_wait': round(self.quota_wait, 3),
+        }
+
     def get_sheet_data(self, spreadsheet_id: str, range_name: str) -> List[List[Any]]:
         """
         Получение данных из Google таблицы
@@ -102,8 +141,8 @@ class GoogleSheetsServiceAccount:
             self.authenticate()
         
         try:
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id, range=range_name).execute()
+            result = self.execute(self.service.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id, range=range_name))
             values = result.get('values', [])
             logger.info(f"Получено {len(values)} строк из таблицы")
             return values
@@ -127,15 +166,39 @@ class GoogleSheetsServiceAccount:
             body = {
                 'values': values
             }
-            result = self.service.spreadsheets().values().update(
+            result = self.execute(self.service.spreadsheets().values().update(
                 spreadsheetId=spreadsheet_id, range=range_name,
-                valueInputOption='RAW', body=body).execute()
+                valueInputOption='RAW', body=body))
             logger.info(f"Обновлено {result.get('updatedCells')} ячеек")
             return result
         except HttpError as error:
             logger.error(f"Ошибка обновления данных: {error}")
             return None
     
+    def batch_update_values(self, spreadsheet_id: str, data: List[Dict[str, Any]]):
+        """
+        Обновление нескольких диапазонов одним запросом (values.batchUpdate)
+
+        Args:
+            spreadsheet_id: ID таблицы
+            data: Список {'range': 'Лист1!B2:C3', 'values': [[...], ...]}
+        """
+        if not self.service:
+            self.authenticate()
+
+        try:
+            body = {
+                'valueInputOption': 'RAW',
+                'data': data
+            }
+            result = self.execute(self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=spreadsheet_id, body=body))
+            logger.info(f"Обновлено {result.get('totalUpdatedCells')} ячеек в {len(data)} диапазонах")
+            return result
+        except HttpError as error:
+            logger.error(f"Ошибка пакетного обновления данных: {error}")
+            return None
+
     def append_data(self, spreadsheet_id: str, range_name: str, values: List[List[Any]]):
         """
         Добавление данных в конец Google таблицы
@@ -152,9 +215,9 @@ class GoogleSheetsServiceAccount:
             body = {
                 'values': values
             }
-            result = self.service.spreadsheets().values().append(
+            result = self.execute(self.service.spreadsheets().values().append(
                 spreadsheetId=spreadsheet_id, range=range_name,
-                valueInputOption='RAW', insertDataOption='INSERT_ROWS', body=body).execute()
+                valueInputOption='RAW', insertDataOption='INSERT_ROWS', body=body))
             logger.info(f"Добавлено {len(values)} строк")
             return result
         except HttpError as error:
@@ -0,0 +1,193 @@
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from rate_limiter import HostRateLimiter
+from retry_policy import (RetryPolicy, HostCircuitBreaker, RETRY_STATUSES, is_host_failure, is_transient_error,
+                          retry_after_seconds)
+from stage_timings import record
+
+logger = logging.getLogger(__name__)
+
+# Сколько хостов держим в пуле одновременно (прод + стейдж всех сайтов)
+DEFAULT_POOL_CONNECTIONS = 32
+# Сколько keep-alive соединений держим на один хост
+DEFAULT_POOL_MAXSIZE = 2
+DEFAULT_TIMEOUT = 30
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """Соединение, которое относит время DNS + TCP к этапу connect активного таймера страницы"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            self._connect_time = time.perf_counter() - start
+            record('connect', self._connect_time)
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    """То же для HTTPS; остаток времени connect() после TCP — рукопожатие TLS"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            self._connect_time = time.perf_counter() - start
+            record('connect', self._connect_time)
+
+    def connect(self):
+        self._connect_time = 0.0
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            record('tls', max(0.0, time.perf_counter() - start - self._connect_time))
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter, пулы которого создают соединения с замером connect/tls"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool,
+                                                   'https': TimedHTTPSConnectionPool}
+
+
+class HttpFetcher:
+    """Общий HTTP-клиент с пулом keep-alive соединений для всех анализаторов"""
+
+    def __init__(self, pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 retry: Optional[RetryPolicy] = None,
+                 breaker: Optional[HostCircuitBreaker] = None):
+        """
+        Args:
+            pool_maxsize: Размер пула соединений на один хост
+            pool_connections: Количество хостов, для которых хранятся пулы
+            timeout: Таймаут запроса по умолчанию, секунды
+            retry: Повторы временных сбоев (сброс соединения, 5xx, 429)
+            breaker: Предохранитель, выключающий хост после серии неудач
+        """
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.adapter = TimedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        # Каждый запрос проходит через лимитер своего хоста
+        self.rate_limiter = HostRateLimiter()
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or HostCircuitBreaker()
+        self.retries = 0
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]] = None) -> 'HttpFetcher':
+        """Размер пула на хост совпадает с лимитом параллельности на хост"""
+        settings = settings or {}
+        return cls(pool_maxsize=max(1, int(settings.get('per_host_concurrency', DEFAULT_POOL_MAXSIZE))),
+                   retry=RetryPolicy.from_settings(settings),
+                   breaker=HostCircuitBreaker.from_settings(settings))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET через общую сессию, сигнатура как у requests.get.
+        Сбои соединения, 5xx и 429 повторяются по политике retry (429/503 — не раньше Retry-After);
+        после исчерпания повторов возвращается последний ответ или пробрасывается последняя ошибка.
+        Предохранитель хоста учитывает только запросы, оставшиеся без ответа после всех повторов.
+
+        Raises:
+            HostUnavailable: хост выключен предохранителем
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            self.breaker.check(host)
+            record('wait', self.rate_limiter.acquire(url))
+            try:
+                response = self.session.get(url, **kwargs)
+            except requests.exceptions.RequestException as error:
+                if not is_transient_error(error) or attempt >= self.retry.max_retries:
+                    # Предохранителю — одна неудача на запрос, когда повторы исчерпаны
+                    if is_host_failure(error):
+                        self.breaker.record_failure(host)
+                    raise
+                reason = str(error)
+                retry_after = None
+            else:
+                # Хост ответил: даже постоянный 5xx одной страницы — не отказ хоста
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retry.max_retries:
+                    self.breaker.record_success(host)
+                    return response
+                reason = f'HTTP {response.status_code}'
+                retry_after = retry_after_seconds(response.headers.get('Retry-After'))
+                response.close()
+            delay = self.retry.delay(attempt, retry_after)
+            attempt += 1
+            with self._stats_lock:
+                self.retries += 1
+            logger.warning(f"{url}: {reason}, повтор {attempt}/{self.retry.max_retries} через {delay:.1f} с")
+            # Пауза перед повтором, как и ожидание лимитера, идёт в этап wait
+            record('wait', delay)
+            time.sleep(delay)
+
+    def connection_stats(self) -> Dict[str, int]:
+        """Сколько запросов отправлено и сколько из них ушло по уже открытому соединению"""
+        pools = self.adapter.poolmanager.pools
+        requests_count = 0
+        connections = 0
+        for key in pools.keys():
+            pool = pools[key]
+            requests_count += pool.num_requests
+            connections += pool.num_connections
+        return {
+            'requests': requests_count,
+            'connections': connections,
+            'reused': max(0, requests_count - connections),
+        }
+
+    def log_stats(self):
+        stats = self.connection_stats()
+        reuse = (stats['reused'] / stats['requests'] * 100) if stats['requests'] else 0
+        logger.info(f"HTTP: запросов {stats['requests']}, новых соединений {stats['connections']}, "
+                    f"переиспользовано {stats['reused']} ({reuse:.1f}%), "
+                    f"ожидание лимитера {self.rate_limiter.waited:.1f} с, повторов {self.retries}, "
+                    f"отсечено предохранителем {self.breaker.rejected}")
+        for host, failures in self.breaker.open_hosts().items():
+            logger.warning(f"Хост {host} выключен предохранителем после {failures} ошибок подряд")
+
+    def close(self):
+        self.session.close()
+
+
+_shared_fetcher: Optional[HttpFetcher] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_fetcher(settings: Optional[Dict[str, Any]] = None) -> HttpFetcher:
+    """Возвращает общий на процесс HttpFetcher (создаётся при первом вызове)"""
+    global _shared_fetcher
+    with _shared_lock:
+        if _shared_fetcher is None:
+            _shared_fetcher = HttpFetcher.from_settings(settings)
+        return _shared_fetcher
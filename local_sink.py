@@ -0,0 +1,182 @@
+import os
+import csv
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+
+from result_types import PAIR_COLUMNS, PairResult
+from result_cache import write_json_atomic
+
+# Parquet (опционально): pip install pyarrow
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+SINK_FORMATS = ('jsonl', 'csv', 'parquet')
+DEFAULT_SINK_FORMAT = 'jsonl'
+DEFAULT_RESULTS_DIR = 'results'
+DEFAULT_FLUSH_EVERY = 50
+
+# Поля строки локального файла
+SINK_FIELDS = ['site', 'date', 'prod_url', 'stage_url', *PAIR_COLUMNS, 'prod_error', 'stage_error', 'pair_time']
+
+
+def sink_record(site: str, pair: PairResult) -> Dict[str, Any]:
+    """Плоская запись пары для локального файла"""
+    return dict(zip(SINK_FIELDS, [site, *pair.to_row()[:-2], pair.prod_error, pair.stage_error, pair.pair_time]))
+
+
+class ResultSink(ABC):
+    """
+    Потоковая запись результатов на диск: пары пишутся по мере готовности,
+    буфер сбрасывается в файл каждые flush_every пар, поэтому после падения прогона
+    на диске остаётся всё, кроме последней неполной пачки
+    """
+
+    extension = ''
+
+    def __init__(self, path: str, flush_every: int = DEFAULT_FLUSH_EVERY):
+        self.path = path
+        self.flush_every = max(1, int(flush_every))
+        self.buffer: List[Dict[str, Any]] = []
+        self.written = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, site: str, pair: PairResult):
+        self.buffer.append(sink_record(site, pair))
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.write_batch(self.buffer)
+        self.written += len(self.buffer)
+        self.buffer = []
+
+    @abstractmethod
+    def write_batch(self, records: List[Dict[str, Any]]):
+        """Дописывает пачку записей в файл так, чтобы она пережила падение прогона"""
+
+    @property
+    def summary_path(self) -> str:
+        return f'{os.path.splitext(self.path)[0]}.summary.json'
+
+    def write_summary(self, summary: Dict[str, Any]):
+        """Сводка прогона (например, время этапов) — рядом с файлом результатов, в любом формате"""
+        write_json_atomic(self.summary_path, summary)
+
+    def close(self):
+        self.flush()
+        logger.info(f"Локальные результаты: {self.written} пар в {self.path}")
+
+    def __enter__(self) -> 'ResultSink':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class JsonlSink(ResultSink):
+    """Одна пара — одна строка JSON"""
+
+    extension = 'jsonl'
+
+    def __init__(self, path: str, flush_every: int = DEFAULT_FLUSH_EVERY):
+        super().__init__(path, flush_every)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def write_batch(self, records: List[Dict[str, Any]]):
+        self.file.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class CsvSink(ResultSink):
+    """CSV с заголовком (заголовок пишется только в новый файл)"""
+
+    extension = 'csv'
+
+    def __init__(self, path: str, flush_every: int = DEFAULT_FLUSH_EVERY):
+        super().__init__(path, flush_every)
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=SINK_FIELDS)
+        if is_new:
+            self.writer.writeheader()
+
+    def write_batch(self, records: List[Dict[str, Any]]):
+        self.writer.writerows(records)
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class ParquetSink(ResultSink):
+    """
+    Parquet-датасет: path — папка, каждая пачка — отдельный файл part-NNNNN.parquet.
+    Футер у Parquet пишется в конце файла, поэтому один общий файл после падения не прочитать;
+    готовые части читаются как одна таблица: pyarrow.parquet.read_table(path)
+    """
+
+    extension = 'parquet'
+
+    def __init__(self, path: str, flush_every: int = DEFAULT_FLUSH_EVERY):
+        super().__init__(path, flush_every)
+        self.schema = pa.schema(
+            [('site', pa.string()), ('date', pa.string()), ('prod_url', pa.string()), ('stage_url', pa.string())]
+            + [(name, pa.int32()) for name in PAIR_COLUMNS]
+            + [('prod_error', pa.string()), ('stage_error', pa.string()), ('pair_time', pa.float64())]
+        )
+        os.makedirs(path, exist_ok=True)
+        # При повторном открытии части нумеруются дальше
+        self.parts = sum(1 for name in os.listdir(path) if name.startswith('part-') and name.endswith('.parquet'))
+
+    def write_batch(self, records: List[Dict[str, Any]]):
+        name = f'part-{self.parts:05d}.parquet'
+        part_path = os.path.join(self.path, name)
+        # Файлы с точкой в начале имени read_table пропускает: недописанная часть не попадёт в таблицу
+        tmp_path = os.path.join(self.path, f'.{name}.tmp')
+        pq.write_table(pa.Table.from_pylist(records, schema=self.schema), tmp_path)
+        os.replace(tmp_path, part_path)
+        self.parts += 1
+
+
+SINKS = {'jsonl': JsonlSink, 'csv': CsvSink, 'parquet': ParquetSink}
+
+
+def open_sink(fmt: str, path: str, flush_every: int = DEFAULT_FLUSH_EVERY) -> ResultSink:
+    """Открывает локальный файл результатов нужного формата"""
+    if fmt not in SINKS:
+        raise ValueError(f"Неизвестный формат локальных результатов {fmt!r}, доступны: {', '.join(SINK_FORMATS)}")
+    if fmt == 'parquet' and pa is None:
+        logger.warning(f"pyarrow не установлен, результаты пишутся в {DEFAULT_SINK_FORMAT}")
+        fmt = DEFAULT_SINK_FORMAT
+        path = f'{os.path.splitext(path)[0]}.{fmt}'
+    return SINKS[fmt](path, flush_every)
+
+
+def sink_from_settings(settings: Optional[Dict[str, Any]], run_name: str) -> Optional[ResultSink]:
+    """
+    Локальные результаты включаются default_settings.save_local; формат — local_format,
+    папка — results_dir, размер пачки — local_flush_every. Файл на прогон: <results_dir>/<run_name>.<формат>
+    """
+    settings = settings or {}
+    if not settings.get('save_local'):
+        return None
+    fmt = settings.get('local_format', DEFAULT_SINK_FORMAT)
+    path = os.path.join(settings.get('results_dir', DEFAULT_RESULTS_DIR), f'{run_name}.{fmt}')
+    return open_sink(fmt, path, settings.get('local_flush_every', DEFAULT_FLUSH_EVERY))
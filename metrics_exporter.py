@@ -0,0 +1,169 @@
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from stage_timings import TIMING_STAGES
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'links_inspector'
+# Границы корзин гистограмм, секунды (стандартные корзины Prometheus + таймаут запроса)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FETCH_STAGES = tuple(name for name in TIMING_STAGES if name not in ('parse', 'count'))
+PARSE_STAGES = ('parse', 'count')
+
+# Имя -> (тип, описание). Файл переписывается каждым прогоном с нуля, поэтому количества — gauge
+# со значением за последний прогон: counter выглядел бы сбросом на каждом прогоне и ломал rate()/increase()
+METRICS = {
+    'last_run_pages': ('gauge', 'Проверено страниц за последний прогон'),
+    'last_run_page_errors': ('gauge', 'Страниц с ошибкой за последний прогон, по типу ошибки'),
+    'last_run_page_bytes': ('gauge', 'Байт тела страниц за последний прогон'),
+    'last_run_cache_hits': ('gauge', 'Результатов без разбора за последний прогон: 304, то же тело, память разборов'),
+    'fetch_seconds': ('histogram', 'Загрузка страницы: лимитер, соединение, ответ и тело'),
+    'parse_seconds': ('histogram', 'Разбор страницы и подсчёт метрик'),
+    'api_call_seconds': ('histogram', 'Запросы к Google Sheets и Telegram'),
+    'run_duration_seconds': ('gauge', 'Длительность прогона'),
+    'last_run_timestamp_seconds': ('gauge', 'Время окончания прогона (unix)'),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus: накопительные корзины, сумма и количество"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: Labels) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(labels, ("le", format_value(bound)))} {cumulative}')
+        lines.append(f'{name}_bucket{format_labels(labels, ("le", "+Inf"))} {self.count}')
+        lines.append(f'{name}_sum{format_labels(labels)} {format_value(self.sum)}')
+        lines.append(f'{name}_count{format_labels(labels)} {self.count}')
+        return lines
+
+
+class RunMetrics:
+    """
+    Метрики прогона для textfile collector node_exporter: файл переписывается целиком в конце прогона
+    (атомарно, через переименование), все значения — за этот прогон.
+    Страничные метрики размечены сайтом (ключ из sites_config.json) и окружением (prod/stage).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.values: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]] = None) -> Optional['RunMetrics']:
+        """Включается default_settings.metrics_file (например, /var/lib/node_exporter/links_inspector.prom)"""
+        path = (settings or {}).get('metrics_file')
+        return cls(path) if path else None
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, labels: Dict[str, str], value: float):
+        with self._lock:
+            self.values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, labels: Dict[str, str], value: float):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def observe_page(self, site: str, env: str, result: Dict[str, Any]):
+        """Учитывает результат analyze_url (с timings и fetch)"""
+        labels = {'site': site, 'env': env}
+        fetch = result.get('fetch') or {}
+        timings = result.get('timings') or {}
+        self.inc('last_run_pages', labels)
+        self.inc('last_run_page_bytes', labels, fetch.get('bytes', 0))
+        if result.get('error'):
+            self.inc('last_run_page_errors', {**labels, 'type': fetch.get('error_type') or 'unknown'})
+        if fetch.get('cache'):
+            self.inc('last_run_cache_hits', {**labels, 'kind': fetch['cache']})
+        if timings:
+            self.observe('fetch_seconds', labels, sum(timings.get(name, 0.0) for name in FETCH_STAGES))
+            self.observe('parse_seconds', labels, sum(timings.get(name, 0.0) for name in PARSE_STAGES))
+
+    def observe_calls(self, service: str, latencies: Iterable[float]):
+        for latency in latencies:
+            self.observe('api_call_seconds', {'service': service}, latency)
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            values = self.values.get(name, {})
+            histograms = self.histograms.get(name, {})
+            if not values and not histograms:
+                continue
+            full_name = f'{METRIC_PREFIX}_{name}'
+            lines.append(f'# HELP {full_name} {description}')
+            lines.append(f'# TYPE {full_name} {kind}')
+            for labels, value in sorted(values.items()):
+                lines.append(f'{full_name}{format_labels(labels)} {format_value(value)}')
+            for labels, histogram in sorted(histograms.items()):
+                lines.extend(histogram.lines(full_name, labels))
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        """Записывает файл атомарно: collector не должен увидеть его недописанным"""
+        finished = time.time()
+        self.set('run_duration_seconds', {}, round(finished - self.started, 3))
+        self.set('last_run_timestamp_seconds', {}, round(finished))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Collector читает только *.prom, поэтому временный файл рядом он не подхватит
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+        logger.info(f"Метрики прогона записаны в {self.path}")
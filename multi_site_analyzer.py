@@ -1,16 +1,30 @@
-import os
-import sys
-import logging
-import requests
-import time
+import io
 import re
+import csv
+import gzip
+import logging
+import argparse
+from html import escape
 from datetime import datetime
-from typing import List, Dict, Any
-from bs4 import BeautifulSoup
-from google_sheets_service_account import GoogleSheetsServiceAccount
-from links.links_doc import urls_prod, urls_stage
+from functools import partial
+from typing import List, Dict, Any, Optional, Union, Callable
+from google_sheets_service_account import GoogleSheetsServiceAccount, DEFAULT_REQUESTS_PER_MINUTE
 from config import SPREADSHEET_ID
 from telegram_bot import TelegramBot
+from site_config import load_sites_config, get_default_settings, get_analysis_settings, load_site_urls
+from fetch_engine import FetchEngine
+from http_fetcher import get_shared_fetcher
+from page_metrics import DEFAULT_PARSER, PARSER_BACKENDS, resolve_parser
+from page_analyzer import analyze_url, DownloadLimits
+from result_cache import ValidatorCache, ContentMemo
+from result_types import PageMetrics, PairResult, PendingParse, as_pair_result
+from pair_batch import PairBatch
+from sheet_writer import IncrementalSheetWriter
+from run_history import RunHistory, DEFAULT_HISTORY_FILE
+from local_sink import sink_from_settings
+from run_journal import RunJournal, run_signature
+from stage_timings import TimingSummary
+from metrics_exporter import RunMetrics
 
 # Настройка логирования
 logging.basicConfig(
@@ -24,71 +38,28 @@ logger = logging.getLogger(__name__)
 # Укажи путь к своему сервис-аккаунту и ID таблицы
 SERVICE_ACCOUNT_FILE = 'service-account-key.json'
 # SPREADSHEET_ID берется из config
-SHEET_NAME = 'Лист1'  # Имя листа для результатов
+SHEET_NAME = 'Лист1'  # Лист по умолчанию, если у сайта не задан sheet_name
+REPORT_TITLE = 'SEO Links Inspector'  # Заголовок отчёта, если у сайта не задан report_title
+# Заголовок таблицы (столбцы в порядке PairResult.to_row)
+SHEET_HEADER = [
+    'Дата',
+    'Prod URL', 'Stage URL',
+    # Headings
+    'Prod H1', 'Prod H2', 'Prod H3', 'Prod H4', 'Prod H5', 'Prod H6', 'Prod Total', 'Prod Total All',
+    'Stage H1', 'Stage H2', 'Stage H3', 'Stage H4', 'Stage H5', 'Stage H6', 'Stage Total', 'Stage Total All',
+    'H1 diff', 'H2 diff', 'H3 diff', 'H4 diff', 'H5 diff', 'H6 diff', 'Total diff',
+    # Title
+    'Prod Title', 'Prod Title All', 'Stage Title', 'Stage Title All', 'Title diff',
+    # Description
+    'Prod Description', 'Prod Description All', 'Stage Description', 'Stage Description All', 'Description diff',
+    # Errors
+    'Prod error', 'Stage error'
+]
+# Сколько ошибок/различий перечислять в тексте отчёта; полный список уходит вложением
+REPORT_LIST_LIMIT = 10
 
 
 # ====== ФУНКЦИИ ======
-def analyze_url(url: str) -> Dict[str, Any]:
-    """Анализирует страницу: h1-h6, title, description (все и непустые без 'error')."""
-    result = {
-        'url': url,
-        'status': 'error',
-        'error': None,
-        'headings': {},
-        'seo': {},
-    }
-    try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # Заголовки h1-h6
-        headings = {}
-        for i in range(1, 7):
-            tag = f'h{i}'
-            elements = soup.find_all(tag)
-            total = len(elements)
-            non_empty = len([el for el in elements if el.get_text(strip=True)])
-            headings[f'{tag}_total'] = total
-            headings[f'{tag}_non_empty'] = non_empty
-        headings['total_headings'] = sum(headings[f'h{i}_non_empty'] for i in range(1, 7))
-
-        # Title
-        title_elements = soup.find_all('title')
-        title_total = len(title_elements)
-        title_non_empty = 0
-        for t in title_elements:
-            text = t.get_text() if t else ''
-            if text is None:
-                text = ''
-            text = text.strip()
-            if text and not re.search(r'error', text, re.IGNORECASE):
-                title_non_empty += 1
-
-        # Description (meta name=description, регистронезависимо)
-        description_elements = soup.find_all('meta', attrs={'name': re.compile(r'^description$', re.IGNORECASE)})
-        description_total = len(description_elements)
-        description_non_empty = 0
-        for m in description_elements:
-            content = m.get('content') or ''
-            content = content.strip()
-            if content and not re.search(r'error', content, re.IGNORECASE):
-                description_non_empty += 1
-
-        result['status'] = 'success'
-        result['headings'] = headings
-        result['seo'] = {
-            'title_total': title_total,
-            'title_non_empty': title_non_empty,
-            'description_total': description_total,
-            'description_non_empty': description_non_empty,
-        }
-    except Exception as e:
-        result['error'] = str(e)
-        logger.error(f"Ошибка анализа {url}: {e}")
-    return result
-
-
 def compare_headings(prod: Dict[str, Any], stage: Dict[str, Any]) -> Dict[str, Any]:
     """Сравнивает количество заголовков между прод и стейдж, а также title/description (непустые)."""
     comparison = {}
@@ -112,191 +83,347 @@ def compare_headings(prod: Dict[str, Any], stage: Dict[str, Any]) -> Dict[str, A
     return comparison
 
 
-def save_to_google_sheets(results: List[Dict[str, Any]]):
-    """Сохраняет результаты в Google Sheets"""
-    sheets = GoogleSheetsServiceAccount(SERVICE_ACCOUNT_FILE)
-    # Формируем данные для записи
-    header = [
-        'Дата',
-        'Prod URL', 'Stage URL',
-        # Headings
-        'Prod H1', 'Prod H2', 'Prod H3', 'Prod H4', 'Prod H5', 'Prod H6', 'Prod Total', 'Prod Total All',
-        'Stage H1', 'Stage H2', 'Stage H3', 'Stage H4', 'Stage H5', 'Stage H6', 'Stage Total', 'Stage Total All',
-        'H1 diff', 'H2 diff', 'H3 diff', 'H4 diff', 'H5 diff', 'H6 diff', 'Total diff',
-        # Title
-        'Prod Title', 'Prod Title All', 'Stage Title', 'Stage Title All', 'Title diff',
-        # Description
-        'Prod Description', 'Prod Description All', 'Stage Description', 'Stage Description All', 'Description diff',
-        # Errors
-        'Prod error', 'Stage error'
-    ]
-    rows = [header]
+def analyze_page(url: str, observer: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 **kwargs) -> Union[PageMetrics, PendingParse]:
+    """
+    analyze_url + сжатие результата в PageMetrics, чтобы до конца прогона не держать словари.
+    observer получает полный словарь результата (например, для метрик прогона).
+    Если разбор отложен в пул процессов (defer_parse), сжатие выполнится после него.
+    """
+    result = analyze_url(url, **kwargs)
+    if isinstance(result, PendingParse):
+        return result.then(partial(page_from_result, observer=observer))
+    return page_from_result(result, observer)
+
+
+def page_from_result(result: Dict[str, Any],
+                     observer: Optional[Callable[[Dict[str, Any]], None]] = None) -> PageMetrics:
+    if observer is not None:
+        observer(result)
+    return PageMetrics.from_result(result)
+
+
+def save_to_google_sheets(results: List[Union[PairResult, Dict[str, Any]]], sheet_name: str = SHEET_NAME,
+                          sheets: Optional[GoogleSheetsServiceAccount] = None,
+                          spreadsheet_id: Optional[str] = None,
+                          writer: Optional[IncrementalSheetWriter] = None):
+    """
+    Сохраняет результаты в Google Sheets (клиент sheets можно передать общий на все сайты).
+    С writer лист только ставится в очередь: отправка всех листов — в writer.flush().
+    Без него лист сразу переписывается с A1.
+    """
+    if writer is not None:
+        sheets = writer.sheets
+    if sheets is None:
+        sheets = GoogleSheetsServiceAccount(SERVICE_ACCOUNT_FILE)
+    rows = [SHEET_HEADER]
     for item in results:
-        row = [
-            item['date'],
-            item['prod_url'],
-            item['stage_url'],
-            # Headings
-            item['prod_h1'],
-            item['prod_h2'],
-            item['prod_h3'],
-            item['prod_h4'],
-            item['prod_h5'],
-            item['prod_h6'],
-            item['prod_total'],
-            item['prod_total_all'],
-            item['stage_h1'],
-            item['stage_h2'],
-            item['stage_h3'],
-            item['stage_h4'],
-            item['stage_h5'],
-            item['stage_h6'],
-            item['stage_total'],
-            item['stage_total_all'],
-            item['h1_diff'],
-            item['h2_diff'],
-            item['h3_diff'],
-            item['h4_diff'],
-            item['h5_diff'],
-            item['h6_diff'],
-            item['total_diff'],
-            # Title
-            item['prod_title'],
-            item['prod_title_all'],
-            item['stage_title'],
-            item['stage_title_all'],
-            item['title_diff'],
-            # Description
-            item['prod_description'],
-            item['prod_description_all'],
-            item['stage_description'],
-            item['stage_description_all'],
-            item['description_diff'],
-            # Errors
-            item['prod_error'],
-            item['stage_error'],
-        ]
-        rows.append(row)
-    range_name = f"{SHEET_NAME}!A1"
-    sheets.update_sheet(SPREADSHEET_ID, range_name, rows)
-    logger.info(f"Результаты записаны в Google Sheets (лист {SHEET_NAME})")
+        rows.append(as_pair_result(item).to_row())
+    if writer is not None:
+        writer.write(sheet_name, rows)
+        return
+    range_name = f"{sheet_name}!A1"
+    sheets.update_sheet(spreadsheet_id or SPREADSHEET_ID, range_name, rows)
+    logger.info(f"Результаты записаны в Google Sheets (лист {sheet_name})")
+
+
+def pair_links(r: PairResult) -> str:
+    """Строка отчёта со ссылками на пару (URL экранируются для HTML)"""
+    return (f"- <a href='{escape(r.prod_url, quote=True)}'>Prod</a> / "
+            f"<a href='{escape(r.stage_url, quote=True)}'>Stage</a>")
+
 
+def results_csv_gz(results: List[PairResult]) -> bytes:
+    """Все пары в CSV (столбцы как в таблице), сжатые gzip — для вложения в Telegram"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(SHEET_HEADER)
+    writer.writerows(r.to_row() for r in results)
+    return gzip.compress(buffer.getvalue().encode('utf-8'))
 
-def send_telegram_report(results: List[Dict[str, Any]]):
-    """Формирует и отправляет отчёт в Telegram"""
-    bot = TelegramBot()
+
+def send_telegram_report(results: List[Union[PairResult, Dict[str, Any]]], title: str = REPORT_TITLE,
+                         report_link: Optional[str] = None, bot: Optional[TelegramBot] = None,
+                         changed_since_previous: Optional[int] = None):
+    """
+    Формирует и отправляет отчёт в Telegram (бота можно передать общего на все сайты).
+    changed_since_previous — сколько страниц изменилось с прошлого прогона (из истории прогонов).
+    """
+    if bot is None:
+        bot = TelegramBot()
     if not bot.bot_token or not bot.chat_id:
         logger.warning('Не настроен Telegram бот (нет токена или chat_id)')
         return
-    total = len(results)
-    errors = [r for r in results if r['prod_error'] or r['stage_error']]
-    diffs = [r for r in results if any(r[f'h{i}_diff'] != 0 for i in range(1, 7)) or r['total_diff'] != 0 or r['title_diff'] != 0 or r['description_diff'] != 0]
+    # Маски и счётчики по всем парам считаются векторно, по строкам идём только для первых REPORT_LIST_LIMIT
+    batch = PairBatch.from_results(results)
+    summary = batch.summary()
+    errors = batch.rows(batch.error_mask, REPORT_LIST_LIMIT)
+    diffs = batch.rows(batch.diff_mask, REPORT_LIST_LIMIT)
+    attach_csv = summary['errors'] > REPORT_LIST_LIMIT or summary['diffs'] > REPORT_LIST_LIMIT
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    msg = f"<b>SEO Links Inspector</b>\n<i>{timestamp}</i>\n\n"
-    msg += f"Всего пар: <b>{total}</b>\n"
-    msg += f"Ошибок: <b>{len(errors)}</b>\n"
-    msg += f"Пар с разницей: <b>{len(diffs)}</b>\n"
+    lines = [
+        f"<b>{escape(title)}</b>",
+        f"<i>{timestamp}</i>",
+        "",
+        f"📄 Всего пар: <b>{summary['total']}</b>",
+        f"❌ Ошибок: <b>{summary['errors']}</b>",
+        f"📊 Пар с разницей: <b>{summary['diffs']}</b>",
+    ]
+    if changed_since_previous is not None:
+        lines.append(f"🕘 Изменилось с прошлого прогона: <b>{changed_since_previous}</b> стр.")
     if errors:
-        msg += f"\n<b>Ошибки:</b>"
-        for r in errors[:10]:
-            msg += f"\n- <a href='{r['prod_url']}'>Prod</a> / <a href='{r['stage_url']}'>Stage</a>"
-            if r['prod_error']:
-                msg += f"\n  Prod error: {r['prod_error']}"
-            if r['stage_error']:
-                msg += f"\n  Stage error: {r['stage_error']}"
-        if len(errors) > 10:
-            msg += f"\n...ещё {len(errors)-10} ошибок"
+        lines += ["", "<b>Ошибки:</b>"]
+        for r in errors:
+            lines.append(pair_links(r))
+            if r.prod_error:
+                lines.append(f"  Prod error: {escape(r.prod_error)}")
+            if r.stage_error:
+                lines.append(f"  Stage error: {escape(r.stage_error)}")
+        if summary['errors'] > REPORT_LIST_LIMIT:
+            lines.append(f"...и ещё {summary['errors'] - REPORT_LIST_LIMIT} ошибок — полный список во вложении")
     if diffs:
-        msg += f"\n\n<b>Различия:</b>"
-        for r in diffs[:10]:
-            msg += f"\n- <a href='{r['prod_url']}'>Prod</a> / <a href='{r['stage_url']}'>Stage</a>"
-            # Headings diffs
-            for i in range(1, 7):
-                diff = r[f'h{i}_diff']
+        lines += ["", "<b>Различия:</b>"]
+        for r in diffs:
+            lines.append(pair_links(r))
+            # Заголовки
+            for i, diff in enumerate(r.heading_diffs, start=1):
                 if diff != 0:
-                    msg += f"\n  H{i} diff: {diff}"
-            if r['total_diff'] != 0:
-                msg += f"\n  Headings total diff: {r['total_diff']}"
-            # Title/Description diffs
-            if r['title_diff'] != 0:
-                msg += f"\n  Title diff: {r['title_diff']}"
-            if r['description_diff'] != 0:
-                msg += f"\n  Description diff: {r['description_diff']}"
-        if len(diffs) > 10:
-            msg += f"\n...ещё {len(diffs)-10} с разницей"
-        
+                    lines.append(f"  H{i} diff: {diff}")
+            if r.total_diff != 0:
+                lines.append(f"  Headings total diff: {r.total_diff}")
+            # Title/Description
+            if r.title_diff != 0:
+                lines.append(f"  Title diff: {r.title_diff}")
+            if r.description_diff != 0:
+                lines.append(f"  Description diff: {r.description_diff}")
+        if summary['diffs'] > REPORT_LIST_LIMIT:
+            lines.append(f"...и ещё {summary['diffs'] - REPORT_LIST_LIMIT} с разницей — полный список во вложении")
+
         # Сводка по типам различий
-        h_diffs = sum(1 for r in diffs if any(r[f'h{i}_diff'] != 0 for i in range(1, 7)))
-        title_diffs = sum(1 for r in diffs if r['title_diff'] != 0)
-        desc_diffs = sum(1 for r in diffs if r['description_diff'] != 0)
-        msg += f"\n\n<b>Сводка различий:</b>"
-        msg += f"\n📊 Пар с разницей по заголовкам: {h_diffs}"
-        msg += f"\n📝 Пар с разницей по Title: {title_diffs}"
-        msg += f"\n📄 Пар с разницей по Description: {desc_diffs}"
-    msg += "\n\n<i>🤖 Отправлено автоматически</i>"
-    bot.send_message(msg)
-
-
-def main():
-    if len(urls_prod) != len(urls_stage):
-        logger.error('Списки urls_prod и urls_stage должны быть одинаковой длины!')
-        sys.exit(1)
-    results = []
-    for prod_url, stage_url in zip(urls_prod, urls_stage):
-        logger.info(f"Проверяю пару:\n  PROD: {prod_url}\n  STAGE: {stage_url}")
-        prod_result = analyze_url(prod_url)
-        stage_result = analyze_url(stage_url)
-        comparison = compare_headings(prod_result, stage_result)
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        results.append({
-            'date': now,
-            'prod_url': prod_url,
-            'stage_url': stage_url,
-            # Headings
-            'prod_h1': prod_result['headings'].get('h1_non_empty', 0),
-            'prod_h2': prod_result['headings'].get('h2_non_empty', 0),
-            'prod_h3': prod_result['headings'].get('h3_non_empty', 0),
-            'prod_h4': prod_result['headings'].get('h4_non_empty', 0),
-            'prod_h5': prod_result['headings'].get('h5_non_empty', 0),
-            'prod_h6': prod_result['headings'].get('h6_non_empty', 0),
-            'prod_total': prod_result['headings'].get('total_headings', 0),
-            'prod_total_all': sum(prod_result['headings'].get(f'h{i}_total', 0) for i in range(1, 7)),
-            'stage_h1': stage_result['headings'].get('h1_non_empty', 0),
-            'stage_h2': stage_result['headings'].get('h2_non_empty', 0),
-            'stage_h3': stage_result['headings'].get('h3_non_empty', 0),
-            'stage_h4': stage_result['headings'].get('h4_non_empty', 0),
-            'stage_h5': stage_result['headings'].get('h5_non_empty', 0),
-            'stage_h6': stage_result['headings'].get('h6_non_empty', 0),
-            'stage_total': stage_result['headings'].get('total_headings', 0),
-            'stage_total_all': sum(stage_result['headings'].get(f'h{i}_total', 0) for i in range(1, 7)),
-            'h1_diff': comparison['h1_non_empty']['diff'],
-            'h2_diff': comparison['h2_non_empty']['diff'],
-            'h3_diff': comparison['h3_non_empty']['diff'],
-            'h4_diff': comparison['h4_non_empty']['diff'],
-            'h5_diff': comparison['h5_non_empty']['diff'],
-            'h6_diff': comparison['h6_non_empty']['diff'],
-            'total_diff': comparison['total_headings']['diff'],
-            # Title
-            'prod_title': prod_result['seo'].get('title_non_empty', 0),
-            'prod_title_all': prod_result['seo'].get('title_total', 0),
-            'stage_title': stage_result['seo'].get('title_non_empty', 0),
-            'stage_title_all': stage_result['seo'].get('title_total', 0),
-            'title_diff': comparison['title_non_empty']['diff'],
-            # Description
-            'prod_description': prod_result['seo'].get('description_non_empty', 0),
-            'prod_description_all': prod_result['seo'].get('description_total', 0),
-            'stage_description': stage_result['seo'].get('description_non_empty', 0),
-            'stage_description_all': stage_result['seo'].get('description_total', 0),
-            'description_diff': comparison['description_non_empty']['diff'],
-            # Errors
-            'prod_error': prod_result['error'],
-            'stage_error': stage_result['error'],
-        })
-        time.sleep(1)  # чтобы не спамить запросами
-    save_to_google_sheets(results)
-    send_telegram_report(results)
+        lines += [
+            "",
+            "<b>Сводка различий:</b>",
+            f"📊 Пар с разницей по заголовкам: {summary['heading_diffs']}",
+            f"📝 Пар с разницей по Title: {summary['title_diffs']}",
+            f"📄 Пар с разницей по Description: {summary['description_diffs']}",
+        ]
+    if report_link:
+        lines += ["", f"<i> 💥 Ссылка на отчет: {escape(report_link)} </i>"]
+    lines += ["", "<i>🤖 Отправлено автоматически</i>"]
+    # Длинный отчёт бот сам разделит на части по лимиту Telegram
+    bot.send_message('\n'.join(lines))
+    if attach_csv:
+        filename = f"{re.sub(r'[^0-9A-Za-zА-Яа-яЁё_-]+', '_', title).strip('_')}_{datetime.now():%Y%m%d_%H%M%S}.csv.gz"
+        bot.send_document(filename, results_csv_gz(batch.pair_results()),
+                          f"<b>{escape(title)}</b>: все пары ({summary['total']})")
+
+
+def run_sites(site_keys: Optional[List[str]] = None, parser: Optional[str] = None,
+              config: Optional[Dict[str, Any]] = None, resume: bool = False) -> Dict[str, List[PairResult]]:
+    """
+    Проверяет все (или выбранные) сайты из sites_config.json в одном процессе
+
+    Args:
+        site_keys: Ключи сайтов; None — все сайты из конфига
+        parser: Бэкенд разбора HTML вместо default_settings.html_parser
+        config: Уже загруженный sites_config.json
+        resume: Продолжить прерванный прогон по журналу контрольных точек
+
+    Returns:
+        Результаты по парам (PairResult) для каждого сайта
+    """
+    config = config or load_sites_config()
+    settings = get_default_settings(config)
+    sites = config.get('sites', {})
+    site_keys = site_keys or list(sites)
+
+    # Один HTTP-клиент, один движок и общие кэши на все сайты
+    fetcher = get_shared_fetcher(settings)
+    site_urls = {}
+    for key in site_keys:
+        urls_prod, urls_stage = load_site_urls(sites[key])
+        if len(urls_prod) != len(urls_stage):
+            logger.error(f'{key}: списки urls_prod и urls_stage должны быть одинаковой длины!')
+            continue
+        fetcher.rate_limiter.configure_site(sites[key], settings, urls_prod, urls_stage)
+        site_urls[key] = (urls_prod, urls_stage)
+
+    parser = resolve_parser(parser or settings.get('html_parser', DEFAULT_PARSER))
+    cache = ValidatorCache.from_settings(settings)
+    memo = ContentMemo.from_settings(settings)
+    # Метрики для Prometheus (textfile collector): страницы размечены сайтом и окружением
+    metrics = RunMetrics.from_settings(settings)
+    observers = {'prod': None, 'stage': None}
+    if metrics:
+        # Ключ (env, url): у прода и стейджа URL могут совпадать
+        page_sites = {(env, url): key for key, (urls_prod, urls_stage) in site_urls.items()
+                      for env, urls in (('prod', urls_prod), ('stage', urls_stage)) for url in urls}
+
+        def observe(result: Dict[str, Any], env: str):
+            metrics.observe_page(page_sites[(env, result['url'])], env, result)
+
+        observers = {env: partial(observe, env=env) for env in observers}
+    # С parse_workers разбор уходит в пул процессов движка, а загрузка остаётся в потоках
+    analyze = partial(analyze_page, fetcher=fetcher, parser=parser, cache=cache, memo=memo,
+                      limits=DownloadLimits.from_settings(settings),
+                      defer_parse=bool(settings.get('parse_workers')))
+    # Стороны пары анализируются одинаково, но метрики размечаются своим окружением
+    engine = FetchEngine.from_settings(partial(analyze, observer=observers['prod']), settings,
+                                       analyze_stage=partial(analyze, observer=observers['stage']))
+    # Локальный файл результатов: каждая пара пишется сразу, как только готова
+    sink = sink_from_settings(settings, datetime.now().strftime('%Y%m%d_%H%M%S'))
+    # Журнал контрольных точек: с --resume пары, готовые в прерванном прогоне, не проверяются заново
+    journal = RunJournal.from_settings(settings, resume)
+    done = journal.start(run_signature(site_urls, parser), resume) if journal else {}
+    keys = [(key, prod_url, stage_url) for key, (urls_prod, urls_stage) in site_urls.items()
+            for prod_url, stage_url in zip(urls_prod, urls_stage)]
+    todo = [position for position, pair_key in enumerate(keys) if pair_key not in done]
+    finished = dict(done)
+    stage_summary = TimingSummary()
+
+    def on_pair(index: int, prod: PageMetrics, stage: PageMetrics, pair_time: float):
+        site = keys[todo[index]][0]
+        finished[keys[todo[index]]] = (prod, stage, pair_time)
+        stage_summary.add(prod.timings)
+        stage_summary.add(stage.timings)
+        if journal:
+            journal.record(site, prod, stage, pair_time)
+        if sink:
+            sink.write(site, PairResult.from_pages(prod, stage, pair_time))
+
+    # Пары всех сайтов идут одним потоком задач, лимиты на хосты общие
+    try:
+        if sink:
+            # Пары из журнала попадают в файл нового прогона, иначе после --resume он неполон
+            for pair_key in keys:
+                if pair_key in done:
+                    prod, stage, pair_time = done[pair_key]
+                    sink.write(pair_key[0], PairResult.from_pages(prod, stage, pair_time))
+        engine.analyze_pairs([keys[position][1] for position in todo],
+                             [keys[position][2] for position in todo], on_pair)
+        # Где прогон потратил время: сводка по этапам в лог и рядом с локальными результатами
+        stage_summary.log_summary()
+        if sink:
+            sink.write_summary({'pages': stage_summary.pages, 'stages': stage_summary.summary()})
+    finally:
+        if sink:
+            sink.close()
+        if journal:
+            journal.close()
+    pairs = [finished[pair_key][:2] for pair_key in keys]
+    pair_timings = [finished[pair_key][2] for pair_key in keys]
+
+    sheets = None
+    bot = None
+    try:
+        # История прогонов: метрики страниц и сравнение с прошлым прогоном
+        analysis = get_analysis_settings(config)
+        history = RunHistory.from_settings(settings, analysis)
+        run_id = history.start_run(list(site_urls)) if history else None
+        changed_by_site = {}
+
+        results_by_site = {}
+        offset = 0
+        for key, (urls_prod, _) in site_urls.items():
+            site_pairs = pairs[offset:offset + len(urls_prod)]
+            site_timings = pair_timings[offset:offset + len(urls_prod)]
+            offset += len(urls_prod)
+            for (prod, stage), pair_time in zip(site_pairs, site_timings):
+                logger.info(f"Проверена пара за {pair_time:.2f} с:\n  PROD: {prod.url}\n  STAGE: {stage.url}")
+            prod_pages = [prod for prod, _ in site_pairs]
+            stage_pages = [stage for _, stage in site_pairs]
+            if history:
+                history.record_pages(run_id, key, 'prod', prod_pages)
+                history.record_pages(run_id, key, 'stage', stage_pages)
+                if analysis.get('compare_with_previous'):
+                    comparison = (history.compare_with_previous(run_id, key, 'prod', prod_pages)
+                                  + history.compare_with_previous(run_id, key, 'stage', stage_pages))
+                    changed_by_site[key] = sum(1 for page in comparison if page['status'] == 'changed')
+                    new = sum(1 for page in comparison if page['status'] == 'new')
+                    logger.info(f"{key}: с прошлого прогона изменилось страниц {changed_by_site[key]}, новых {new}")
+            # Все пары сайта сравниваются одной векторной операцией
+            batch = PairBatch.from_pages(prod_pages, stage_pages, site_timings)
+            results_by_site[key] = batch.pair_results()
+        if history:
+            logger.info(f"Прогон №{run_id} сохранён в истории {history.path}")
+            history.close()
+
+        # Сводка прогона
+        fetcher.log_stats()
+        if cache:
+            cache.log_stats()
+            cache.save()
+        if memo:
+            memo.log_stats()
+            memo.save()
+
+        if settings.get('upload_to_sheets', True):
+            sheets = GoogleSheetsServiceAccount(
+                settings.get('service_account_file', SERVICE_ACCOUNT_FILE),
+                requests_per_minute=settings.get('sheets_requests_per_minute', DEFAULT_REQUESTS_PER_MINUTE),
+            )
+            # Листы всех сайтов уходят общими запросами batchUpdate
+            writer = IncrementalSheetWriter.from_settings(sheets, SPREADSHEET_ID, settings)
+            for key, results in results_by_site.items():
+                sheet_name = sites[key].get('sheet_name', settings.get('sheet_name', SHEET_NAME))
+                save_to_google_sheets(results, sheet_name, writer=writer)
+            writer.flush()
+            writer.log_stats()
+        bot = TelegramBot()
+        for key, results in results_by_site.items():
+            site = sites[key]
+            send_telegram_report(results, site.get('report_title', site.get('name', REPORT_TITLE)),
+                                 site.get('report_link'), bot, changed_by_site.get(key))
+        if hasattr(bot, 'close'):
+            bot.close()
+    finally:
+        # Метрики пишутся и тогда, когда выгрузка в Sheets или отчёт в Telegram упали
+        if metrics:
+            metrics.observe_calls('sheets', getattr(sheets, 'call_latencies', []))
+            metrics.observe_calls('telegram', getattr(bot, 'call_latencies', []))
+            metrics.write()
+    if journal:
+        journal.complete()
+    return results_by_site
+
+
+def print_changes_since(run_id: int, site_keys: Optional[List[str]] = None,
+                        config: Optional[Dict[str, Any]] = None):
+    """Печатает страницы, изменившиеся в последнем прогоне по сравнению с прогоном run_id"""
+    settings = get_default_settings(config or load_sites_config())
+    history = RunHistory(settings.get('history_file', DEFAULT_HISTORY_FILE))
+    try:
+        changes = [change for site in (site_keys or [None]) for change in history.changed_since(run_id, site)]
+    finally:
+        history.close()
+    for change in changes:
+        if change['status'] == 'new':
+            print(f"[{change['site']}/{change['env']}] {change['url']}: новая страница")
+            continue
+        details = [f"{name} {c['previous']} -> {c['current']}" for name, c in change['changes'].items()]
+        if change['error']['previous'] != change['error']['current']:
+            details.append(f"error {change['error']['previous']!r} -> {change['error']['current']!r}")
+        print(f"[{change['site']}/{change['env']}] {change['url']}: {', '.join(details)}")
+    print(f"Изменилось страниц с прогона №{run_id}: {len(changes)}")
+
+
+def main(argv: Optional[List[str]] = None):
+    config = load_sites_config()
+    sites = list(config.get('sites', {}))
+    arg_parser = argparse.ArgumentParser(description='SEO-инспектор: сравнение прод и стейдж по всем сайтам')
+    arg_parser.add_argument('--sites', nargs='+', choices=sites, help='Какие сайты проверять (по умолчанию все)')
+    arg_parser.add_argument('--parser', choices=PARSER_BACKENDS, help='Бэкенд разбора HTML')
+    arg_parser.add_argument('--changed-since', type=int, metavar='RUN_ID',
+                            help='Не запускать проверку, а показать, что изменилось с прогона RUN_ID')
+    arg_parser.add_argument('--resume', action='store_true',
+                            help='Продолжить прерванный прогон: пары из журнала контрольных точек не проверяются заново')
+    args = arg_parser.parse_args(argv)
+    if args.changed_since is not None:
+        print_changes_since(args.changed_since, args.sites, config)
+        return
+    run_sites(args.sites, args.parser, config, args.resume)
     print('Готово!')
 
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
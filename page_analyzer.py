@@ -0,0 +1,298 @@
+import time
+import logging
+from functools import partial
+from typing import Dict, Any, Optional, Iterable, Iterator, Tuple, Union
+
+import requests
+
+from http_fetcher import HttpFetcher
+from page_metrics import DEFAULT_PARSER, parse_page_metrics, parse_worker, stream_page_metrics
+from result_cache import ValidatorCache, ContentMemo, body_digest, new_body_hasher
+from result_types import PendingParse
+from retry_policy import HostUnavailable
+from stage_timings import StageTimer, timed_chunks
+
+logger = logging.getLogger(__name__)
+
+# Размер куска тела страницы для потокового режима
+STREAM_CHUNK_SIZE = 64 * 1024
+# Ограничения загрузки по умолчанию (default_settings: max_body_bytes, download_deadline,
+# connect_timeout, read_timeout)
+DEFAULT_MAX_BODY_BYTES = 20 * 1024 * 1024
+DEFAULT_DOWNLOAD_DEADLINE = 60
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 30
+
+
+class BodyTooLarge(Exception):
+    """Тело страницы больше max_body_bytes (по Content-Length или по факту)"""
+
+
+class DownloadTruncated(Exception):
+    """Тело не загрузилось целиком за общий дедлайн"""
+
+
+class DownloadLimits:
+    """
+    Ограничения загрузки страницы. connect/read таймауты requests срабатывают на одну операцию сокета,
+    поэтому медленно, но непрерывно отдающий сервер держал бы прогон сколько угодно — deadline ограничивает
+    чтение тела от получения заголовков ответа до конца тела. Ожидание лимитера и паузы между повторами
+    в него не входят: иначе страница, пришедшая целиком, считалась бы обрезанной из-за троттлинга
+    """
+
+    __slots__ = ('max_bytes', 'deadline', 'connect_timeout', 'read_timeout')
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BODY_BYTES, deadline: float = DEFAULT_DOWNLOAD_DEADLINE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT):
+        self.max_bytes = max_bytes
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]] = None) -> 'DownloadLimits':
+        settings = settings or {}
+        return cls(
+            max_bytes=int(settings.get('max_body_bytes', DEFAULT_MAX_BODY_BYTES)),
+            deadline=float(settings.get('download_deadline', DEFAULT_DOWNLOAD_DEADLINE)),
+            connect_timeout=float(settings.get('connect_timeout', DEFAULT_CONNECT_TIMEOUT)),
+            read_timeout=float(settings.get('read_timeout', DEFAULT_READ_TIMEOUT)),
+        )
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        return self.connect_timeout, self.read_timeout
+
+
+DEFAULT_LIMITS = DownloadLimits()
+
+
+def response_encoding(response: requests.Response) -> str:
+    """Кодировка из Content-Type; без явного charset считаем страницу UTF-8"""
+    if 'charset' in response.headers.get('Content-Type', '').lower() and response.encoding:
+        return response.encoding
+    return 'utf-8'
+
+
+def hashed_chunks(chunks: Iterable[bytes], hasher) -> Iterator[bytes]:
+    """Пропускает куски тела дальше, попутно считая их хэш"""
+    for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+
+
+def counted_chunks(chunks: Iterable[bytes], fetch: Dict[str, Any]) -> Iterator[bytes]:
+    """Пропускает куски тела дальше, попутно считая байты"""
+    for chunk in chunks:
+        fetch['bytes'] += len(chunk)
+        yield chunk
+
+
+def check_declared_size(response: requests.Response, limits: DownloadLimits):
+    """Отказывается от тела заранее, если сервер сам объявил его слишком большим"""
+    length = response.headers.get('Content-Length', '')
+    if length.isdigit() and int(length) > limits.max_bytes:
+        raise BodyTooLarge(f"Тело слишком большое: Content-Length {length} > {limits.max_bytes} байт")
+
+
+def bounded_chunks(chunks: Iterable[bytes], limits: DownloadLimits, started: float) -> Iterator[bytes]:
+    """Пропускает куски тела, пока не превышены max_bytes и общий дедлайн (отсчёт от started)"""
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        if total > limits.max_bytes:
+            raise BodyTooLarge(f"Тело слишком большое: больше {limits.max_bytes} байт, загрузка прервана")
+        if time.perf_counter() - started > limits.deadline:
+            raise DownloadTruncated(f"Тело обрезано: загрузка не уложилась в {limits.deadline:g} с "
+                                    f"(получено {total} байт)")
+        yield chunk
+
+
+def read_body(response: requests.Response, limits: DownloadLimits, started: float, timer: StageTimer,
+              fetch: Dict[str, Any]) -> bytes:
+    """Читает тело кусками с ограничениями; на обрыве соединение закрывается, а не возвращается в пул"""
+    if not isinstance(response, requests.Response):
+        # Объекты, похожие на Response, без потокового чтения — тело уже в content
+        with timer.stage('download'):
+            content = response.content
+        fetch['bytes'] = len(content or b'')
+        return content
+    try:
+        check_declared_size(response, limits)
+        chunks = counted_chunks(timed_chunks(response.iter_content(STREAM_CHUNK_SIZE), timer), fetch)
+        return b''.join(bounded_chunks(chunks, limits, started))
+    finally:
+        response.close()
+
+
+def error_kind(error: Exception) -> str:
+    """
+    Короткий тип ошибки для метрик: host_unavailable, too_large, truncated, http_<код>, timeout, connection
+    или имя исключения
+    """
+    if isinstance(error, HostUnavailable):
+        return 'host_unavailable'
+    if isinstance(error, BodyTooLarge):
+        return 'too_large'
+    if isinstance(error, (DownloadTruncated, requests.exceptions.ChunkedEncodingError)):
+        return 'truncated'
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return f'http_{error.response.status_code}'
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection'
+    return type(error).__name__
+
+
+def timed_get(http, url: str, timer: StageTimer, **kwargs) -> requests.Response:
+    """
+    GET с разбивкой времени: лимитер (wait), новое соединение (connect, tls) пишут сами в активный таймер,
+    остаток до заголовков ответа — ttfb
+    """
+    before = timer.get('wait') + timer.get('connect') + timer.get('tls')
+    start = time.perf_counter()
+    response = http.get(url, **kwargs)
+    elapsed = time.perf_counter() - start
+    timer.add('ttfb', max(0.0, elapsed - (timer.get('wait') + timer.get('connect') + timer.get('tls') - before)))
+    return response
+
+
+def analyze_url(url: str, fetcher: Optional[HttpFetcher] = None, parser: str = DEFAULT_PARSER,
+                cache: Optional[ValidatorCache] = None, memo: Optional[ContentMemo] = None,
+                limits: Optional[DownloadLimits] = None,
+                defer_parse: bool = False) -> Union[Dict[str, Any], PendingParse]:
+    """
+    Анализирует страницу: h1-h6, title, description (все и непустые без 'error').
+    memo работает только для парсеров, которым нужно всё тело (не для 'stream').
+    limits ограничивают размер тела и общее время загрузки: при превышении status — 'too_large'
+    или 'truncated' (вместо 'error'), в error — подробности.
+    В result['timings'] — время этапов страницы в секундах (stage_timings.TIMING_STAGES),
+    в result['fetch'] — байты тела, откуда взят результат (cache: not_modified / same_body / memo / None)
+    и тип ошибки (error_type).
+    С defer_parse тело, которое нужно разобрать, не разбирается здесь: возвращается PendingParse
+    для пула процессов FetchEngine, а итоговый словарь получится из его complete().
+    """
+    timer = StageTimer()
+    fetch = {'bytes': 0, 'cache': None, 'error_type': None}
+    with timer.active():
+        result = fetch_and_analyze(url, fetcher, parser, cache, memo, limits or DEFAULT_LIMITS, timer, fetch,
+                                   defer_parse)
+    if isinstance(result, PendingParse):
+        return result.then(partial(with_fetch_info, timer=timer, fetch=fetch))
+    return with_fetch_info(result, timer, fetch)
+
+
+def with_fetch_info(result: Dict[str, Any], timer: StageTimer, fetch: Dict[str, Any]) -> Dict[str, Any]:
+    result['timings'] = timer.as_dict()
+    result['fetch'] = fetch
+    return result
+
+
+def fail_result(result: Dict[str, Any], error: Exception, fetch: Dict[str, Any]) -> Dict[str, Any]:
+    result['error'] = str(error)
+    fetch['error_type'] = error_kind(error)
+    # Слишком большое или обрезанное тело — отдельные состояния, а не просто ошибка
+    if fetch['error_type'] in ('too_large', 'truncated'):
+        result['status'] = fetch['error_type']
+    logger.error(f"Ошибка анализа {result['url']}: {error}")
+    return result
+
+
+def finish_result(result: Dict[str, Any], metrics: Tuple[Dict[str, int], Dict[str, int]],
+                  headers, digest: Optional[str], cache: Optional[ValidatorCache]) -> Dict[str, Any]:
+    result['status'] = 'success'
+    result['headings'], result['seo'] = metrics
+    if cache:
+        cache.store(result['url'], headers, digest, result)
+    return result
+
+
+def deferred_parse(result: Dict[str, Any], content: bytes, parser: str, headers, digest: Optional[str],
+                   cache: Optional[ValidatorCache], memo: Optional[ContentMemo], timer: StageTimer,
+                   fetch: Dict[str, Any]) -> PendingParse:
+    """Разбор тела в пуле процессов; результат разбора дописывается в result так же, как при разборе на месте"""
+
+    def finish(parsed) -> Dict[str, Any]:
+        if isinstance(parsed, Exception):
+            return fail_result(result, parsed, fetch)
+        metrics, (parse_time, count_time) = parsed
+        timer.add('parse', parse_time)
+        timer.add('count', count_time)
+        try:
+            if memo:
+                memo.put(parser, digest, metrics)
+            return finish_result(result, metrics, headers, digest, cache)
+        except Exception as e:
+            return fail_result(result, e, fetch)
+
+    return PendingParse(parse_worker, (content, parser), finish)
+
+
+def fetch_and_analyze(url: str, fetcher: Optional[HttpFetcher], parser: str, cache: Optional[ValidatorCache],
+                      memo: Optional[ContentMemo], limits: DownloadLimits, timer: StageTimer,
+                      fetch: Dict[str, Any], defer_parse: bool = False) -> Union[Dict[str, Any], PendingParse]:
+    result = {
+        'url': url,
+        'status': 'error',
+        'error': None,
+        'headings': {},
+        'seo': {},
+    }
+    try:
+        # Общий пул соединений, если он передан; иначе одиночный запрос
+        http = fetcher or requests
+        # С кэшем запрос условный: If-None-Match / If-Modified-Since
+        headers = cache.request_headers(url) if cache else {}
+        if parser == 'stream':
+            # Тело не собирается целиком: куски сразу уходят в событийный парсер
+            with timed_get(http, url, timer, timeout=limits.timeout, stream=True, headers=headers) as response:
+                # Общий дедлайн загрузки тела отсчитывается от получения заголовков
+                started = time.perf_counter()
+                response.raise_for_status()
+                cached = cache.reuse(url, response.status_code) if cache else None
+                if cached is not None:
+                    fetch['cache'] = 'not_modified'
+                    return cached
+                check_declared_size(response, limits)
+                hasher = new_body_hasher()
+                chunks = bounded_chunks(
+                    counted_chunks(timed_chunks(response.iter_content(STREAM_CHUNK_SIZE), timer), fetch),
+                    limits, started,
+                )
+                # Разбор идёт по мере прихода кусков: в parse — всё, кроме ожидания самих кусков
+                start = time.perf_counter()
+                download_before = timer.get('download')
+                metrics = stream_page_metrics(hashed_chunks(chunks, hasher), response_encoding(response))
+                timer.add('parse', time.perf_counter() - start - (timer.get('download') - download_before))
+                digest = hasher.hexdigest()
+        else:
+            # stream=True отделяет заголовки (ttfb) от чтения тела (download); тело читается сразу целиком
+            response = timed_get(http, url, timer, timeout=limits.timeout, stream=True, headers=headers)
+            started = time.perf_counter()
+            content = read_body(response, limits, started, timer, fetch)
+            response.raise_for_status()
+            digest = None
+            if (cache or memo) and response.status_code != 304:
+                digest = body_digest(content)
+            if cache:
+                # Тело не изменилось — повторно не разбираем
+                cached = cache.reuse(url, response.status_code, digest)
+                if cached is not None:
+                    fetch['cache'] = 'not_modified' if response.status_code == 304 else 'same_body'
+                    return cached
+            # Такой же документ уже разбирался (например, стейдж отдаёт то же, что прод)
+            metrics = memo.get(parser, digest) if memo else None
+            if metrics is not None:
+                fetch['cache'] = 'memo'
+            elif defer_parse:
+                return deferred_parse(result, content, parser, response.headers, digest, cache, memo, timer, fetch)
+            else:
+                # h1-h6, title и description считаются за один проход выбранным парсером
+                metrics = parse_page_metrics(content, parser, timer)
+                if memo:
+                    memo.put(parser, digest, metrics)
+
+        return finish_result(result, metrics, response.headers, digest, cache)
+    except Exception as e:
+        return fail_result(result, e, fetch)
@@ -0,0 +1,256 @@
+import re
+import codecs
+import logging
+from html.parser import HTMLParser
+from typing import Dict, Tuple, Iterable, List, Optional
+
+from bs4 import BeautifulSoup, Tag
+
+from stage_timings import StageTimer
+
+# Быстрый C-парсер (опционально): pip install selectolax
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# lxml нужен BeautifulSoup для бэкенда 'lxml'
+try:
+    import lxml  # noqa: F401
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+HEADING_TAGS = tuple(f'h{i}' for i in range(1, 7))
+# Все теги, которые нужны для метрик: собираются за один обход дерева
+METRIC_TAGS = frozenset(HEADING_TAGS + ('title', 'meta'))
+
+ERROR_RE = re.compile(r'error', re.IGNORECASE)
+DESCRIPTION_NAME_RE = re.compile(r'^description$', re.IGNORECASE)
+
+# Доступные бэкенды разбора HTML (default_settings.html_parser)
+PARSER_BACKENDS = ('html.parser', 'lxml', 'selectolax', 'stream')
+DEFAULT_PARSER = 'html.parser'
+SELECTOLAX_SELECTOR = ', '.join(HEADING_TAGS + ('title', 'meta'))
+
+
+def is_meaningful(text: str) -> bool:
+    """Непустой текст без слова 'error' (правило для title и description)"""
+    return bool(text) and not ERROR_RE.search(text)
+
+
+def build_metrics(totals: Dict[str, int], non_empty: Dict[str, int]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Собирает словари headings и seo в формате результата analyze_url"""
+    headings = {}
+    for tag in HEADING_TAGS:
+        headings[f'{tag}_total'] = totals[tag]
+        headings[f'{tag}_non_empty'] = non_empty[tag]
+    headings['total_headings'] = sum(non_empty[tag] for tag in HEADING_TAGS)
+    seo = {
+        'title_total': totals['title'],
+        'title_non_empty': non_empty['title'],
+        'description_total': totals['description'],
+        'description_non_empty': non_empty['description'],
+    }
+    return headings, seo
+
+
+def empty_counters() -> Tuple[Dict[str, int], Dict[str, int]]:
+    keys = list(HEADING_TAGS) + ['title', 'description']
+    return dict.fromkeys(keys, 0), dict.fromkeys(keys, 0)
+
+
+def extract_page_metrics(soup: BeautifulSoup) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Считает h1-h6, title и meta description за один проход по дереву
+
+    Returns:
+        (headings, seo) — те же ключи, что раньше собирались отдельными find_all
+    """
+    totals, non_empty = empty_counters()
+    # Обходим descendants напрямую: find_all со списком имён заметно медленнее
+    for el in soup.descendants:
+        if not isinstance(el, Tag) or el.name not in METRIC_TAGS:
+            continue
+        name = el.name
+        if name == 'meta':
+            meta_name = el.get('name')
+            if meta_name is None or not DESCRIPTION_NAME_RE.search(meta_name):
+                continue
+            totals['description'] += 1
+            if is_meaningful((el.get('content') or '').strip()):
+                non_empty['description'] += 1
+        elif name == 'title':
+            totals['title'] += 1
+            if is_meaningful((el.get_text() or '').strip()):
+                non_empty['title'] += 1
+        else:
+            totals[name] += 1
+            if el.get_text(strip=True):
+                non_empty[name] += 1
+    return build_metrics(totals, non_empty)
+
+
+def extract_selectolax_metrics(content: bytes) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """То же, что extract_page_metrics, но через selectolax (lexbor): без дерева BeautifulSoup"""
+    return extract_selectolax_tree_metrics(LexborHTMLParser(content))
+
+
+def extract_selectolax_tree_metrics(tree) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Подсчёт метрик по уже разобранному дереву selectolax"""
+    totals, non_empty = empty_counters()
+    for node in tree.css(SELECTOLAX_SELECTOR):
+        name = node.tag
+        if name == 'meta':
+            meta_name = node.attributes.get('name')
+            if meta_name is None or not DESCRIPTION_NAME_RE.search(meta_name):
+                continue
+            totals['description'] += 1
+            if is_meaningful((node.attributes.get('content') or '').strip()):
+                non_empty['description'] += 1
+        elif name == 'title':
+            totals['title'] += 1
+            if is_meaningful((node.text() or '').strip()):
+                non_empty['title'] += 1
+        else:
+            totals[name] += 1
+            if node.text(deep=True, strip=True):
+                non_empty[name] += 1
+    return build_metrics(totals, non_empty)
+
+
+class StreamingMetricsParser(HTMLParser):
+    """
+    Событийный подсчёт метрик без построения дерева: хранятся только счётчики
+    и стек открытых заголовков, поэтому память не зависит от размера страницы
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.totals, self.non_empty = empty_counters()
+        # Открытые h1-h6: [тег, встречен ли непустой текст]
+        self.open_headings: List[list] = []
+        # Открытые title: накопленный текст (title короткий)
+        self.open_titles: List[List[str]] = []
+        # Внутри script/style текст в get_text не попадает
+        self.raw_text_tag = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in HEADING_TAGS:
+            self.totals[tag] += 1
+            self.open_headings.append([tag, False])
+        elif tag == 'title':
+            self.totals['title'] += 1
+            self.open_titles.append([])
+        elif tag == 'meta':
+            attrs = dict(attrs)
+            meta_name = attrs.get('name')
+            if meta_name is not None and DESCRIPTION_NAME_RE.search(meta_name):
+                self.totals['description'] += 1
+                if is_meaningful((attrs.get('content') or '').strip()):
+                    self.non_empty['description'] += 1
+        elif tag in ('script', 'style'):
+            self.raw_text_tag = tag
+
+    def handle_endtag(self, tag):
+        # Закрывающий тег закрывает и всё, что открыто внутри него (как в BeautifulSoup)
+        if tag in HEADING_TAGS:
+            for i in range(len(self.open_headings) - 1, -1, -1):
+                if self.open_headings[i][0] == tag:
+                    self._close_headings(i)
+                    break
+        elif tag == 'title' and self.open_titles:
+            self._close_title()
+        elif tag == self.raw_text_tag:
+            self.raw_text_tag = None
+
+    def handle_data(self, data):
+        if self.raw_text_tag:
+            return
+        if self.open_headings and data.strip():
+            for heading in self.open_headings:
+                heading[1] = True
+        for parts in self.open_titles:
+            parts.append(data)
+
+    def _close_headings(self, index: int):
+        for tag, has_text in self.open_headings[index:]:
+            if has_text:
+                self.non_empty[tag] += 1
+        del self.open_headings[index:]
+
+    def _close_title(self):
+        text = ''.join(self.open_titles.pop()).strip()
+        if is_meaningful(text):
+            self.non_empty['title'] += 1
+        if self.open_titles:
+            # Текст вложенного title входит и во внешний
+            self.open_titles[-1].append(text)
+
+    def close(self):
+        super().close()
+        self._close_headings(0)
+        while self.open_titles:
+            self._close_title()
+
+    def metrics(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        return build_metrics(self.totals, self.non_empty)
+
+
+def stream_page_metrics(chunks: Iterable[bytes], encoding: str = 'utf-8') -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Скармливает тело страницы кусками событийному парсеру и возвращает (headings, seo)"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    collector = StreamingMetricsParser()
+    for chunk in chunks:
+        if chunk:
+            collector.feed(decoder.decode(chunk))
+    collector.feed(decoder.decode(b'', final=True))
+    collector.close()
+    return collector.metrics()
+
+
+def resolve_parser(parser: str) -> str:
+    """
+    Проверяет имя бэкенда; если библиотека не установлена — откатывается на html.parser
+
+    Raises:
+        ValueError: неизвестное имя бэкенда
+    """
+    parser = parser or DEFAULT_PARSER
+    if parser not in PARSER_BACKENDS:
+        raise ValueError(f"Неизвестный парсер HTML: {parser}. Доступны: {', '.join(PARSER_BACKENDS)}")
+    if (parser == 'selectolax' and LexborHTMLParser is None) or (parser == 'lxml' and not LXML_AVAILABLE):
+        logger.warning(f"Парсер {parser} не установлен, используется {DEFAULT_PARSER}")
+        return DEFAULT_PARSER
+    return parser
+
+
+def parse_page_metrics(content: bytes, parser: str = DEFAULT_PARSER,
+                       timer: Optional[StageTimer] = None) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Разбирает тело страницы выбранным бэкендом и возвращает (headings, seo).
+    С timer построение дерева идёт в этап parse, подсчёт — в count.
+    """
+    timer = timer or StageTimer()
+    if parser == 'stream':
+        with timer.stage('parse'):
+            return stream_page_metrics([content])
+    with timer.stage('parse'):
+        tree = LexborHTMLParser(content) if parser == 'selectolax' else BeautifulSoup(content, parser)
+    with timer.stage('count'):
+        if parser == 'selectolax':
+            return extract_selectolax_tree_metrics(tree)
+        return extract_page_metrics(tree)
+
+
+def parse_worker(content: bytes, parser: str = DEFAULT_PARSER) -> Tuple[Tuple[Dict[str, int], Dict[str, int]],
+                                                                        Tuple[float, float]]:
+    """
+    Разбор в процессе пула (FetchEngine.parse_workers): наружу уходят только счётчики
+    и время этапов parse и count, а не дерево документа
+    """
+    timer = StageTimer()
+    metrics = parse_page_metrics(content, parser, timer)
+    return metrics, (timer.get('parse'), timer.get('count'))
@@ -0,0 +1,127 @@
+from array import array
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from result_types import (
+    METRIC_FIELDS, PAIR_COLUMNS, H_TOTAL, H_NON_EMPTY, TITLE_TOTAL, TITLE_NON_EMPTY,
+    DESCRIPTION_TOTAL, DESCRIPTION_NON_EMPTY, PageMetrics, PairResult, as_pair_result,
+)
+
+HEADING_DIFF_COLUMNS = [f'h{i}_diff' for i in range(1, 7)]
+
+
+def metrics_matrix(pages: Sequence[PageMetrics]) -> np.ndarray:
+    """Счётчики страниц одной матрицей (строка — страница, столбцы — METRIC_FIELDS)"""
+    buffer = b''.join(page.counts.tobytes() for page in pages)
+    return np.frombuffer(buffer, dtype=np.intc).reshape(len(pages), len(METRIC_FIELDS))
+
+
+def compare_matrices(prod: np.ndarray, stage: np.ndarray) -> np.ndarray:
+    """Все числовые колонки пар (PAIR_COLUMNS) за один проход по матрицам прод и стейдж"""
+    def side(counts: np.ndarray) -> List[np.ndarray]:
+        non_empty = counts[:, H_NON_EMPTY]
+        return [non_empty, non_empty.sum(axis=1, keepdims=True), counts[:, H_TOTAL].sum(axis=1, keepdims=True)]
+
+    prod_side = side(prod)
+    stage_side = side(stage)
+    title = [prod[:, [TITLE_NON_EMPTY, TITLE_TOTAL]], stage[:, [TITLE_NON_EMPTY, TITLE_TOTAL]],
+             stage[:, [TITLE_NON_EMPTY]] - prod[:, [TITLE_NON_EMPTY]]]
+    description = [prod[:, [DESCRIPTION_NON_EMPTY, DESCRIPTION_TOTAL]],
+                   stage[:, [DESCRIPTION_NON_EMPTY, DESCRIPTION_TOTAL]],
+                   stage[:, [DESCRIPTION_NON_EMPTY]] - prod[:, [DESCRIPTION_NON_EMPTY]]]
+    diffs = [stage_side[0] - prod_side[0], stage_side[1] - prod_side[1]]
+    return np.hstack(prod_side + stage_side + diffs + title + description).astype(np.intc)
+
+
+class PairBatch:
+    """
+    Пакетное сравнение: метрики всех пар лежат в столбцах DataFrame,
+    разницы, маски и сводка для отчёта считаются векторно
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        """
+        Args:
+            frame: PAIR_COLUMNS + date, prod_url, stage_url, prod_error, stage_error, pair_time
+        """
+        self.frame = frame
+        errors = frame[['prod_error', 'stage_error']].fillna('').astype(bool)
+        self.error_mask = errors.any(axis=1).to_numpy()
+        self.heading_mask = frame[HEADING_DIFF_COLUMNS].ne(0).any(axis=1).to_numpy()
+        self.title_mask = frame['title_diff'].ne(0).to_numpy()
+        self.description_mask = frame['description_diff'].ne(0).to_numpy()
+        self.diff_mask = (self.heading_mask | frame['total_diff'].ne(0).to_numpy()
+                          | self.title_mask | self.description_mask)
+
+    @classmethod
+    def from_pages(cls, prod: Sequence[PageMetrics], stage: Sequence[PageMetrics],
+                   pair_times: Optional[Sequence[float]] = None, date: Optional[str] = None) -> 'PairBatch':
+        """Сравнивает списки страниц прод/стейдж одной векторной операцией"""
+        matrix = compare_matrices(metrics_matrix(prod), metrics_matrix(stage))
+        frame = pd.DataFrame(matrix, columns=list(PAIR_COLUMNS))
+        frame.insert(0, 'date', date or datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        frame.insert(1, 'prod_url', [page.url for page in prod])
+        frame.insert(2, 'stage_url', [page.url for page in stage])
+        frame['prod_error'] = pd.Series([page.error for page in prod], dtype=object)
+        frame['stage_error'] = pd.Series([page.error for page in stage], dtype=object)
+        times = pair_times if pair_times is not None else [None] * len(prod)
+        frame['pair_time'] = pd.Series(times, dtype=float).round(3)
+        return cls(frame)
+
+    @classmethod
+    def from_results(cls, results: Sequence[Union[PairResult, Dict[str, Any]]]) -> 'PairBatch':
+        """Из готовых строк (PairResult или прежних словарей)"""
+        pairs = [as_pair_result(r) for r in results]
+        buffer = b''.join(pair.values.tobytes() for pair in pairs)
+        matrix = np.frombuffer(buffer, dtype=np.intc).reshape(len(pairs), len(PAIR_COLUMNS))
+        frame = pd.DataFrame(matrix, columns=list(PAIR_COLUMNS))
+        for position, column in enumerate(('date', 'prod_url', 'stage_url')):
+            frame.insert(position, column, [getattr(pair, column) for pair in pairs])
+        for column in ('prod_error', 'stage_error'):
+            frame[column] = pd.Series([getattr(pair, column) for pair in pairs], dtype=object)
+        frame['pair_time'] = pd.Series([pair.pair_time for pair in pairs], dtype=float)
+        return cls(frame)
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def summary(self) -> Dict[str, int]:
+        """Счётчики для отчёта в Telegram"""
+        return {
+            'total': len(self.frame),
+            'errors': int(self.error_mask.sum()),
+            'diffs': int(self.diff_mask.sum()),
+            'heading_diffs': int(self.heading_mask.sum()),
+            'title_diffs': int(self.title_mask.sum()),
+            'description_diffs': int(self.description_mask.sum()),
+        }
+
+    def pair_results(self) -> List[PairResult]:
+        """Строки PairResult (для записи в таблицу и отчёта)"""
+        matrix = np.ascontiguousarray(self.frame[list(PAIR_COLUMNS)].to_numpy(dtype=np.intc))
+        frame = self.frame
+        results = []
+        for i, (date, prod_url, stage_url, prod_error, stage_error, pair_time) in enumerate(zip(
+                frame['date'], frame['prod_url'], frame['stage_url'],
+                frame['prod_error'], frame['stage_error'], frame['pair_time'])):
+            values = array('i')
+            values.frombytes(matrix[i].tobytes())
+            results.append(PairResult(date, prod_url, stage_url, values, prod_error, stage_error,
+                                      None if pd.isna(pair_time) else float(pair_time)))
+        return results
+
+    def rows(self, mask: np.ndarray, limit: Optional[int] = None) -> List[PairResult]:
+        """Строки, отобранные маской (например error_mask), не больше limit"""
+        indices = np.flatnonzero(mask)[:limit]
+        return [self._row(i) for i in indices]
+
+    def _row(self, i: int) -> PairResult:
+        record = self.frame.iloc[i]
+        values = array('i', (int(record[column]) for column in PAIR_COLUMNS))
+        pair_time = record['pair_time']
+        return PairResult(record['date'], record['prod_url'], record['stage_url'], values,
+                          record['prod_error'], record['stage_error'],
+                          None if pd.isna(pair_time) else float(pair_time))
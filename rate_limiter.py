@@ -0,0 +1,99 @@
+import time
+import logging
+import threading
+from typing import Dict, Any, List
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket: rate токенов в секунду, не больше burst в запасе"""
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Забирает токен и возвращает, сколько секунд нужно подождать до его появления"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Токен может уйти в минус: так очередь ожидающих обслуживается по порядку
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self) -> float:
+        """Ждёт свободный токен, возвращает время ожидания"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostRateLimiter:
+    """Отдельный token bucket на каждый хост; хосты без настроек не ограничиваются"""
+
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def set_host_rate(self, host: str, rate: float, burst: float = 1):
+        """
+        Задаёт лимит хоста. Если хост уже настроен (прод и стейдж или несколько сайтов на одном хосте),
+        остаётся самый строгий лимит: меньшие rate и burst; без лимита (rate 0) настроенный не снимается
+        """
+        if not rate or rate <= 0:
+            return
+        burst = max(1.0, float(burst))
+        with self._lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                self.buckets[host] = TokenBucket(rate, burst)
+                return
+            if (rate, burst) == (bucket.rate, bucket.burst):
+                return
+            new_rate, new_burst = min(bucket.rate, rate), min(bucket.burst, burst)
+            logger.warning(f"Для {host} заданы разные лимиты ({bucket.rate:g} запр/с, burst {bucket.burst:g} "
+                           f"и {rate:g} запр/с, burst {burst:g}), действует более строгий: "
+                           f"{new_rate:g} запр/с, burst {new_burst:g}")
+            if (new_rate, new_burst) != (bucket.rate, bucket.burst):
+                self.buckets[host] = TokenBucket(new_rate, new_burst)
+
+    def configure_site(self, site: Dict[str, Any], defaults: Dict[str, Any],
+                       urls_prod: List[str], urls_stage: List[str]):
+        """
+        Настраивает лимиты для хостов сайта по блоку rate_limit из sites_config.json
+
+        Args:
+            site: Настройки сайта (sites.<ключ>)
+            defaults: default_settings; delay_between_requests используется, если rate_limit не задан
+            urls_prod: URL прода (из них берутся хосты для лимита prod)
+            urls_stage: URL стейджа (из них берутся хосты для лимита stage)
+        """
+        delay = defaults.get('delay_between_requests')
+        fallback = {'requests_per_second': 1 / delay if delay else 0, 'burst': 1}
+        rate_limit = site.get('rate_limit', {})
+        for env, urls in (('prod', urls_prod), ('stage', urls_stage)):
+            limit = rate_limit.get(env, fallback)
+            for host in {urlsplit(url).netloc for url in urls}:
+                self.set_host_rate(host, limit.get('requests_per_second', 0), limit.get('burst', 1))
+                logger.info(f"Лимит для {host} ({env}): {limit.get('requests_per_second', 0)} запр/с")
+
+    def acquire(self, url: str) -> float:
+        """Пропускает запрос к url через token bucket его хоста"""
+        bucket = self.buckets.get(urlsplit(url).netloc)
+        if bucket is None:
+            return 0.0
+        wait = bucket.acquire()
+        if wait:
+            with self._lock:
+                self.waited += wait
+        return wait
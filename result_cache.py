@@ -0,0 +1,218 @@
+import os
+import copy
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HTTP_CACHE_FILE = os.path.join('cache', 'http_validators.json')
+DEFAULT_MEMO_SIZE = 1000
+
+
+def new_body_hasher():
+    """Быстрый хэш тела страницы (blake2b, 128 бит)"""
+    return hashlib.blake2b(digest_size=16)
+
+
+def body_digest(content: bytes) -> str:
+    hasher = new_body_hasher()
+    hasher.update(content)
+    return hasher.hexdigest()
+
+
+def write_json_atomic(path: str, data: Any, mode: Optional[int] = None):
+    """
+    Пишет JSON во временный файл и подменяет им старый, чтобы падение не оставило битый кэш.
+    mode (например, 0o600) выставляется временному файлу до записи данных
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666 if mode is None else mode)
+    if mode is not None:
+        # Права у уже существующего временного файла O_CREAT не меняет
+        os.fchmod(fd, mode)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class ValidatorCache:
+    """
+    Кэш валидаторов HTTP (ETag / Last-Modified) и результатов analyze_url по URL.
+    Хранится на диске между запусками; на 304 или неизменившееся тело страница не разбирается заново.
+    """
+
+    def __init__(self, path: str = DEFAULT_HTTP_CACHE_FILE):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits_not_modified = 0
+        self.hits_same_body = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]] = None) -> Optional['ValidatorCache']:
+        """Кэш включается, если в default_settings задан http_cache_file"""
+        path = (settings or {}).get('http_cache_file')
+        return cls(path) if path else None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Не удалось прочитать кэш {self.path}, начинаю с пустого: {e}")
+            self.entries = {}
+
+    def save(self):
+        with self._lock:
+            write_json_atomic(self.path, self.entries)
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        """Заголовки условного запроса для url"""
+        entry = self.entries.get(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def reuse(self, url: str, status_code: int, digest: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает сохранённый результат, если страница не изменилась
+
+        Args:
+            url: Адрес страницы
+            status_code: Код ответа (304 — сервер подтвердил, что страница не менялась)
+            digest: Хэш тела ответа, если он уже известен
+        """
+        entry = self.entries.get(url)
+        with self._lock:
+            if entry and status_code == 304:
+                self.hits_not_modified += 1
+                return copy.deepcopy(entry['result'])
+            if entry and digest and entry.get('digest') == digest:
+                self.hits_same_body += 1
+                return copy.deepcopy(entry['result'])
+            self.misses += 1
+        return None
+
+    def store(self, url: str, headers: Dict[str, str], digest: str, result: Dict[str, Any]):
+        """Запоминает валидаторы ответа и результат анализа"""
+        with self._lock:
+            self.entries[url] = {
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'digest': digest,
+                'result': copy.deepcopy(result),
+            }
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits_not_modified': self.hits_not_modified,
+            'hits_same_body': self.hits_same_body,
+            'misses': self.misses,
+        }
+
+    def log_stats(self):
+        logger.info(f"Кэш страниц: 304 — {self.hits_not_modified}, тело не изменилось — {self.hits_same_body}, "
+                    f"промахов — {self.misses}")
+
+
+class ContentMemo:
+    """
+    LRU-кэш метрик (headings, seo) по хэшу тела страницы: одинаковые документы разбираются один раз.
+    Живёт в памяти в течение прогона, по желанию сохраняется на диск между прогонами.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MEMO_SIZE, path: Optional[str] = None):
+        self.max_entries = max(1, int(max_entries))
+        self.path = path
+        self.entries: 'OrderedDict[str, Tuple[Dict[str, int], Dict[str, int]]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]] = None) -> Optional['ContentMemo']:
+        """content_memo_size: 0 выключает кэш; content_memo_file: файл для сохранения между прогонами"""
+        settings = settings or {}
+        size = settings.get('content_memo_size', DEFAULT_MEMO_SIZE)
+        if not size:
+            return None
+        return cls(size, settings.get('content_memo_file'))
+
+    @staticmethod
+    def key(parser: str, digest: str) -> str:
+        # Разные парсеры могут по-разному разобрать кривую разметку
+        return f'{parser}:{digest}'
+
+    def get(self, parser: str, digest: str) -> Optional[Tuple[Dict[str, int], Dict[str, int]]]:
+        key = self.key(parser, digest)
+        with self._lock:
+            metrics = self.entries.get(key)
+            if metrics is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        headings, seo = metrics
+        return dict(headings), dict(seo)
+
+    def put(self, parser: str, digest: str, metrics: Tuple[Dict[str, int], Dict[str, int]]):
+        headings, seo = metrics
+        key = self.key(parser, digest)
+        with self._lock:
+            self.entries[key] = (dict(headings), dict(seo))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Не удалось прочитать кэш {self.path}, начинаю с пустого: {e}")
+            return
+        # В файле записи идут от старых к свежим, оставляем самые свежие
+        for key, (headings, seo) in list(stored.items())[-self.max_entries:]:
+            self.entries[key] = (headings, seo)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            write_json_atomic(self.path, self.entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(f"Кэш по содержимому: попаданий {stats['hits']}, промахов {stats['misses']} "
+                    f"({stats['hit_rate'] * 100:.1f}%), вытеснено {stats['evictions']}, записей {stats['size']}")
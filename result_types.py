@@ -0,0 +1,186 @@
+from array import array
+from datetime import datetime
+from typing import Dict, Any, Optional, Union, Callable, Tuple
+
+from stage_timings import timings_array
+
+HEADING_LEVELS = range(1, 7)
+
+# Счётчики страницы в порядке хранения в PageMetrics.counts
+METRIC_FIELDS = tuple(f'h{i}_{kind}' for i in HEADING_LEVELS for kind in ('total', 'non_empty')) + (
+    'title_total', 'title_non_empty', 'description_total', 'description_non_empty',
+)
+METRIC_INDEX = {name: i for i, name in enumerate(METRIC_FIELDS)}
+H_TOTAL = [METRIC_INDEX[f'h{i}_total'] for i in HEADING_LEVELS]
+H_NON_EMPTY = [METRIC_INDEX[f'h{i}_non_empty'] for i in HEADING_LEVELS]
+TITLE_TOTAL, TITLE_NON_EMPTY, DESCRIPTION_TOTAL, DESCRIPTION_NON_EMPTY = (
+    METRIC_INDEX[name] for name in ('title_total', 'title_non_empty', 'description_total', 'description_non_empty')
+)
+
+# Числовые колонки пары в порядке столбцов таблицы (между Stage URL и Prod error)
+PAIR_COLUMNS = (
+    tuple(f'prod_h{i}' for i in HEADING_LEVELS) + ('prod_total', 'prod_total_all')
+    + tuple(f'stage_h{i}' for i in HEADING_LEVELS) + ('stage_total', 'stage_total_all')
+    + tuple(f'h{i}_diff' for i in HEADING_LEVELS) + ('total_diff',)
+    + ('prod_title', 'prod_title_all', 'stage_title', 'stage_title_all', 'title_diff')
+    + ('prod_description', 'prod_description_all', 'stage_description', 'stage_description_all', 'description_diff')
+)
+PAIR_INDEX = {name: i for i, name in enumerate(PAIR_COLUMNS)}
+H_DIFFS = slice(PAIR_INDEX['h1_diff'], PAIR_INDEX['h6_diff'] + 1)
+TOTAL_DIFF = PAIR_INDEX['total_diff']
+TITLE_DIFF = PAIR_INDEX['title_diff']
+DESCRIPTION_DIFF = PAIR_INDEX['description_diff']
+
+
+class PageMetrics:
+    """
+    Компактные метрики одной страницы: счётчики лежат в array, без вложенных словарей.
+    timings — время этапов (array в порядке stage_timings.TIMING_STAGES) или None.
+    """
+
+    __slots__ = ('url', 'error', 'counts', 'timings')
+
+    def __init__(self, url: str, error: Optional[str] = None, counts: Optional[array] = None,
+                 timings: Optional[array] = None):
+        self.url = url
+        self.error = error
+        self.counts = counts if counts is not None else array('i', bytes(4 * len(METRIC_FIELDS)))
+        self.timings = timings
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any]) -> 'PageMetrics':
+        """Из словаря analyze_url ({'headings': ..., 'seo': ..., 'timings': ...})"""
+        headings = result.get('headings') or {}
+        seo = result.get('seo') or {}
+        counts = array('i', (headings.get(name, seo.get(name, 0)) for name in METRIC_FIELDS))
+        return cls(result.get('url', ''), result.get('error'), counts, timings_array(result.get('timings')))
+
+    @property
+    def status(self) -> str:
+        return 'error' if self.error else 'success'
+
+    @property
+    def total_headings(self) -> int:
+        """Непустые h1-h6"""
+        counts = self.counts
+        return sum(counts[i] for i in H_NON_EMPTY)
+
+    @property
+    def total_headings_all(self) -> int:
+        """Все h1-h6, включая пустые"""
+        counts = self.counts
+        return sum(counts[i] for i in H_TOTAL)
+
+
+class PairResult:
+    """
+    Результат сравнения пары прод/стейдж. Числа хранятся одним array в порядке PAIR_COLUMNS;
+    r['h1_diff'] и r.get(...) оставлены для кода, который читает строки как словари.
+    """
+
+    __slots__ = ('date', 'prod_url', 'stage_url', 'values', 'prod_error', 'stage_error', 'pair_time')
+
+    def __init__(self, date: str, prod_url: str, stage_url: str, values: array,
+                 prod_error: Optional[str] = None, stage_error: Optional[str] = None,
+                 pair_time: Optional[float] = None):
+        self.date = date
+        self.prod_url = prod_url
+        self.stage_url = stage_url
+        self.values = values
+        self.prod_error = prod_error
+        self.stage_error = stage_error
+        self.pair_time = pair_time
+
+    @classmethod
+    def from_pages(cls, prod: PageMetrics, stage: PageMetrics, pair_time: Optional[float] = None,
+                   date: Optional[str] = None) -> 'PairResult':
+        """Считает все колонки пары (те же числа, что compare_headings)"""
+        p = prod.counts
+        s = stage.counts
+        prod_side = [p[i] for i in H_NON_EMPTY] + [prod.total_headings, prod.total_headings_all]
+        stage_side = [s[i] for i in H_NON_EMPTY] + [stage.total_headings, stage.total_headings_all]
+        diffs = [s[i] - p[i] for i in H_NON_EMPTY] + [stage.total_headings - prod.total_headings]
+        title = [p[TITLE_NON_EMPTY], p[TITLE_TOTAL], s[TITLE_NON_EMPTY], s[TITLE_TOTAL],
+                 s[TITLE_NON_EMPTY] - p[TITLE_NON_EMPTY]]
+        description = [p[DESCRIPTION_NON_EMPTY], p[DESCRIPTION_TOTAL], s[DESCRIPTION_NON_EMPTY], s[DESCRIPTION_TOTAL],
+                       s[DESCRIPTION_NON_EMPTY] - p[DESCRIPTION_NON_EMPTY]]
+        values = array('i', prod_side + stage_side + diffs + title + description)
+        return cls(date or datetime.now().strftime('%Y-%m-%d %H:%M:%S'), prod.url, stage.url, values,
+                   prod.error, stage.error, round(pair_time, 3) if pair_time is not None else None)
+
+    @classmethod
+    def from_dict(cls, row: Dict[str, Any]) -> 'PairResult':
+        """Из прежней плоской строки-словаря"""
+        values = array('i', (row.get(name, 0) for name in PAIR_COLUMNS))
+        return cls(row['date'], row['prod_url'], row['stage_url'], values,
+                   row.get('prod_error'), row.get('stage_error'), row.get('pair_time'))
+
+    def __getitem__(self, key: str):
+        index = PAIR_INDEX.get(key)
+        if index is not None:
+            return self.values[index]
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    @property
+    def has_error(self) -> bool:
+        return bool(self.prod_error or self.stage_error)
+
+    @property
+    def heading_diffs(self) -> array:
+        """Разница h1-h6 (стейдж минус прод)"""
+        return self.values[H_DIFFS]
+
+    @property
+    def total_diff(self) -> int:
+        return self.values[TOTAL_DIFF]
+
+    @property
+    def title_diff(self) -> int:
+        return self.values[TITLE_DIFF]
+
+    @property
+    def description_diff(self) -> int:
+        return self.values[DESCRIPTION_DIFF]
+
+    @property
+    def has_diff(self) -> bool:
+        return any(self.heading_diffs) or bool(self.total_diff or self.title_diff or self.description_diff)
+
+    def to_row(self) -> list:
+        """Строка для Google Sheets в порядке заголовка"""
+        return [self.date, self.prod_url, self.stage_url, *self.values, self.prod_error, self.stage_error]
+
+
+def as_pair_result(item: Union[PairResult, Dict[str, Any]]) -> PairResult:
+    """Писатели принимают и PairResult, и прежние строки-словари"""
+    return item if isinstance(item, PairResult) else PairResult.from_dict(item)
+
+
+class PendingParse:
+    """
+    Страница загружена, а разбор отложен: analyze вернул задачу func(*args) для пула процессов.
+    finish(разобранное или исключение) превращает результат задачи в итоговый результат страницы.
+    """
+
+    __slots__ = ('func', 'args', 'finish')
+
+    def __init__(self, func: Callable[..., Any], args: Tuple[Any, ...], finish: Callable[[Any], Any]):
+        self.func = func
+        self.args = args
+        self.finish = finish
+
+    def complete(self, parsed: Any) -> Any:
+        return self.finish(parsed)
+
+    def then(self, func: Callable[[Any], Any]) -> 'PendingParse':
+        """Ещё один шаг после finish (например, сжатие результата в PageMetrics)"""
+        finish = self.finish
+        return PendingParse(self.func, self.args, lambda parsed: func(finish(parsed)))
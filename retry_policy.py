@@ -0,0 +1,144 @@
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Ответы, после которых запрос к странице имеет смысл повторить
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30
+# Сколько неудач подряд выключают хост и через сколько секунд пробовать его снова
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_AFTER = 60
+
+
+class HostUnavailable(Exception):
+    """Хост выключен предохранителем: запрос не отправлялся"""
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Сбой соединения (сброс, отказ, таймаут подключения) — повторяем; таймаут чтения — нет"""
+    return isinstance(error, requests.exceptions.ConnectionError)
+
+
+def is_host_failure(error: Exception) -> bool:
+    """
+    Сбой, говорящий о недоступности хоста, а не страницы: соединение не установилось, оборвалось
+    или хост не ответил вовремя. Любой HTTP-ответ, даже 5xx, значит, что хост жив
+    """
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Retry-After: число секунд или HTTP-дата"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """Повторы временных сбоев: экспоненциальная задержка со случайным разбросом (full jitter)"""
+
+    __slots__ = ('max_retries', 'backoff_base', 'backoff_max')
+
+    def __init__(self, max_retries: int = DEFAULT_MAX_RETRIES, backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX):
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]] = None) -> 'RetryPolicy':
+        settings = settings or {}
+        return cls(
+            max_retries=settings.get('fetch_max_retries', DEFAULT_MAX_RETRIES),
+            backoff_base=settings.get('fetch_backoff_base', DEFAULT_BACKOFF_BASE),
+            backoff_max=settings.get('fetch_backoff_max', DEFAULT_BACKOFF_MAX),
+        )
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Задержка перед повтором attempt (с нуля); Retry-After сервера соблюдается, но не дольше backoff_max"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+
+class HostCircuitBreaker:
+    """
+    Предохранитель на хост: после failure_threshold неудач подряд оставшиеся URL хоста
+    сразу получают ошибку «хост недоступен», не дожидаясь таймаутов. Через reset_after секунд
+    пропускается один пробный запрос: успех включает хост, неудача снова выключает.
+    Неудача — запрос, который после всех повторов так и не получил ответа (is_host_failure);
+    повторы одного запроса считаются одной неудачей.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_after: float = DEFAULT_RESET_AFTER):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_after = reset_after
+        self.failures: Dict[str, int] = {}
+        self.opened_at: Dict[str, float] = {}
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]] = None) -> 'HostCircuitBreaker':
+        settings = settings or {}
+        return cls(
+            failure_threshold=settings.get('host_failure_threshold', DEFAULT_FAILURE_THRESHOLD),
+            reset_after=settings.get('host_reset_after', DEFAULT_RESET_AFTER),
+        )
+
+    def check(self, host: str):
+        """
+        Raises:
+            HostUnavailable: хост выключен и время пробного запроса ещё не пришло
+        """
+        with self._lock:
+            opened = self.opened_at.get(host)
+            if opened is None:
+                return
+            if time.monotonic() - opened >= self.reset_after:
+                # Пробный запрос: до его результата остальные снова отсекаются
+                self.opened_at[host] = time.monotonic()
+                return
+            self.rejected += 1
+            failures = self.failures.get(host, 0)
+        raise HostUnavailable(f"Хост недоступен: {host} ({failures} ошибок подряд), запрос не отправлялся")
+
+    def record_success(self, host: str):
+        with self._lock:
+            self.failures.pop(host, None)
+            if self.opened_at.pop(host, None) is not None:
+                logger.info(f"Хост {host} снова отвечает")
+
+    def record_failure(self, host: str):
+        with self._lock:
+            failures = self.failures.get(host, 0) + 1
+            self.failures[host] = failures
+            if failures >= self.failure_threshold and host not in self.opened_at:
+                logger.warning(f"Хост {host}: {failures} ошибок подряд, остальные его URL пропускаются")
+            if failures >= self.failure_threshold:
+                self.opened_at[host] = time.monotonic()
+
+    def open_hosts(self) -> Dict[str, int]:
+        with self._lock:
+            return {host: self.failures.get(host, 0) for host in self.opened_at}
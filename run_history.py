@@ -0,0 +1,196 @@
+import os
+import logging
+import sqlite3
+import threading
+from array import array
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Sequence
+
+from result_types import METRIC_FIELDS, PageMetrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_FILE = os.path.join('cache', 'run_history.sqlite3')
+
+METRIC_COLUMNS = ', '.join(METRIC_FIELDS)
+
+PAGE_METRICS_TABLE = f"""
+CREATE TABLE IF NOT EXISTS page_metrics (
+    site TEXT NOT NULL,
+    env TEXT NOT NULL,
+    url TEXT NOT NULL,
+    run_ts TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    error TEXT,
+    {', '.join(f'{name} INTEGER NOT NULL DEFAULT 0' for name in METRIC_FIELDS)},
+    PRIMARY KEY (site, env, url, run_ts)
+);
+"""
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_ts TEXT NOT NULL,
+    sites TEXT NOT NULL
+);
+{PAGE_METRICS_TABLE}
+CREATE INDEX IF NOT EXISTS page_metrics_run ON page_metrics (run_id, site);
+"""
+
+# Колонки таблицы, которые переносятся при смене ключа
+PAGE_COLUMNS = f'site, env, url, run_ts, run_id, error, {METRIC_COLUMNS}'
+
+
+class RunHistory:
+    """
+    История прогонов в SQLite: метрики каждой страницы каждого прогона.
+    Ключ (site, env, url, run_ts) — по нему берётся прошлое значение страницы без чтения Google Sheets;
+    env в ключе, потому что прод и стейдж могут иметь одинаковые URL (относительные пути, общий хост).
+    """
+
+    def __init__(self, path: str = DEFAULT_HISTORY_FILE):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self.connection:
+            self.migrate()
+            self.connection.executescript(SCHEMA)
+
+    def migrate(self):
+        """Старая история с ключом (site, url, run_ts) переносится в таблицу с ключом (site, env, url, run_ts)"""
+        columns = {row['name']: row['pk'] for row in self.connection.execute('PRAGMA table_info(page_metrics)')}
+        if not columns or columns.get('env'):
+            return
+        logger.info(f"История {self.path}: добавляю env в ключ page_metrics")
+        self.connection.executescript(
+            'DROP INDEX IF EXISTS page_metrics_run;'
+            'ALTER TABLE page_metrics RENAME TO page_metrics_old;'
+            f'{PAGE_METRICS_TABLE}'
+            f'INSERT INTO page_metrics ({PAGE_COLUMNS}) SELECT {PAGE_COLUMNS} FROM page_metrics_old;'
+            'DROP TABLE page_metrics_old;'
+        )
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]] = None,
+                      analysis: Optional[Dict[str, Any]] = None) -> Optional['RunHistory']:
+        """Включается флагами save_comparison_data/compare_with_previous из analysis_settings"""
+        analysis = analysis or {}
+        if not (analysis.get('save_comparison_data') or analysis.get('compare_with_previous')):
+            return None
+        return cls((settings or {}).get('history_file', DEFAULT_HISTORY_FILE))
+
+    def close(self):
+        self.connection.close()
+
+    def start_run(self, sites: Sequence[str], run_ts: Optional[str] = None) -> int:
+        """Регистрирует прогон, возвращает его номер"""
+        run_ts = run_ts or datetime.now().isoformat(timespec='microseconds')
+        with self._lock, self.connection:
+            cursor = self.connection.execute('INSERT INTO runs (run_ts, sites) VALUES (?, ?)',
+                                             (run_ts, ','.join(sites)))
+        return cursor.lastrowid
+
+    def run_ts(self, run_id: int) -> Optional[str]:
+        row = self.connection.execute('SELECT run_ts FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        return row['run_ts'] if row else None
+
+    def last_run_id(self) -> Optional[int]:
+        row = self.connection.execute('SELECT MAX(run_id) AS run_id FROM runs').fetchone()
+        return row['run_id']
+
+    def record_pages(self, run_id: int, site: str, env: str, pages: Sequence[PageMetrics]):
+        """Сохраняет метрики страниц одного окружения сайта одной транзакцией"""
+        run_ts = self.run_ts(run_id)
+        placeholders = ', '.join('?' * (6 + len(METRIC_FIELDS)))
+        with self._lock, self.connection:
+            self.connection.executemany(
+                f'INSERT OR REPLACE INTO page_metrics ({PAGE_COLUMNS}) VALUES ({placeholders})',
+                ((site, env, page.url, run_ts, run_id, page.error, *page.counts) for page in pages),
+            )
+
+    def previous_pages(self, run_id: int, site: str, env: str, urls: Sequence[str]) -> Dict[str, PageMetrics]:
+        """Последние метрики каждого url окружения до прогона run_id (поиск по ключу (site, env, url, run_ts))"""
+        run_ts = self.run_ts(run_id)
+        query = (f'SELECT url, error, {METRIC_COLUMNS} FROM page_metrics '
+                 'WHERE site = ? AND env = ? AND url = ? AND run_ts < ? ORDER BY run_ts DESC LIMIT 1')
+        previous = {}
+        for url in urls:
+            row = self.connection.execute(query, (site, env, url, run_ts)).fetchone()
+            if row is not None:
+                previous[url] = PageMetrics(url, row['error'], array('i', (row[name] for name in METRIC_FIELDS)))
+        return previous
+
+    @staticmethod
+    def metric_changes(previous: PageMetrics, current: PageMetrics) -> Dict[str, Dict[str, int]]:
+        """Изменившиеся счётчики: {поле: {'previous', 'current', 'difference'}}"""
+        return {
+            name: {'previous': old, 'current': new, 'difference': new - old}
+            for name, old, new in zip(METRIC_FIELDS, previous.counts, current.counts)
+            if old != new
+        }
+
+    def compare_with_previous(self, run_id: int, site: str, env: str,
+                              pages: Sequence[PageMetrics]) -> List[Dict[str, Any]]:
+        """
+        Сравнивает страницы окружения env прогона с их прошлыми значениями в том же окружении
+
+        Returns:
+            По странице: url, status ('new' / 'changed' / 'unchanged'), changes, errors
+        """
+        previous = self.previous_pages(run_id, site, env, [page.url for page in pages])
+        comparison = []
+        for page in pages:
+            old = previous.get(page.url)
+            errors = [page.error] if page.error else []
+            if old is None:
+                comparison.append({'url': page.url, 'status': 'new', 'changes': {}, 'errors': errors})
+                continue
+            changes = self.metric_changes(old, page)
+            comparison.append({
+                'url': page.url,
+                'status': 'changed' if changes or old.error != page.error else 'unchanged',
+                'changes': changes,
+                'errors': errors,
+            })
+        return comparison
+
+    def changed_since(self, run_id: int, site: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Что изменилось с прогона run_id: страницы последнего прогона, у которых метрики или ошибка
+        отличаются от значений в прогоне run_id, и страницы, которых в нём не было
+        """
+        latest = self.last_run_id()
+        if latest is None:
+            return []
+        differs = ' OR '.join(f'cur.{name} IS NOT old.{name}' for name in METRIC_FIELDS + ('error',))
+        site_filter = 'AND cur.site = ?' if site else ''
+        query = (
+            f'SELECT cur.site, cur.url, cur.env, old.run_id AS old_run_id, '
+            f'{", ".join(f"cur.{name} AS cur_{name}, old.{name} AS old_{name}" for name in METRIC_FIELDS)}, '
+            f'cur.error AS cur_error, old.error AS old_error '
+            f'FROM page_metrics cur LEFT JOIN page_metrics old '
+            f'ON old.site = cur.site AND old.env = cur.env AND old.url = cur.url AND old.run_id = ? '
+            f'WHERE cur.run_id = ? {site_filter} AND (old.run_id IS NULL OR {differs}) '
+            f'ORDER BY cur.site, cur.env, cur.url'
+        )
+        params = [run_id, latest] + ([site] if site else [])
+        changes = []
+        for row in self.connection.execute(query, params):
+            changes.append({
+                'site': row['site'],
+                'url': row['url'],
+                'env': row['env'],
+                'status': 'new' if row['old_run_id'] is None else 'changed',
+                'changes': {
+                    name: {'previous': row[f'old_{name}'], 'current': row[f'cur_{name}'],
+                           'difference': row[f'cur_{name}'] - row[f'old_{name}']}
+                    for name in METRIC_FIELDS
+                    if row['old_run_id'] is not None and row[f'cur_{name}'] != row[f'old_{name}']
+                },
+                'error': {'previous': row['old_error'], 'current': row['cur_error']},
+            })
+        return changes
@@ -0,0 +1,133 @@
+import os
+import json
+import logging
+import hashlib
+from array import array
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from result_types import PageMetrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_FILE = os.path.join('cache', 'checkpoint.jsonl')
+
+# (сайт, prod URL, stage URL)
+PairKey = Tuple[str, str, str]
+# (prod, stage, время пары)
+DonePair = Tuple[PageMetrics, PageMetrics, float]
+
+
+def run_signature(site_urls: Dict[str, Tuple[List[str], List[str]]], parser: str) -> str:
+    """Отпечаток набора пар: продолжать можно только прогон с теми же сайтами, URL и парсером"""
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(parser.encode('utf-8'))
+    for site, (urls_prod, urls_stage) in site_urls.items():
+        hasher.update(json.dumps([site, urls_prod, urls_stage], ensure_ascii=False).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def page_record(page: PageMetrics) -> Dict[str, Any]:
+    return {'url': page.url, 'error': page.error, 'counts': list(page.counts)}
+
+
+def page_from_record(record: Dict[str, Any]) -> PageMetrics:
+    return PageMetrics(record['url'], record['error'], array('i', record['counts']))
+
+
+class RunJournal:
+    """
+    Журнал контрольных точек прогона (JSONL): каждая готовая пара дописывается сразу.
+    Первая строка — заголовок с отпечатком прогона; с --resume готовые пары берутся из журнала,
+    после успешного завершения прогона журнал удаляется.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_FILE):
+        self.path = path
+        self.file = None
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]] = None, resume: bool = False) -> Optional['RunJournal']:
+        """Включается checkpoint_file из default_settings; с --resume журнал нужен всегда"""
+        path = (settings or {}).get('checkpoint_file')
+        if not path and not resume:
+            return None
+        return cls(path or DEFAULT_CHECKPOINT_FILE)
+
+    def load(self, signature: str) -> Dict[PairKey, DonePair]:
+        """Готовые пары из журнала прогона с тем же отпечатком"""
+        if not os.path.exists(self.path):
+            return {}
+        done = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            header = f.readline()
+            try:
+                if json.loads(header).get('signature') != signature:
+                    logger.warning(f"Журнал {self.path} от другого набора пар, начинаю прогон заново")
+                    return {}
+            except json.JSONDecodeError:
+                return {}
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Последняя строка могла оборваться при падении
+                    break
+                key = (record['site'], record['prod']['url'], record['stage']['url'])
+                done[key] = (page_from_record(record['prod']), page_from_record(record['stage']),
+                             record['pair_time'])
+        return done
+
+    def start(self, signature: str, resume: bool = False) -> Dict[PairKey, DonePair]:
+        """
+        Открывает журнал прогона
+
+        Args:
+            signature: Отпечаток набора пар (run_signature)
+            resume: Продолжить прерванный прогон; иначе журнал начинается заново
+
+        Returns:
+            Пары, уже готовые в прерванном прогоне
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        done = self.load(signature) if resume else {}
+        # Журнал переписывается заново: готовые пары переносятся, оборванный хвост отбрасывается.
+        # Пишем во временный файл и подменяем им журнал, чтобы падение во время перезаписи
+        # не оставило прогон без единственной контрольной точки
+        tmp_path = f'{self.path}.tmp'
+        self.file = open(tmp_path, 'w', encoding='utf-8')
+        try:
+            self.file.write(json.dumps({'signature': signature, 'started': datetime.now().isoformat()}) + '\n')
+            for (site, _, _), (prod, stage, pair_time) in done.items():
+                self.write_pair(site, prod, stage, pair_time)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        finally:
+            self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+        if done:
+            logger.info(f"Продолжаю прогон: готово пар {len(done)} (журнал {self.path})")
+        return done
+
+    def write_pair(self, site: str, prod: PageMetrics, stage: PageMetrics, pair_time: float):
+        self.file.write(json.dumps({'site': site, 'prod': page_record(prod), 'stage': page_record(stage),
+                                    'pair_time': pair_time}, ensure_ascii=False) + '\n')
+
+    def record(self, site: str, prod: PageMetrics, stage: PageMetrics, pair_time: float):
+        """Дописывает готовую пару и сразу сбрасывает её на диск"""
+        self.write_pair(site, prod, stage, pair_time)
+        self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def complete(self):
+        """Прогон завершён: журнал больше не нужен"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+from result_cache import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHEET_MIRROR_FILE = os.path.join('cache', 'sheet_mirror.json')
+# Сколько ячеек отправлять в одном batchUpdate (ограничение на размер тела запроса)
+MAX_CELLS_PER_REQUEST = 50000
+
+Grid = List[List[Any]]
+
+
+def column_letter(index: int) -> str:
+    """Номер столбца с нуля -> буквы A1-нотации (0 -> A, 26 -> AA)"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def a1_range(sheet_name: str, first_row: int, first_col: int, last_row: int, last_col: int) -> str:
+    """Диапазон по номерам строк/столбцов с нуля, включительно"""
+    return (f"{sheet_name}!{column_letter(first_col)}{first_row + 1}:"
+            f"{column_letter(last_col)}{last_row + 1}")
+
+
+def normalize_grid(rows: Grid) -> Grid:
+    """
+    Приводит значения к тому виду, в котором они лежат в JSON-зеркале.
+    None становится '': batchUpdate пропускает null, и ячейка на листе осталась бы прежней
+    """
+    return [['' if value is None else value for value in row]
+            for row in json.loads(json.dumps(rows, ensure_ascii=False))]
+
+
+def changed_spans(old_row: List[Any], new_row: List[Any]) -> List[Tuple[int, int]]:
+    """Отрезки подряд идущих изменённых ячеек строки: [(первый столбец, последний столбец)]"""
+    spans = []
+    start = None
+    width = max(len(old_row), len(new_row))
+    for col in range(width):
+        old = old_row[col] if col < len(old_row) else ''
+        new = new_row[col] if col < len(new_row) else ''
+        if old != new:
+            if start is None:
+                start = col
+        elif start is not None:
+            spans.append((start, col - 1))
+            start = None
+    if start is not None:
+        spans.append((start, width - 1))
+    return spans
+
+
+def diff_ranges(sheet_name: str, old: Grid, new: Grid) -> List[Dict[str, Any]]:
+    """
+    Диапазоны для values.batchUpdate, переводящие old в new.
+    Одинаковые отрезки столбцов в соседних строках склеиваются в один прямоугольник
+    (например, столбец «Дата», который меняется в каждой строке, уходит одним диапазоном).
+    Строки, которых больше нет, очищаются пустыми значениями.
+    """
+    blocks: List[Dict[str, Any]] = []
+    open_blocks: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    for row_index in range(max(len(old), len(new))):
+        old_row = old[row_index] if row_index < len(old) else []
+        new_row = new[row_index] if row_index < len(new) else [''] * len(old_row)
+        next_open = {}
+        for first_col, last_col in changed_spans(old_row, new_row):
+            values = [new_row[col] if col < len(new_row) else '' for col in range(first_col, last_col + 1)]
+            block = open_blocks.get((first_col, last_col))
+            if block is None:
+                block = {'first_row': row_index, 'first_col': first_col, 'last_col': last_col, 'values': []}
+                blocks.append(block)
+            block['values'].append(values)
+            block['last_row'] = row_index
+            next_open[(first_col, last_col)] = block
+        open_blocks = next_open
+    return [
+        {'range': a1_range(sheet_name, b['first_row'], b['first_col'], b['last_row'], b['last_col']),
+         'values': b['values']}
+        for b in blocks
+    ]
+
+
+class IncrementalSheetWriter:
+    """
+    Очередь записей в Google Sheets: листы всех сайтов копятся через write() и уходят
+    общими запросами values.batchUpdate в flush().
+    С зеркалом (последняя записанная сетка каждого листа в локальном файле) отправляются только
+    изменившиеся ячейки; если зеркала нет или поменялась раскладка (заголовок, число столбцов),
+    лист переписывается целиком с A1. Зеркало верно, пока лист правит только этот скрипт —
+    иначе удалите файл зеркала.
+    """
+
+    def __init__(self, sheets, spreadsheet_id: str, path: Optional[str] = DEFAULT_SHEET_MIRROR_FILE,
+                 max_cells_per_request: int = MAX_CELLS_PER_REQUEST):
+        self.sheets = sheets
+        self.spreadsheet_id = spreadsheet_id
+        self.path = path
+        self.max_cells_per_request = max(1, int(max_cells_per_request))
+        self.mirror: Dict[str, Grid] = {}
+        # (ключ зеркала, новая сетка, диапазоны, число ячеек)
+        self.pending: List[Tuple[str, Grid, List[Dict[str, Any]], int]] = []
+        self.full_rewrites = 0
+        self.incremental_writes = 0
+        self.cells_sent = 0
+        self.ranges_sent = 0
+        self.batch_requests = 0
+        self.failed_sheets = 0
+        self.flush_time = 0.0
+        if path:
+            self.load()
+
+    @classmethod
+    def from_settings(cls, sheets, spreadsheet_id: str,
+                      settings: Optional[Dict[str, Any]] = None) -> 'IncrementalSheetWriter':
+        """sheet_mirror_file из default_settings включает запись только изменений"""
+        settings = settings or {}
+        return cls(sheets, spreadsheet_id, settings.get('sheet_mirror_file'),
+                   settings.get('sheets_max_cells_per_request', MAX_CELLS_PER_REQUEST))
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.mirror = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Не удалось прочитать зеркало таблицы {self.path}, лист будет переписан: {e}")
+            self.mirror = {}
+
+    def save(self):
+        if self.path:
+            write_json_atomic(self.path, self.mirror)
+
+    def mirror_key(self, sheet_name: str) -> str:
+        return f'{self.spreadsheet_id}:{sheet_name}'
+
+    @staticmethod
+    def same_layout(old: Grid, new: Grid) -> bool:
+        """Раскладка совпадает, если одинаковы заголовок и ширина всех строк"""
+        if not old or not new or old[0] != new[0]:
+            return False
+        width = len(new[0])
+        return all(len(row) == width for row in old) and all(len(row) == width for row in new)
+
+    def write(self, sheet_name: str, rows: Grid):
+        """Ставит в очередь запись сетки rows на лист sheet_name (с A1); отправка — в flush()"""
+        rows = normalize_grid(rows)
+        key = self.mirror_key(sheet_name)
+        old = self.mirror.get(key) if self.path else None
+
+        if old is None or not self.same_layout(old, rows):
+            # Хвост прежней сетки (лишние строки и столбцы) затираем пустыми значениями,
+            # чтобы на листе не остались старые данные
+            width = max([len(row) for row in rows] + [len(row) for row in old or []])
+            padded = [row + [''] * (width - len(row)) for row in rows]
+            padded += [[''] * width] * max(0, len(old or []) - len(rows))
+            if self.path:
+                logger.info(f"Лист {sheet_name}: раскладка изменилась или зеркала нет — переписываю целиком")
+            data = [{'range': f"{sheet_name}!A1", 'values': padded}]
+            self.full_rewrites += 1
+        else:
+            data = diff_ranges(sheet_name, old, rows)
+            if not data:
+                logger.info(f"Лист {sheet_name}: изменений нет, запись пропущена")
+                return
+            self.incremental_writes += 1
+        cells = sum(len(row) for block in data for row in block['values'])
+        logger.info(f"Лист {sheet_name}: в очереди {len(data)} диапазонов, {cells} ячеек")
+        self.pending.append((key, rows, data, cells))
+
+    def batches(self) -> List[List[Tuple[str, Grid, List[Dict[str, Any]], int]]]:
+        """Делит очередь на запросы не больше max_cells_per_request ячеек (лист целиком в одном запросе)"""
+        batches = []
+        current = []
+        current_cells = 0
+        for entry in self.pending:
+            if current and current_cells + entry[3] > self.max_cells_per_request:
+                batches.append(current)
+                current = []
+                current_cells = 0
+            current.append(entry)
+            current_cells += entry[3]
+        if current:
+            batches.append(current)
+        return batches
+
+    def flush(self):
+        """Отправляет все листы из очереди минимальным числом запросов batchUpdate"""
+        if not self.pending:
+            return
+        started = time.perf_counter()
+        for batch in self.batches():
+            data = [block for _, _, blocks, _ in batch for block in blocks]
+            result = self.sheets.batch_update_values(self.spreadsheet_id, data)
+            self.batch_requests += 1
+            for key, rows, blocks, cells in batch:
+                if result is None:
+                    # Запись не прошла — состояние листа неизвестно, в следующий раз перепишем его целиком
+                    self.mirror.pop(key, None)
+                    self.failed_sheets += 1
+                else:
+                    self.mirror[key] = rows
+                    self.cells_sent += cells
+                    self.ranges_sent += len(blocks)
+        self.pending.clear()
+        self.flush_time += time.perf_counter() - started
+        self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        sheets_stats = self.sheets.stats() if hasattr(self.sheets, 'stats') else {}
+        return {
+            'full_rewrites': self.full_rewrites,
+            'incremental_writes': self.incremental_writes,
+            'batch_requests': self.batch_requests,
+            'ranges_sent': self.ranges_sent,
+            'cells_sent': self.cells_sent,
+            'failed_sheets': self.failed_sheets,
+            'retries': sheets_stats.get('retries', 0),
+            'cells_per_second': round(self.cells_sent / self.flush_time, 1) if self.flush_time else 0.0,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(f"Google Sheets: запросов batchUpdate {stats['batch_requests']}, диапазонов {stats['ranges_sent']}, "
+                    f"ячеек {stats['cells_sent']} ({stats['cells_per_second']} яч/с), "
+                    f"полных перезаписей {stats['full_rewrites']}, инкрементальных {stats['incremental_writes']}, "
+                    f"повторов {stats['retries']}, не записано листов {stats['failed_sheets']}")
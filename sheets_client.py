@@ -0,0 +1,141 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, Tuple
+
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+from result_cache import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+DEFAULT_TOKEN_CACHE_FILE = os.path.join('cache', 'google_token.json')
+HTTP_TIMEOUT = 60
+# Токен из файла берём, только если до истечения осталось больше этого запаса
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)
+
+_lock = threading.Lock()
+_discovery_docs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_services: Dict[Tuple[str, ...], Any] = {}
+
+
+def service_account_info_from_env() -> Dict[str, Optional[str]]:
+    """Ключ сервис-аккаунта из переменных окружения (.env)"""
+    return {
+        "type": os.getenv("TYPE"),
+        "project_id": os.getenv("PROJECT_ID"),
+        "client_email": os.getenv("CLIENT_EMAIL"),
+        "token_uri": os.getenv("TOKEN_URI"),
+        "private_key": os.getenv("PRIVATE_KEY"),
+        "private_key_id": os.getenv("PRIVATE_KEY_ID"),
+        "client_id": os.getenv("CLIENT_ID"),
+        "auth_uri": os.getenv("AUTH_URI"),
+        "auth_provider_x509_cert_url": os.getenv("AUTH_PROVIDER_X509_CERT_URL"),
+        "client_x509_cert_url": os.getenv("CLIENT_X509_CERT_URL"),
+        "universe_domain": os.getenv("UNIVERSE_DOMAIN"),
+    }
+
+
+def discovery_document(service_name: str = 'sheets', version: str = 'v4') -> Dict[str, Any]:
+    """
+    Discovery-документ API: берётся из копии, которая поставляется с google-api-python-client,
+    и разбирается один раз на процесс (сеть и file_cache не нужны)
+    """
+    key = (service_name, version)
+    doc = _discovery_docs.get(key)
+    if doc is None:
+        doc = json.loads(discovery_cache.get_static_doc(service_name, version))
+        _discovery_docs[key] = doc
+    return doc
+
+
+class TokenFileCache:
+    """Access-токены сервис-аккаунта на диске: новый процесс не ходит за токеном, пока старый не истёк"""
+
+    def __init__(self, path: str = DEFAULT_TOKEN_CACHE_FILE):
+        self.path = path
+
+    def _read(self) -> Dict[str, Dict[str, str]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Не удалось прочитать кэш токенов {self.path}: {e}")
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def load(self, key: str, credentials) -> bool:
+        """Подставляет в credentials сохранённый токен, если он ещё действует"""
+        entry = self._read().get(key)
+        if not entry:
+            return False
+        try:
+            token = entry['token']
+            expiry = datetime.fromisoformat(entry['expiry'])
+            # google-auth хранит expiry как наивное время UTC
+            fresh = expiry - datetime.now(timezone.utc).replace(tzinfo=None) > TOKEN_EXPIRY_MARGIN
+        except (KeyError, TypeError, ValueError) as e:
+            # Обрезанная или исправленная руками запись — просто берём новый токен
+            logger.warning(f"Испорченная запись в кэше токенов {self.path}, токен будет получен заново: {e!r}")
+            return False
+        if not fresh or not token:
+            return False
+        credentials.token = token
+        credentials.expiry = expiry
+        return True
+
+    def save(self, key: str, credentials):
+        if not credentials.token or not credentials.expiry:
+            return
+        entries = self._read()
+        entries[key] = {'token': credentials.token, 'expiry': credentials.expiry.isoformat()}
+        # Токен доступа не должен быть читаем другими пользователями ни на миг
+        write_json_atomic(self.path, entries, mode=0o600)
+
+
+def get_sheets_service(service_account_info: Optional[Dict[str, Any]] = None,
+                       token_cache_file: Optional[str] = DEFAULT_TOKEN_CACHE_FILE):
+    """
+    Клиент Google Sheets API, общий на процесс: один раз на ключ сервис-аккаунта
+    создаются credentials, авторизованный HTTP-транспорт (keep-alive) и ресурс API
+
+    Args:
+        service_account_info: Ключ сервис-аккаунта; по умолчанию из переменных окружения
+        token_cache_file: Файл кэша access-токенов; None — не кэшировать на диске
+    """
+    info = service_account_info or service_account_info_from_env()
+    key = (info.get('client_email') or '', info.get('private_key_id') or '', *SCOPES)
+    with _lock:
+        service = _services.get(key)
+        if service is not None:
+            return service
+
+        credentials = service_account.Credentials.from_service_account_info(info, scopes=SCOPES)
+        token_key = ':'.join(key)
+        token_cache = TokenFileCache(token_cache_file) if token_cache_file else None
+        if not (token_cache and token_cache.load(token_key, credentials)):
+            credentials.refresh(Request())
+            if token_cache:
+                token_cache.save(token_key, credentials)
+        # Токен, обновлённый транспортом по ходу прогона, живёт в тех же credentials
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        service = build_from_document(discovery_document('sheets', 'v4'), http=http)
+        _services[key] = service
+        logger.info(f"Клиент Google Sheets API создан для {info.get('client_email')}")
+        return service
+
+
+def reset_sheets_clients():
+    """Сбрасывает клиентов процесса (для тестов и смены ключа)"""
+    with _lock:
+        _services.clear()
@@ -0,0 +1,45 @@
+import os
+import json
+import importlib
+from typing import Dict, Any, Optional, List, Tuple
+
+# Файл с настройками сайтов лежит рядом со скриптами
+SITES_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sites_config.json')
+
+
+def load_sites_config(path: str = SITES_CONFIG_FILE) -> Dict[str, Any]:
+    """Читает sites_config.json целиком."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def get_default_settings(config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Возвращает блок default_settings (пустой словарь, если его нет)."""
+    if config is None:
+        config = load_sites_config()
+    return config.get('default_settings', {})
+
+
+def get_analysis_settings(config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Возвращает блок analysis_settings (пустой словарь, если его нет)."""
+    if config is None:
+        config = load_sites_config()
+    return config.get('analysis_settings', {})
+
+
+def get_site_settings(site_key: str, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Возвращает настройки сайта sites.<site_key> (пустой словарь, если сайта нет)."""
+    if config is None:
+        config = load_sites_config()
+    return config.get('sites', {}).get(site_key, {})
+
+
+def load_site_urls(site: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """
+    Загружает списки URL прода и стейджа сайта из модуля links.*
+
+    Args:
+        site: Настройки сайта с ключами links_module, prod_urls, stage_urls
+    """
+    module = importlib.import_module(site['links_module'])
+    return getattr(module, site['prod_urls']), getattr(module, site.get('stage_urls', 'urls_stage'))
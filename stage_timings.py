@@ -0,0 +1,124 @@
+import time
+import logging
+import threading
+from array import array
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Iterable, Iterator, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Этапы обработки страницы в порядке хранения в PageMetrics.timings:
+# wait — ожидание лимитера хоста и паузы между повторами, connect — DNS + TCP,
+# tls — рукопожатие TLS (у новых соединений), ttfb — от отправки запроса до заголовков ответа, download — чтение тела,
+# parse — построение дерева (или разбор кусков в потоковом режиме), count — подсчёт метрик
+TIMING_STAGES = ('wait', 'connect', 'tls', 'ttfb', 'download', 'parse', 'count')
+TIMING_INDEX = {name: i for i, name in enumerate(TIMING_STAGES)}
+
+_local = threading.local()
+
+
+class StageTimer:
+    """Время этапов одной страницы; пока таймер активен, в него пишут и HTTP-соединения этого потока"""
+
+    __slots__ = ('values',)
+
+    def __init__(self):
+        self.values = [0.0] * len(TIMING_STAGES)
+
+    def add(self, stage: str, seconds: float):
+        self.values[TIMING_INDEX[stage]] += seconds
+
+    def get(self, stage: str) -> float:
+        return self.values[TIMING_INDEX[stage]]
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    @contextmanager
+    def active(self):
+        """Делает таймер текущим для потока (record() пишет в него)"""
+        previous = getattr(_local, 'timer', None)
+        _local.timer = self
+        try:
+            yield self
+        finally:
+            _local.timer = previous
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(value, 4) for name, value in zip(TIMING_STAGES, self.values)}
+
+
+def record(stage: str, seconds: float):
+    """Добавляет время этапа к активному таймеру потока (если его нет — ничего не делает)"""
+    timer = getattr(_local, 'timer', None)
+    if timer is not None:
+        timer.add(stage, seconds)
+
+
+def timed_chunks(chunks: Iterable[bytes], timer: StageTimer, stage: str = 'download') -> Iterator[bytes]:
+    """Пропускает куски тела дальше, относя время их получения к stage"""
+    iterator = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            timer.add(stage, time.perf_counter() - start)
+            return
+        timer.add(stage, time.perf_counter() - start)
+        yield chunk
+
+
+def timings_array(timings: Optional[Dict[str, float]]) -> Optional[array]:
+    """Словарь этапов из analyze_url -> array в порядке TIMING_STAGES"""
+    if not timings:
+        return None
+    return array('d', (timings.get(name, 0.0) for name in TIMING_STAGES))
+
+
+def percentile(ordered: Sequence[float], share: float) -> float:
+    """Процентиль методом ближайшего ранга по отсортированным значениям"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(share * len(ordered))) - 1))]
+
+
+class TimingSummary:
+    """Сводка этапов за прогон: сумма, p50/p95 и максимум по каждому этапу"""
+
+    def __init__(self):
+        self.samples: List[List[float]] = [[] for _ in TIMING_STAGES]
+        self.pages = 0
+
+    def add(self, timings: Optional[Sequence[float]]):
+        """timings — значения в порядке TIMING_STAGES (PageMetrics.timings); None пропускается"""
+        if timings is None:
+            return
+        self.pages += 1
+        for samples, value in zip(self.samples, timings):
+            samples.append(value)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, samples in zip(TIMING_STAGES, self.samples):
+            ordered = sorted(samples)
+            result[name] = {
+                'total': round(sum(ordered), 3),
+                'p50': round(percentile(ordered, 0.5), 4),
+                'p95': round(percentile(ordered, 0.95), 4),
+                'max': round(ordered[-1], 4) if ordered else 0.0,
+            }
+        return result
+
+    def log_summary(self):
+        if not self.pages:
+            return
+        lines = [f"  {name:<8} всего {s['total']:.1f} с, p50 {s['p50'] * 1000:.1f} мс, "
+                 f"p95 {s['p95'] * 1000:.1f} мс, макс {s['max'] * 1000:.1f} мс"
+                 for name, s in self.summary().items()]
+        logger.info(f"Этапы обработки ({self.pages} стр.):\n" + '\n'.join(lines))
@@ -1,9 +1,13 @@
 import os
+import re
+import time
 import requests
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
+from retry_policy import RetryPolicy
+
 # Попытка загрузить .env файл
 try:
     from dotenv import load_dotenv
@@ -13,47 +17,199 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+TELEGRAM_API_URL = 'https://api.telegram.org/bot{token}/{method}'
+# Максимальная длина текста одного сообщения в Telegram
+MESSAGE_LIMIT = 4096
+# Максимальная длина подписи к файлу
+CAPTION_LIMIT = 1024
+DEFAULT_MAX_RETRIES = 3
+# Задержка повторов при сетевых ошибках и 5xx
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# retry_after из ответа 429 (flood control) выжидается целиком, но не дольше FLOOD_WAIT_MAX
+FLOOD_WAIT_MAX = 15 * 60
+REQUEST_TIMEOUT = 30
+
+TAG_RE = re.compile(r'<(/?)([a-zA-Z]+)[^>]*>')
+
+
+def open_tags_after(text: str, stack: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Стек незакрытых тегов [(имя, открывающий тег)] после text"""
+    stack = list(stack)
+    for match in TAG_RE.finditer(text):
+        closing, name = match.group(1), match.group(2).lower()
+        if not closing:
+            stack.append((name, match.group(0)))
+        elif stack and stack[-1][0] == name:
+            stack.pop()
+    return stack
+
+
+def closing_tags(stack: List[Tuple[str, str]]) -> str:
+    return ''.join(f'</{name}>' for name, _ in reversed(stack))
+
+
+def safe_cut(text: str, limit: int) -> int:
+    """Позиция разреза не дальше limit, не попадающая внутрь тега или HTML-сущности"""
+    cut = limit
+    tag_start = text.rfind('<', 0, cut)
+    if tag_start > text.rfind('>', 0, cut):
+        cut = tag_start
+    entity_start = text.rfind('&', 0, cut)
+    if entity_start != -1 and ';' not in text[entity_start:cut]:
+        cut = entity_start
+    return cut if cut > 0 else limit
+
+
+def fit_cut(text: str, stack: List[Tuple[str, str]], room: int) -> int:
+    """Разрез, после которого начало text вместе с закрывающими тегами умещается в room символов"""
+    cut = safe_cut(text, max(1, room))
+    while cut > 1:
+        overshoot = cut + len(closing_tags(open_tags_after(text[:cut], stack))) - room
+        if overshoot <= 0:
+            break
+        cut = safe_cut(text, max(1, cut - overshoot))
+    return cut
+
+
+def split_html_message(message: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Делит HTML-сообщение на части не длиннее limit по границам строк (слишком длинные строки
+    режутся вне тегов и сущностей). Теги, открытые на границе части, закрываются в её конце
+    и заново открываются в начале следующей; их длина учитывается при выборе места разреза.
+    """
+    if len(message) <= limit:
+        return [message]
+    chunks = []
+    current = ''
+    # Теги, открытые к концу current
+    stack: List[Tuple[str, str]] = []
+    # В current пока только заново открытые теги: перевод строки на стыке не нужен
+    fresh = True
+    for index, line in enumerate(message.split('\n')):
+        separator = '\n' if index else ''
+        while True:
+            if not fresh:
+                room = limit - len(current) - len(separator)
+                after = open_tags_after(line, stack)
+                if len(line) + len(closing_tags(after)) <= room:
+                    current += separator + line
+                    stack = after
+                    break
+                chunks.append(current + closing_tags(stack))
+                current = ''.join(tag for _, tag in stack)
+                fresh = True
+            room = limit - len(current)
+            after = open_tags_after(line, stack)
+            if len(line) + len(closing_tags(after)) <= room:
+                current += line
+                stack = after
+                fresh = False
+                break
+            # Строка не помещается и в пустую часть: режем, продолжение идёт без перевода строки
+            cut = fit_cut(line, stack, room)
+            current += line[:cut]
+            stack = open_tags_after(line[:cut], stack)
+            chunks.append(current + closing_tags(stack))
+            current = ''.join(tag for _, tag in stack)
+            line = line[cut:]
+    chunks.append(current + closing_tags(stack))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
 class TelegramBot:
     
-    def __init__(self, bot_token: str = None, chat_id: str = None):
+    def __init__(self, bot_token: str = None, chat_id: str = None, max_retries: int = DEFAULT_MAX_RETRIES):
         self.bot_token = bot_token or os.getenv('BOT_TOKEN')
         self.chat_id = chat_id or os.getenv('CHAT_ID')
+        self.max_retries = max_retries
+        self.retry = RetryPolicy(max_retries, BACKOFF_BASE, BACKOFF_MAX)
+        # Длительность каждой попытки запроса к Bot API, секунды (для метрик прогона)
+        self.call_latencies: List[float] = []
+        # Одна сессия на все сообщения отчёта (keep-alive до api.telegram.org)
+        self.session = requests.Session()
         
         if not self.bot_token:
             logger.warning("BOT_TOKEN не найден в переменных окружения")
         if not self.chat_id:
             logger.warning("CHAT_ID не найден в переменных окружения")
+
+    def close(self):
+        self.session.close()
+
+    def call(self, method: str, data: Dict[str, Any], files: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Вызывает метод Bot API. При 429 ждёт retry_after из ответа Telegram целиком (до FLOOD_WAIT_MAX),
+        при сетевых ошибках и 5xx повторяет с экспоненциальной задержкой и случайным разбросом (RetryPolicy).
+
+        Returns:
+            Поле result ответа или None при ошибке
+        """
+        url = TELEGRAM_API_URL.format(token=self.bot_token, method=method)
+        for attempt in range(self.max_retries + 1):
+            retry_in = None
+            started = time.perf_counter()
+            try:
+                response = self.session.post(url, data=data, files=files, timeout=REQUEST_TIMEOUT)
+                self.call_latencies.append(time.perf_counter() - started)
+                try:
+                    result = response.json()
+                except ValueError:
+                    result = {}
+                if response.status_code == 429:
+                    retry_after = result.get('parameters', {}).get('retry_after')
+                    # Ранний повтор снова получит 429 и потратит попытку: ждём сколько сказано
+                    retry_in = (min(float(retry_after), FLOOD_WAIT_MAX) if retry_after is not None
+                                else self.retry.delay(attempt))
+                    logger.warning(f"Telegram: слишком много запросов, жду {retry_in:.1f} с")
+                elif response.status_code >= 500:
+                    retry_in = self.retry.delay(attempt)
+                    logger.warning(f"Telegram ответил {response.status_code}, повтор через {retry_in:.1f} с")
+                elif result.get('ok'):
+                    return result.get('result', {})
+                else:
+                    logger.error(f"Ошибка отправки в Telegram: {result.get('description', response.status_code)}")
+                    return None
+            except requests.exceptions.RequestException as e:
+                self.call_latencies.append(time.perf_counter() - started)
+                retry_in = self.retry.delay(attempt)
+                logger.warning(f"Ошибка сети при отправке в Telegram: {e}")
+            if attempt < self.max_retries:
+                # Файлы в files — уже байты, их можно отправить повторно
+                time.sleep(retry_in)
+        logger.error(f"Telegram: не удалось выполнить {method} за {self.max_retries + 1} попыток")
+        return None
     
     def send_message(self, message: str) -> bool:
+        """Отправляет HTML-сообщение; длинное делится на части по MESSAGE_LIMIT символов"""
         if not self.bot_token or not self.chat_id:
             logger.error("BOT_TOKEN или CHAT_ID не настроены")
             return False
-        
-        try:
-            url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+
+        chunks = split_html_message(message)
+        for chunk in chunks:
             data = {
                 'chat_id': self.chat_id,
-                'text': message,
+                'text': chunk,
                 'parse_mode': 'HTML'  # Поддержка HTML разметки
             }
-            
-            response = requests.post(url, data=data, timeout=10)
-            response.raise_for_status()
-            
-            result = response.json()
-            if result.get('ok'):
-                logger.info("Сообщение успешно отправлено в Telegram")
-                return True
-            else:
-                logger.error(f"Ошибка отправки в Telegram: {result.get('description', 'Неизвестная ошибка')}")
+            if self.call('sendMessage', data) is None:
                 return False
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка сети при отправке в Telegram: {e}")
+        logger.info(f"Сообщение успешно отправлено в Telegram (частей: {len(chunks)})")
+        return True
+
+    def send_document(self, filename: str, content: bytes, caption: str = '') -> bool:
+        """Отправляет файл (например, сжатый CSV с полными результатами)"""
+        if not self.bot_token or not self.chat_id:
+            logger.error("BOT_TOKEN или CHAT_ID не настроены")
             return False
-        except Exception as e:
-            logger.error(f"Ошибка отправки в Telegram: {e}")
+        # Подпись обрезается по границе тегов и сущностей: иначе Telegram отклонит весь файл (400)
+        caption = split_html_message(caption, CAPTION_LIMIT)[0] if caption else ''
+        data = {'chat_id': self.chat_id, 'caption': caption, 'parse_mode': 'HTML'}
+        if self.call('sendDocument', data, files={'document': (filename, content)}) is None:
             return False
+        logger.info(f"Файл {filename} отправлен в Telegram ({len(content)} байт)")
+        return True
     
     def send_statistics(self, sites_results: Dict[str, Any]) -> bool:
         try:
@@ -0,0 +1,25 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+
+@pytest.fixture
+def local_server():
+    """
+    Локальный HTTP-сервер на свободном порту: local_server(Handler) возвращает базовый URL.
+    Все запущенные в тесте серверы останавливаются после него
+    """
+    servers = []
+
+    def start(handler) -> str:
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,156 @@
+import threading
+import time
+
+
+def test_fetch_engine_keeps_pair_order():
+    from fetch_engine import FetchEngine
+
+    def analyze(url):
+        time.sleep(0.01 if 'stage' in url else 0.02)
+        return {'url': url}
+
+    engine = FetchEngine(analyze, max_concurrency=4, per_host_concurrency=2)
+    pairs = engine.analyze_pairs(['https://prod/a', 'https://prod/b'], ['https://stage/a', 'https://stage/b'])
+    assert [(p['url'], s['url']) for p, s in pairs] == [
+        ('https://prod/a', 'https://stage/a'),
+        ('https://prod/b', 'https://stage/b'),
+    ]
+
+
+def test_fetch_engine_respects_per_host_limit():
+    from fetch_engine import FetchEngine
+
+    lock = threading.Lock()
+    active = {}
+    peak = {}
+
+    def analyze(url):
+        host = url.split('/')[2]
+        with lock:
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+        time.sleep(0.02)
+        with lock:
+            active[host] -= 1
+        return {'url': url}
+
+    engine = FetchEngine.from_settings(analyze, {'max_concurrency': 6, 'per_host_concurrency': 2})
+    urls = [f'https://{host}/{i}' for i in range(6) for host in ('prod', 'stage')]
+    results = engine.run(urls)
+    assert [r['url'] for r in results] == urls
+    assert peak == {'prod': 2, 'stage': 2}
+
+
+def test_fetch_engine_runs_pair_sides_concurrently_and_times_pairs():
+    from fetch_engine import FetchEngine
+
+    def analyze(url):
+        time.sleep(0.1)
+        return {'url': url}
+
+    engine = FetchEngine(analyze, max_concurrency=2, per_host_concurrency=1)
+    started = time.perf_counter()
+    pairs = engine.analyze_pairs(['https://prod/a'], ['https://stage/a'])
+    elapsed = time.perf_counter() - started
+    assert pairs == [({'url': 'https://prod/a'}, {'url': 'https://stage/a'})]
+    # Стороны пары идут параллельно: время пары ~ одна загрузка, а не сумма двух
+    assert elapsed < 0.18
+    assert len(engine.pair_timings) == 1 and 0.09 < engine.pair_timings[0] < 0.18
+
+
+def test_fetch_engine_reports_each_pair_as_soon_as_it_finishes():
+    from fetch_engine import FetchEngine
+
+    def analyze(url):
+        time.sleep(0.05 if url.endswith('/slow') else 0.0)
+        return {'url': url}
+
+    done = []
+    engine = FetchEngine(analyze, max_concurrency=4, per_host_concurrency=2)
+    engine.analyze_pairs(['https://prod/slow', 'https://prod/fast'], ['https://stage/slow', 'https://stage/fast'],
+                         on_pair=lambda index, prod, stage, pair_time: done.append((index, stage['url'])))
+    assert done == [(1, 'https://stage/fast'), (0, 'https://stage/slow')]
+
+
+def test_fetch_engine_parses_in_process_pool():
+    from fetch_engine import FetchEngine
+    from result_types import PendingParse
+    from page_metrics import parse_worker, parse_page_metrics
+
+    page = b'<html><head><title>T</title></head><body><h1>A</h1><h2>B</h2><h2> </h2></body></html>'
+
+    def analyze(url):
+        return PendingParse(parse_worker, (page, 'html.parser'),
+                            lambda parsed: {'url': url, 'metrics': parsed[0], 'parse': parsed[1]})
+
+    engine = FetchEngine(analyze, max_concurrency=4, per_host_concurrency=2, parse_workers=2)
+    pairs = engine.analyze_pairs(['https://prod/a', 'https://prod/b'], ['https://stage/a', 'https://stage/b'])
+    assert [(p['url'], s['url']) for p, s in pairs] == [
+        ('https://prod/a', 'https://stage/a'),
+        ('https://prod/b', 'https://stage/b'),
+    ]
+    expected = parse_page_metrics(page, 'html.parser')
+    assert all(side['metrics'] == expected for pair in pairs for side in pair)
+    assert all(len(side['parse']) == 2 for pair in pairs for side in pair)
+
+
+def test_fetch_engine_parse_queue_applies_backpressure():
+    from fetch_engine import FetchEngine
+    from result_types import PendingParse
+
+    lock = threading.Lock()
+    state = {'fetched': 0, 'parsed': 0, 'peak': 0}
+
+    def finish(parsed):
+        with lock:
+            state['parsed'] += 1
+        return {'parsed': parsed}
+
+    def analyze(url):
+        with lock:
+            state['fetched'] += 1
+            state['peak'] = max(state['peak'], state['fetched'] - state['parsed'])
+        # Разбор медленнее загрузки: без ограничения очереди все тела скопились бы в памяти
+        return PendingParse(time.sleep, (0.05,), finish)
+
+    engine = FetchEngine(analyze, max_concurrency=2, per_host_concurrency=2, parse_workers=1, parse_queue_size=1)
+    results = engine.run([f'https://prod/{i}' for i in range(10)])
+    assert len(results) == 10 and state['parsed'] == 10
+    # В разборе 1, в очереди 1, ещё по телу держат заблокированные слоты загрузки
+    assert state['peak'] <= 4
+
+
+def test_analyze_url_deferred_parse_matches_inline():
+    from result_types import PendingParse
+    from page_analyzer import analyze_url
+    from result_cache import ContentMemo
+
+    page = b'<html><head><title>T</title><meta name="description" content="D"></head><body><h1>A</h1></body></html>'
+
+    class Response:
+        status_code = 200
+        headers = {'Content-Type': 'text/html; charset=utf-8'}
+        content = page
+
+        def raise_for_status(self):
+            pass
+
+    class Http:
+        def get(self, url, **kwargs):
+            return Response()
+
+    inline = analyze_url('https://prod/a', fetcher=Http(), parser='html.parser')
+    memo = ContentMemo()
+    pending = analyze_url('https://prod/a', fetcher=Http(), parser='html.parser', memo=memo, defer_parse=True)
+    assert isinstance(pending, PendingParse)
+    deferred = pending.complete(pending.func(*pending.args))
+    assert (deferred['status'], deferred['headings'], deferred['seo']) == \
+        (inline['status'], inline['headings'], inline['seo'])
+    assert deferred['timings']['parse'] > 0
+    # Второй раз тело уже в памяти разборов: пулу процессов нечего делать
+    again = analyze_url('https://prod/a', fetcher=Http(), parser='html.parser', memo=memo, defer_parse=True)
+    assert isinstance(again, dict) and again['fetch']['cache'] == 'memo'
+
+    failed = analyze_url('https://prod/a', fetcher=Http(), parser='html.parser', defer_parse=True)
+    result = failed.complete(RuntimeError('разборщик упал'))
+    assert result['status'] == 'error' and result['fetch']['error_type'] == 'RuntimeError'
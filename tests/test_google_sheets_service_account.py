@@ -0,0 +1,29 @@
+from unittest.mock import Mock
+
+def test_sheets_client_retries_quota_errors_with_backoff(monkeypatch):
+    import httplib2
+    from googleapiclient.errors import HttpError
+    import google_sheets_service_account as mod
+
+    monkeypatch.setattr(mod, 'get_sheets_service', lambda **kwargs: Mock())
+    sleeps = []
+    monkeypatch.setattr(mod.time, 'sleep', sleeps.append)
+
+    request = Mock()
+    request.execute.side_effect = [
+        HttpError(httplib2.Response({'status': 429}), b'quota'),
+        HttpError(httplib2.Response({'status': 503}), b'unavailable'),
+        {'totalUpdatedCells': 4},
+    ]
+    sheets = mod.GoogleSheetsServiceAccount(requests_per_minute=0)
+    assert sheets.execute(request) == {'totalUpdatedCells': 4}
+    assert sheets.stats()['requests'] == 3 and sheets.stats()['retries'] == 2
+    assert len(sleeps) == 2 and 0 <= sleeps[0] <= 1 and 0 <= sleeps[1] <= 2
+
+    request.execute.side_effect = HttpError(httplib2.Response({'status': 400}), b'bad request')
+    try:
+        sheets.execute(request)
+        assert False, 'HttpError 400 не должен повторяться'
+    except HttpError:
+        pass
+    assert sheets.stats()['retries'] == 2
@@ -0,0 +1,50 @@
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'<html><h1>ok</h1></html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url(local_server):
+    return local_server(KeepAliveHandler)
+
+
+def test_http_fetcher_reuses_connections(server_url):
+    from http_fetcher import HttpFetcher
+
+    fetcher = HttpFetcher(pool_maxsize=1)
+    for i in range(5):
+        assert fetcher.get(f'{server_url}/page{i}').status_code == 200
+    stats = fetcher.connection_stats()
+    fetcher.close()
+    assert stats == {'requests': 5, 'connections': 1, 'reused': 4}
+
+
+def test_analyze_url_reports_stage_timings_and_connect_only_once(server_url):
+    from http_fetcher import HttpFetcher
+    from page_analyzer import analyze_url
+    from stage_timings import TIMING_STAGES
+
+    fetcher = HttpFetcher(pool_maxsize=1)
+    first = analyze_url(f'{server_url}/a', fetcher=fetcher)
+    second = analyze_url(f'{server_url}/b', fetcher=fetcher)
+    fetcher.close()
+    assert first['status'] == 'success' and list(first['timings']) == list(TIMING_STAGES)
+    assert first['timings']['connect'] > 0 and first['timings']['ttfb'] > 0 and first['timings']['parse'] > 0
+    # Второй запрос идёт по открытому соединению: connect не тратится
+    assert second['timings']['connect'] == 0
+    assert first['fetch'] == {'bytes': len(b'<html><h1>ok</h1></html>'), 'cache': None, 'error_type': None}
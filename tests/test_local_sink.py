@@ -0,0 +1,80 @@
+import csv
+import json
+
+
+def _pair(i, error=None):
+    from result_types import PageMetrics, PairResult
+
+    prod = PageMetrics.from_result({'url': f'https://prod/{i}', 'error': error, 'headings': {'h1_non_empty': 1},
+                                    'seo': {}})
+    return PairResult.from_pages(prod, PageMetrics(f'https://stage/{i}'), 0.5, date='2024-01-01 00:00:00')
+
+
+def test_jsonl_sink_flushes_in_batches_before_close(tmp_path):
+    from local_sink import open_sink
+
+    path = str(tmp_path / 'run.jsonl')
+    sink = open_sink('jsonl', path, flush_every=2)
+    for i in range(3):
+        sink.write('101', _pair(i))
+    # Две пары уже на диске, третья ждёт в буфере
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line)['prod_url'] for line in f] == ['https://prod/0', 'https://prod/1']
+    sink.close()
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 3 and records[0]['site'] == '101' and records[0]['h1_diff'] == -1
+    assert records[0]['pair_time'] == 0.5
+
+
+def test_csv_sink_writes_header_once_across_reopen(tmp_path):
+    from local_sink import open_sink, SINK_FIELDS
+
+    path = str(tmp_path / 'run.csv')
+    with open_sink('csv', path) as sink:
+        sink.write('101', _pair(0, error='timeout'))
+    with open_sink('csv', path) as sink:
+        sink.write('101', _pair(1))
+    with open(path, encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == SINK_FIELDS
+    assert [row['prod_error'] for row in rows] == ['timeout', '']
+
+
+def test_parquet_falls_back_to_jsonl_without_pyarrow(tmp_path, monkeypatch):
+    import local_sink
+
+    monkeypatch.setattr(local_sink, 'pa', None)
+    sink = local_sink.sink_from_settings({'save_local': True, 'local_format': 'parquet',
+                                          'results_dir': str(tmp_path)}, 'run')
+    assert isinstance(sink, local_sink.JsonlSink) and sink.path.endswith('run.jsonl')
+    sink.close()
+    assert local_sink.sink_from_settings({'save_local': False}, 'run') is None
+
+
+def test_sink_writes_run_summary_next_to_results(tmp_path):
+    from local_sink import open_sink
+
+    with open_sink('csv', str(tmp_path / 'run.csv')) as sink:
+        sink.write_summary({'pages': 2, 'stages': {'parse': {'total': 0.5}}})
+    with open(tmp_path / 'run.summary.json', encoding='utf-8') as f:
+        assert json.load(f)['stages']['parse']['total'] == 0.5
+
+
+def test_parquet_sink_parts_are_readable_before_close(tmp_path):
+    import pytest
+    pq = pytest.importorskip('pyarrow.parquet')
+    from local_sink import open_sink
+
+    path = str(tmp_path / 'run.parquet')
+    sink = open_sink('parquet', path, flush_every=2)
+    for i in range(3):
+        sink.write('101', _pair(i))
+    # Прогон «упал» до close: сброшенная пачка уже читается
+    assert pq.read_table(path).column('prod_url').to_pylist() == ['https://prod/0', 'https://prod/1']
+    sink.close()
+    with open_sink('parquet', path) as sink:
+        sink.write('101', _pair(3, error='timeout'))
+    table = pq.read_table(path)
+    assert table.num_rows == 4 and table.column('prod_error').to_pylist()[-1] == 'timeout'
+    assert table.column('h1_diff').to_pylist()[0] == -1
@@ -0,0 +1,114 @@
+def test_run_metrics_renders_gauges_and_histograms_by_site_and_env(tmp_path):
+    from metrics_exporter import RunMetrics
+
+    metrics = RunMetrics(str(tmp_path / 'inspector.prom'))
+    metrics.observe_page('101', 'prod', {'url': 'https://prod/1', 'error': None,
+                                         'timings': {'ttfb': 0.2, 'download': 0.1, 'parse': 0.03},
+                                         'fetch': {'bytes': 1000, 'cache': 'memo', 'error_type': None}})
+    metrics.observe_page('101', 'stage', {'url': 'https://stage/1', 'error': '503 Server Error',
+                                          'timings': {'ttfb': 2.0},
+                                          'fetch': {'bytes': 10, 'cache': None, 'error_type': 'http_503'}})
+    metrics.observe_calls('telegram', [0.4])
+    metrics.write()
+
+    with open(tmp_path / 'inspector.prom', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert '# TYPE links_inspector_last_run_pages gauge' in lines
+    # Файл пишется с нуля каждым прогоном: counter-ов в нём нет, иначе каждый прогон выглядит сбросом
+    assert not any(line.startswith('# TYPE') and line.endswith(' counter') for line in lines)
+    assert 'links_inspector_last_run_pages{env="prod",site="101"} 1' in lines
+    assert 'links_inspector_last_run_page_bytes{env="prod",site="101"} 1000' in lines
+    assert 'links_inspector_last_run_page_errors{env="stage",site="101",type="http_503"} 1' in lines
+    assert 'links_inspector_last_run_cache_hits{env="prod",kind="memo",site="101"} 1' in lines
+    # Гистограммы накопительные: 0.3 с загрузки попадает в корзины от 0.5
+    assert 'links_inspector_fetch_seconds_bucket{env="prod",site="101",le="0.25"} 0' in lines
+    assert 'links_inspector_fetch_seconds_bucket{env="prod",site="101",le="0.5"} 1' in lines
+    assert 'links_inspector_fetch_seconds_bucket{env="stage",site="101",le="+Inf"} 1' in lines
+    assert 'links_inspector_api_call_seconds_count{service="telegram"} 1' in lines
+    assert any(line.startswith('links_inspector_last_run_timestamp_seconds ') for line in lines)
+
+
+def test_run_sites_writes_metrics_file(monkeypatch, tmp_path):
+    import multi_site_analyzer as mod
+
+    class DummyBot:
+        bot_token = 'token'
+        chat_id = 'chat'
+        call_latencies = [0.1, 0.2]
+        def send_message(self, message):
+            pass
+
+    def fake_analyze(url, **kwargs):
+        return {'url': url, 'status': 'success', 'error': None, 'headings': {}, 'seo': {},
+                'timings': {'ttfb': 0.01}, 'fetch': {'bytes': 5, 'cache': None, 'error_type': None}}
+
+    monkeypatch.setattr(mod, 'TelegramBot', DummyBot)
+    monkeypatch.setattr(mod, 'analyze_url', fake_analyze)
+    monkeypatch.setattr(mod, 'load_site_urls', lambda site: (site['prod'], site['stage']))
+
+    path = tmp_path / 'inspector.prom'
+    config = {'default_settings': {'upload_to_sheets': False, 'metrics_file': str(path)},
+              'sites': {'a': {'prod': ['https://prod/0', 'https://prod/1'], 'stage': ['https://stage/0', 'https://stage/1']}}}
+    mod.run_sites(config=config)
+
+    text = path.read_text(encoding='utf-8')
+    assert 'links_inspector_last_run_pages{env="stage",site="a"} 2' in text
+    assert 'links_inspector_last_run_page_bytes{env="prod",site="a"} 10' in text
+    assert 'links_inspector_api_call_seconds_count{service="telegram"} 2' in text
+
+
+def test_run_sites_labels_identical_prod_and_stage_urls_by_env(monkeypatch, tmp_path):
+    import multi_site_analyzer as mod
+
+    def fake_analyze(url, **kwargs):
+        return {'url': url, 'status': 'success', 'error': None, 'headings': {}, 'seo': {},
+                'timings': {'ttfb': 0.01}, 'fetch': {'bytes': 5, 'cache': None, 'error_type': None}}
+
+    class DummyBot:
+        bot_token = None
+        chat_id = None
+
+    monkeypatch.setattr(mod, 'TelegramBot', DummyBot)
+    monkeypatch.setattr(mod, 'analyze_url', fake_analyze)
+    monkeypatch.setattr(mod, 'load_site_urls', lambda site: (site['prod'], site['stage']))
+
+    path = tmp_path / 'inspector.prom'
+    # Относительные пути: URL прода и стейджа одинаковы, метрики всё равно делятся по окружению
+    config = {'default_settings': {'upload_to_sheets': False, 'metrics_file': str(path)},
+              'sites': {'a': {'prod': ['/0', '/1', '/2'], 'stage': ['/0', '/1', '/2']}}}
+    mod.run_sites(config=config)
+
+    text = path.read_text(encoding='utf-8')
+    assert 'links_inspector_last_run_pages{env="prod",site="a"} 3' in text
+    assert 'links_inspector_last_run_pages{env="stage",site="a"} 3' in text
+
+
+def test_run_sites_writes_metrics_even_when_reporting_fails(monkeypatch, tmp_path):
+    import pytest
+    import multi_site_analyzer as mod
+
+    class BrokenBot:
+        bot_token = 'token'
+        chat_id = 'chat'
+        call_latencies = [0.3]
+
+        def send_message(self, message):
+            raise RuntimeError('Telegram недоступен')
+
+    def fake_analyze(url, **kwargs):
+        return {'url': url, 'status': 'success', 'error': None, 'headings': {}, 'seo': {},
+                'timings': {'ttfb': 0.01}, 'fetch': {'bytes': 5, 'cache': None, 'error_type': None}}
+
+    monkeypatch.setattr(mod, 'TelegramBot', BrokenBot)
+    monkeypatch.setattr(mod, 'analyze_url', fake_analyze)
+    monkeypatch.setattr(mod, 'load_site_urls', lambda site: (site['prod'], site['stage']))
+
+    path = tmp_path / 'inspector.prom'
+    config = {'default_settings': {'upload_to_sheets': False, 'metrics_file': str(path)},
+              'sites': {'a': {'prod': ['https://prod/0'], 'stage': ['https://stage/0']}}}
+    with pytest.raises(RuntimeError):
+        mod.run_sites(config=config)
+
+    text = path.read_text(encoding='utf-8')
+    assert 'links_inspector_last_run_pages{env="prod",site="a"} 1' in text
+    assert 'links_inspector_api_call_seconds_count{service="telegram"} 1' in text
@@ -4,7 +4,7 @@ from unittest.mock import patch, Mock
 import pytest
 
 
-@patch('multi_site_analyzer_mol.requests.get')
+@patch('page_analyzer.requests.get')
 def test_mol_analyze_url_title_description(mock_get):
     html = b"""
     <html>
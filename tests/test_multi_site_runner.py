@@ -0,0 +1,48 @@
+def test_run_sites_filters_sites_and_shares_clients(monkeypatch):
+    import multi_site_analyzer as mod
+
+    created = {'sheets': 0, 'bots': 0}
+    written = []
+    sent = []
+
+    class DummySheets:
+        def __init__(self, *args, **kwargs):
+            created['sheets'] += 1
+        def batch_update_values(self, spreadsheet_id, data):
+            written.append([(block['range'], len(block['values'])) for block in data])
+            return {}
+
+    class DummyBot:
+        bot_token = 'token'
+        chat_id = 'chat'
+        def __init__(self):
+            created['bots'] += 1
+        def send_message(self, message):
+            sent.append(message)
+
+    def fake_analyze(url, **kwargs):
+        h1 = 1 if '//prod' in url else 0
+        return {'url': url, 'status': 'success', 'error': None, 'headings': {'h1_non_empty': h1}, 'seo': {}}
+
+    monkeypatch.setattr(mod, 'GoogleSheetsServiceAccount', DummySheets)
+    monkeypatch.setattr(mod, 'TelegramBot', DummyBot)
+    monkeypatch.setattr(mod, 'analyze_url', fake_analyze)
+    monkeypatch.setattr(mod, 'load_site_urls', lambda site: (site['prod'], site['stage']))
+
+    def site(name, count):
+        return {
+            'name': name, 'sheet_name': name, 'report_title': f'{name} report',
+            'prod': [f'https://prod-{name}/{i}' for i in range(count)],
+            'stage': [f'https://stage-{name}/{i}' for i in range(count)],
+        }
+
+    config = {'default_settings': {}, 'sites': {'a': site('a', 2), 'b': site('b', 1), 'c': site('c', 3)}}
+    results = mod.run_sites(['a', 'b'], config=config)
+
+    assert list(results) == ['a', 'b']
+    assert [r['stage_url'] for r in results['a']] == ['https://stage-a/0', 'https://stage-a/1']
+    assert results['b'][0]['h1_diff'] == -1
+    assert created == {'sheets': 1, 'bots': 1}
+    # Листы обоих сайтов ушли одним запросом batchUpdate
+    assert written == [[('a!A1', 3), ('b!A1', 2)]]
+    assert len(sent) == 2 and '<b>a report</b>' in sent[0]
@@ -0,0 +1,101 @@
+import time
+from http.server import BaseHTTPRequestHandler
+from unittest.mock import MagicMock
+
+import pytest
+
+
+def test_analyze_url_stream_mode_reads_body_in_chunks():
+    from page_analyzer import analyze_url
+
+    html = '<html><head><title>Тарифы</title></head><body><h1>Заголовок</h1><h2> </h2></body></html>'.encode('utf-8')
+    response = MagicMock(headers={'Content-Type': 'text/html'})
+    response.__enter__.return_value = response
+    response.iter_content.return_value = [html[i:i + 7] for i in range(0, len(html), 7)]
+    fetcher = MagicMock()
+    fetcher.get.return_value = response
+
+    r = analyze_url('https://x', fetcher=fetcher, parser='stream')
+    assert fetcher.get.call_args.kwargs['stream'] is True
+    assert r['status'] == 'success'
+    assert r['headings']['h1_non_empty'] == 1 and r['headings']['h2_total'] == 1
+    assert r['seo']['title_non_empty'] == 1
+
+
+class LimitsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        page = b'<html><head><title>OK</title></head><body><h1>H1</h1></body></html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        if self.path == '/declared-huge':
+            self.send_header('Content-Length', str(10 ** 9))
+            self.end_headers()
+            return
+        if self.path in ('/chunked-huge', '/slow'):
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for _ in range(20):
+                chunk = b'<p>' + b'x' * 1000 + b'</p>'
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                self.wfile.flush()
+                if self.path == '/slow':
+                    time.sleep(0.05)
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        self.send_header('Content-Length', str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def limits_server(local_server):
+    return local_server(LimitsHandler)
+
+
+@pytest.mark.parametrize('parser', ['html.parser', 'stream'])
+def test_analyze_url_stops_on_body_size_and_deadline(limits_server, parser):
+    from http_fetcher import HttpFetcher
+    from page_analyzer import analyze_url, DownloadLimits
+
+    fetcher = HttpFetcher()
+    limits = DownloadLimits(max_bytes=5000, deadline=0.3)
+    declared = analyze_url(f'{limits_server}/declared-huge', fetcher=fetcher, parser=parser, limits=limits)
+    streamed = analyze_url(f'{limits_server}/chunked-huge', fetcher=fetcher, parser=parser, limits=limits)
+    slow = analyze_url(f'{limits_server}/slow', fetcher=fetcher, parser=parser,
+                       limits=DownloadLimits(max_bytes=10 ** 6, deadline=0.3))
+    ok = analyze_url(f'{limits_server}/ok', fetcher=fetcher, parser=parser, limits=limits)
+    fetcher.close()
+
+    assert declared['status'] == 'too_large' and declared['fetch']['bytes'] == 0
+    assert streamed['status'] == 'too_large' and streamed['fetch']['bytes'] <= 5000 + 64 * 1024
+    assert slow['status'] == 'truncated' and 'обрезано' in slow['error']
+    assert slow['fetch']['error_type'] == 'truncated'
+    assert ok['status'] == 'success' and ok['headings']['h1_non_empty'] == 1
+
+
+@pytest.mark.parametrize('parser', ['html.parser', 'stream'])
+def test_download_deadline_ignores_rate_limiter_wait(limits_server, parser):
+    from http_fetcher import HttpFetcher
+    from page_analyzer import analyze_url, DownloadLimits
+
+    class SlowLimiter:
+        waited = 0.0
+
+        def acquire(self, url):
+            # Троттлинг дольше дедлайна: тело при этом приходит быстро и целиком
+            time.sleep(0.4)
+            self.waited += 0.4
+            return 0.4
+
+    fetcher = HttpFetcher()
+    fetcher.rate_limiter = SlowLimiter()
+    result = analyze_url(f'{limits_server}/ok', fetcher=fetcher, parser=parser,
+                         limits=DownloadLimits(max_bytes=5000, deadline=0.3))
+    fetcher.close()
+    assert result['status'] == 'success' and result['headings']['h1_non_empty'] == 1
+    assert result['timings']['wait'] >= 0.4
@@ -0,0 +1,91 @@
+import re
+
+import pytest
+from bs4 import BeautifulSoup
+
+
+def legacy_metrics(soup):
+    """Прежний подсчёт из analyze_url: отдельный find_all на каждый тег"""
+    headings = {}
+    for i in range(1, 7):
+        tag = f'h{i}'
+        elements = soup.find_all(tag)
+        headings[f'{tag}_total'] = len(elements)
+        headings[f'{tag}_non_empty'] = len([el for el in elements if el.get_text(strip=True)])
+    headings['total_headings'] = sum(headings[f'h{i}_non_empty'] for i in range(1, 7))
+
+    title_elements = soup.find_all('title')
+    title_non_empty = 0
+    for t in title_elements:
+        text = (t.get_text() or '').strip()
+        if text and not re.search(r'error', text, re.IGNORECASE):
+            title_non_empty += 1
+
+    description_elements = soup.find_all('meta', attrs={'name': re.compile(r'^description$', re.IGNORECASE)})
+    description_non_empty = 0
+    for m in description_elements:
+        content = (m.get('content') or '').strip()
+        if content and not re.search(r'error', content, re.IGNORECASE):
+            description_non_empty += 1
+
+    seo = {
+        'title_total': len(title_elements),
+        'title_non_empty': title_non_empty,
+        'description_total': len(description_elements),
+        'description_non_empty': description_non_empty,
+    }
+    return headings, seo
+
+
+HTML_CORPUS = [
+    '',
+    '<html><head></head><body></body></html>',
+    "<html><head><title>OK</title><meta name='description' content='Desc'/>"
+    "<meta name='description' content='error'/></head><body><h1>H1</h1><h2> </h2></body></html>",
+    '<title>ok</title><title>Error 404</title><title>   </title><title></title>',
+    "<meta name='DESCRIPTION' content='x'><meta name='Description' content='  '>"
+    "<meta name='description'><meta name='og:description' content='y'><meta content='z'>"
+    "<meta name='description ' content='w'><meta property='description' content='v'>",
+    '<h1><span> </span><b>text</b></h1><h2><!-- comment --></h2><h3>&nbsp;</h3><h4><img alt="a"></h4>',
+    '<h1>outer<h2>inner</h2></h1><h5>five</h5><h6></h6><H1>upper</H1>',
+    '<svg><title>icon</title></svg><body><title>second</title><h3>t<h3>u</h3></h3></body>',
+    '<div><h2>a</h2><h2>b</h2><h2> </h2>' * 50 + '</div>',
+    '<head><meta name="description" content="ERROR in page"><title>Server Error</title></head>'
+    '<body><script>var h1 = "<h1>no</h1>";</script><style>h2 {}</style></body>',
+    '<p>unclosed <h1>heading <p>para<h2>two',
+]
+
+
+@pytest.mark.parametrize('html', HTML_CORPUS)
+def test_extract_page_metrics_matches_legacy(html):
+    from page_metrics import extract_page_metrics
+
+    soup = BeautifulSoup(html, 'html.parser')
+    assert extract_page_metrics(soup) == legacy_metrics(soup)
+
+
+@pytest.mark.parametrize('parser', ['lxml', 'selectolax'])
+def test_parser_backends_match_html_parser(parser):
+    from page_metrics import parse_page_metrics, resolve_parser
+
+    pytest.importorskip(parser)
+    html = HTML_CORPUS[2].encode('utf-8') + HTML_CORPUS[8].encode('utf-8')
+    assert resolve_parser(parser) == parser
+    assert parse_page_metrics(html, parser) == parse_page_metrics(html, 'html.parser')
+
+
+def test_resolve_parser_rejects_unknown_backend():
+    from page_metrics import resolve_parser
+
+    with pytest.raises(ValueError):
+        resolve_parser('html5lib')
+
+
+@pytest.mark.parametrize('html', HTML_CORPUS)
+def test_stream_metrics_match_tree_in_small_chunks(html):
+    from page_metrics import parse_page_metrics, stream_page_metrics
+
+    content = html.encode('utf-8')
+    # Маленькие куски режут теги и многобайтовые символы посередине
+    chunks = [content[i:i + 5] for i in range(0, len(content), 5)]
+    assert stream_page_metrics(chunks) == parse_page_metrics(content, 'html.parser')
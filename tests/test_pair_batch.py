@@ -0,0 +1,56 @@
+import random
+
+
+def _random_page(rng, url):
+    from result_types import METRIC_FIELDS
+
+    counts = {}
+    for name in METRIC_FIELDS:
+        if name.endswith('_total'):
+            counts[name] = rng.randint(0, 4)
+    for name in METRIC_FIELDS:
+        if name.endswith('_non_empty'):
+            counts[name] = rng.randint(0, counts[name.replace('_non_empty', '_total')])
+    headings = {k: v for k, v in counts.items() if k.startswith('h')}
+    headings['total_headings'] = sum(headings[f'h{i}_non_empty'] for i in range(1, 7))
+    seo = {k: v for k, v in counts.items() if not k.startswith('h')}
+    error = 'timeout' if rng.random() < 0.1 else None
+    return {'url': url, 'status': 'error' if error else 'success', 'error': error,
+            'headings': {} if error else headings, 'seo': {} if error else seo}
+
+
+def test_pair_batch_matches_per_pair_comparison():
+    from pair_batch import PairBatch
+    from result_types import PageMetrics, PairResult
+
+    rng = random.Random(7)
+    prod = [PageMetrics.from_result(_random_page(rng, f'https://prod/{i}')) for i in range(300)]
+    stage = [PageMetrics.from_result(_random_page(rng, f'https://stage/{i}')) for i in range(300)]
+    timings = [rng.random() for _ in prod]
+
+    batch = PairBatch.from_pages(prod, stage, timings, date='2024-01-01 00:00:00')
+    expected = [PairResult.from_pages(p, s, t, date='2024-01-01 00:00:00') for p, s, t in zip(prod, stage, timings)]
+    assert [r.to_row() for r in batch.pair_results()] == [r.to_row() for r in expected]
+    assert [r.pair_time for r in batch.pair_results()] == [r.pair_time for r in expected]
+
+    # Сводка такая же, как у прежних циклов в send_telegram_report
+    diffs = [r for r in expected if r.has_diff]
+    assert batch.summary() == {
+        'total': 300,
+        'errors': sum(1 for r in expected if r.has_error),
+        'diffs': len(diffs),
+        'heading_diffs': sum(1 for r in diffs if any(r.heading_diffs)),
+        'title_diffs': sum(1 for r in diffs if r.title_diff != 0),
+        'description_diffs': sum(1 for r in diffs if r.description_diff != 0),
+    }
+    assert [r.to_row() for r in batch.rows(batch.error_mask, 10)] == \
+        [r.to_row() for r in expected if r.has_error][:10]
+    assert [r.to_row() for r in PairBatch.from_results(expected).pair_results()] == [r.to_row() for r in expected]
+
+
+def test_pair_batch_handles_empty_input():
+    from pair_batch import PairBatch
+
+    batch = PairBatch.from_pages([], [])
+    assert len(batch) == 0 and batch.pair_results() == []
+    assert batch.summary()['total'] == 0 and PairBatch.from_results([]).summary()['diffs'] == 0
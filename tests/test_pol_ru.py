@@ -4,7 +4,7 @@ from unittest.mock import patch, Mock
 import pytest
 
 
-@patch('multi_site_analyzer_pol.requests.get')
+@patch('page_analyzer.requests.get')
 def test_pol_analyze_url_title_description(mock_get):
     html = b"""
     <html>
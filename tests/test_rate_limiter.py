@@ -0,0 +1,40 @@
+def test_token_bucket_allows_burst_then_throttles():
+    from rate_limiter import TokenBucket
+
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    wait = bucket.reserve()
+    assert 0.05 < wait <= 0.1
+
+
+def test_host_rate_limiter_configures_prod_and_stage_separately():
+    from rate_limiter import HostRateLimiter
+
+    limiter = HostRateLimiter()
+    site = {'rate_limit': {'prod': {'requests_per_second': 5, 'burst': 3}}}
+    limiter.configure_site(site, {'delay_between_requests': 2},
+                           ['https://prod.example/a', 'https://prod.example/b'],
+                           ['https://stage.example/a'])
+    assert limiter.buckets['prod.example'].rate == 5
+    assert limiter.buckets['prod.example'].burst == 3
+    # Для stage лимит не задан, берётся delay_between_requests
+    assert limiter.buckets['stage.example'].rate == 0.5
+    assert limiter.acquire('https://other.example/') == 0
+
+
+def test_host_rate_limiter_keeps_strictest_limit_for_shared_host(caplog):
+    from rate_limiter import HostRateLimiter
+
+    limiter = HostRateLimiter()
+    # Прод и стейдж на одном хосте: более мягкий лимит стейджа не должен ослабить прод
+    site = {'rate_limit': {'prod': {'requests_per_second': 2, 'burst': 4},
+                           'stage': {'requests_per_second': 10, 'burst': 2}}}
+    limiter.configure_site(site, {}, ['https://shared.example/a'], ['https://shared.example/b'])
+    bucket = limiter.buckets['shared.example']
+    assert (bucket.rate, bucket.burst) == (2, 2)
+    assert 'более строгий' in caplog.text
+
+    # Другой сайт на том же хосте без лимита не снимает настроенный
+    limiter.configure_site({}, {}, ['https://shared.example/c'], [])
+    assert limiter.buckets['shared.example'] is bucket
@@ -0,0 +1,59 @@
+from unittest.mock import Mock
+
+
+HTML = b'<html><head><title>OK</title></head><body><h1>H1</h1></body></html>'
+
+
+def test_validator_cache_reuses_result_on_304_across_runs(tmp_path):
+    from page_analyzer import analyze_url
+    from result_cache import ValidatorCache
+
+    path = str(tmp_path / 'validators.json')
+    fetcher = Mock()
+    fetcher.get.return_value = Mock(status_code=200, content=HTML, headers={'ETag': '"v1"'})
+    cache = ValidatorCache(path)
+    first = analyze_url('https://x', fetcher=fetcher, cache=cache)
+    cache.save()
+
+    # Следующий прогон: сервер отвечает 304 без тела
+    fetcher.get.return_value = Mock(status_code=304, content=b'', headers={})
+    cache = ValidatorCache(path)
+    second = analyze_url('https://x', fetcher=fetcher, cache=cache)
+    assert fetcher.get.call_args.kwargs['headers'] == {'If-None-Match': '"v1"'}
+    # Время этапов и сведения о загрузке у каждого запроса свои, результат анализа — из кэша
+    assert all(second[key] == first[key] for key in ('url', 'status', 'error', 'headings', 'seo'))
+    assert second['headings']['h1_non_empty'] == 1 and second['fetch']['cache'] == 'not_modified'
+    assert cache.stats() == {'hits_not_modified': 1, 'hits_same_body': 0, 'misses': 0}
+
+
+def test_validator_cache_reuses_result_for_unchanged_body(tmp_path):
+    from page_analyzer import analyze_url
+    from result_cache import ValidatorCache
+
+    fetcher = Mock()
+    fetcher.get.return_value = Mock(status_code=200, content=HTML, headers={})
+    cache = ValidatorCache(str(tmp_path / 'validators.json'))
+    analyze_url('https://x', fetcher=fetcher, cache=cache)
+    analyze_url('https://x', fetcher=fetcher, cache=cache)
+    assert cache.stats() == {'hits_not_modified': 0, 'hits_same_body': 1, 'misses': 1}
+
+
+def test_content_memo_parses_identical_bodies_once_and_evicts_lru(tmp_path):
+    from page_analyzer import analyze_url
+    from result_cache import ContentMemo
+
+    fetcher = Mock()
+    fetcher.get.return_value = Mock(status_code=200, content=HTML, headers={})
+    memo = ContentMemo(max_entries=2, path=str(tmp_path / 'memo.json'))
+    prod = analyze_url('https://prod/x', fetcher=fetcher, memo=memo)
+    stage = analyze_url('https://stage/x', fetcher=fetcher, memo=memo)
+    assert stage['headings'] == prod['headings'] and stage['url'] == 'https://stage/x'
+
+    memo.put('html.parser', 'b', ({}, {}))
+    memo.put('html.parser', 'c', ({}, {}))
+    stats = memo.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['size']) == (1, 1, 1, 2)
+    assert stats['hit_rate'] == 0.5
+
+    memo.save()
+    assert list(ContentMemo(2, memo.path).entries) == ['html.parser:b', 'html.parser:c']
@@ -0,0 +1,38 @@
+def _page(url, h1, h2_total, title, error=None):
+    headings = {'h1_total': h1, 'h1_non_empty': h1, 'h2_total': h2_total, 'h2_non_empty': 0,
+                'total_headings': h1}
+    seo = {'title_total': 1, 'title_non_empty': title, 'description_total': 0, 'description_non_empty': 0}
+    return {'url': url, 'status': 'error' if error else 'success', 'error': error, 'headings': headings, 'seo': seo}
+
+
+def test_pair_result_matches_compare_headings():
+    from multi_site_analyzer import compare_headings
+    from result_types import PageMetrics, PairResult
+
+    prod = _page('https://prod/x', 2, 3, 1)
+    stage = _page('https://stage/x', 1, 1, 0)
+    pair = PairResult.from_pages(PageMetrics.from_result(prod), PageMetrics.from_result(stage), 0.12345)
+    comparison = compare_headings(prod, stage)
+
+    assert pair['h1_diff'] == comparison['h1_non_empty']['diff'] == -1
+    assert pair.total_diff == comparison['total_headings']['diff']
+    assert pair.title_diff == comparison['title_non_empty']['diff'] == -1
+    assert (pair['prod_total_all'], pair['stage_total_all']) == (5, 2)
+    assert pair.has_diff and not pair.has_error
+    assert pair.pair_time == 0.123 and pair.get('missing', 0) == 0
+    assert not hasattr(pair, '__dict__')
+
+
+def test_writers_accept_pair_results_and_dict_rows():
+    from result_types import PageMetrics, PairResult, PAIR_COLUMNS, as_pair_result
+
+    failed = PageMetrics.from_result({'url': 'https://prod/y', 'error': 'timeout', 'headings': {}, 'seo': {}})
+    pair = PairResult.from_pages(failed, PageMetrics('https://stage/y'), date='2024-01-01 00:00:00')
+    row = pair.to_row()
+    assert len(row) == 3 + len(PAIR_COLUMNS) + 2
+    assert row[:3] == ['2024-01-01 00:00:00', 'https://prod/y', 'https://stage/y'] and row[-2:] == ['timeout', None]
+
+    legacy = dict(zip(PAIR_COLUMNS, [0] * len(PAIR_COLUMNS)), date=row[0], prod_url=row[1], stage_url=row[2],
+                  prod_error='timeout', stage_error=None)
+    assert as_pair_result(legacy).to_row() == row
+    assert as_pair_result(pair) is pair and pair.has_error
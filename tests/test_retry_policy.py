@@ -0,0 +1,113 @@
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    hits = {}
+
+    def do_GET(self):
+        hits = FlakyHandler.hits
+        hits[self.path] = hits.get(self.path, 0) + 1
+        if self.path.startswith('/down'):
+            status = 503
+        elif self.path == '/busy' and hits[self.path] == 1:
+            status = 429
+        else:
+            status = 200
+        body = b'<html><h1>ok</h1></html>'
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flaky_url(local_server):
+    FlakyHandler.hits = {}
+    return local_server(FlakyHandler)
+
+
+def test_retry_after_parses_seconds_and_http_dates():
+    from retry_policy import retry_after_seconds, RetryPolicy
+
+    assert retry_after_seconds('7') == 7.0
+    assert retry_after_seconds('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert retry_after_seconds('soon') is None
+    policy = RetryPolicy(backoff_base=0.1, backoff_max=5)
+    assert 0 <= policy.delay(0) <= 0.1
+    assert policy.delay(0, retry_after=3) >= 3 and policy.delay(0, retry_after=100) == 5
+
+
+def test_fetcher_retries_429_and_5xx_without_tripping_breaker(flaky_url):
+    from http_fetcher import HttpFetcher
+    from page_analyzer import analyze_url
+    from retry_policy import RetryPolicy, HostCircuitBreaker
+
+    fetcher = HttpFetcher(retry=RetryPolicy(max_retries=2, backoff_base=0.01),
+                          breaker=HostCircuitBreaker(failure_threshold=2, reset_after=60))
+    assert fetcher.get(f'{flaky_url}/busy').status_code == 200
+    assert FlakyHandler.hits['/busy'] == 2
+
+    # Постоянный 503 у отдельных страниц: каждая повторяется, но хост отвечает и не выключается
+    down = [analyze_url(f'{flaky_url}/down/{i}', fetcher=fetcher) for i in range(3)]
+    ok = analyze_url(f'{flaky_url}/ok', fetcher=fetcher)
+    fetcher.close()
+
+    assert all(r['fetch']['error_type'] == 'http_503' for r in down)
+    assert [FlakyHandler.hits[f'/down/{i}'] for i in range(3)] == [3, 3, 3]
+    assert ok['status'] == 'success'
+    assert fetcher.retries == 1 + 3 * 2 and fetcher.breaker.rejected == 0
+    assert fetcher.breaker.open_hosts() == {}
+
+
+def test_breaker_counts_one_failure_per_request_after_retries():
+    import socket
+    from http_fetcher import HttpFetcher
+    from page_analyzer import analyze_url
+    from retry_policy import RetryPolicy, HostCircuitBreaker
+
+    # Порт, на котором никто не слушает: соединение сразу отклоняется
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        dead_url = f'http://127.0.0.1:{sock.getsockname()[1]}'
+
+    fetcher = HttpFetcher(retry=RetryPolicy(max_retries=2, backoff_base=0.01),
+                          breaker=HostCircuitBreaker(failure_threshold=2, reset_after=60))
+    first = analyze_url(f'{dead_url}/1', fetcher=fetcher)
+    # Три попытки первой страницы — одна неудача, хост ещё включён
+    assert first['fetch']['error_type'] == 'connection' and fetcher.breaker.open_hosts() == {}
+    second = analyze_url(f'{dead_url}/2', fetcher=fetcher)
+    rest = [analyze_url(f'{dead_url}/{i}', fetcher=fetcher) for i in range(3, 6)]
+    fetcher.close()
+
+    assert second['fetch']['error_type'] == 'connection'
+    assert all(r['fetch']['error_type'] == 'host_unavailable' and 'Хост недоступен' in r['error'] for r in rest)
+    assert fetcher.retries == 4 and fetcher.breaker.rejected == 3
+
+
+def test_breaker_lets_one_probe_through_after_reset(monkeypatch):
+    import retry_policy
+    from retry_policy import HostCircuitBreaker, HostUnavailable
+
+    now = [100.0]
+    monkeypatch.setattr(retry_policy.time, 'monotonic', lambda: now[0])
+    breaker = HostCircuitBreaker(failure_threshold=2, reset_after=10)
+    breaker.record_failure('stage')
+    breaker.check('stage')
+    breaker.record_failure('stage')
+    with pytest.raises(HostUnavailable):
+        breaker.check('stage')
+    now[0] += 10
+    breaker.check('stage')
+    with pytest.raises(HostUnavailable):
+        breaker.check('stage')
+    breaker.record_success('stage')
+    breaker.check('stage')
+    assert breaker.open_hosts() == {}
@@ -0,0 +1,110 @@
+def _page(url, h1, error=None):
+    from result_types import PageMetrics
+
+    return PageMetrics.from_result({'url': url, 'error': error, 'headings': {'h1_total': h1, 'h1_non_empty': h1},
+                                    'seo': {'title_total': 1, 'title_non_empty': 1}})
+
+
+def test_run_history_compares_with_previous_run(tmp_path):
+    from run_history import RunHistory
+
+    history = RunHistory(str(tmp_path / 'history.sqlite3'))
+    first = history.start_run(['101'])
+    history.record_pages(first, '101', 'prod', [_page('https://prod/a', 1), _page('https://prod/b', 2)])
+
+    second = history.start_run(['101'])
+    pages = [_page('https://prod/a', 1), _page('https://prod/b', 3), _page('https://prod/c', 1)]
+    history.record_pages(second, '101', 'prod', pages)
+    comparison = {c['url']: c for c in history.compare_with_previous(second, '101', 'prod', pages)}
+
+    assert [comparison[url]['status'] for url in ('https://prod/a', 'https://prod/b', 'https://prod/c')] == \
+        ['unchanged', 'changed', 'new']
+    assert comparison['https://prod/b']['changes'] == {
+        'h1_total': {'previous': 2, 'current': 3, 'difference': 1},
+        'h1_non_empty': {'previous': 2, 'current': 3, 'difference': 1},
+    }
+    # Другие сайты не смешиваются со своими URL
+    assert history.compare_with_previous(second, 'МОЛ', 'prod', pages)[0]['status'] == 'new'
+    plan = ' '.join(row[3] for row in history.connection.execute(
+        'EXPLAIN QUERY PLAN SELECT * FROM page_metrics WHERE site = ? AND env = ? AND url = ? AND run_ts < ? '
+        'ORDER BY run_ts DESC LIMIT 1', ('101', 'prod', 'https://prod/a', 'x')))
+    assert 'USING INDEX' in plan
+    history.close()
+
+
+def test_run_history_changed_since_run(tmp_path):
+    from run_history import RunHistory
+
+    history = RunHistory(str(tmp_path / 'history.sqlite3'))
+    first = history.start_run(['101'])
+    history.record_pages(first, '101', 'prod', [_page('https://prod/a', 1), _page('https://prod/b', 1)])
+    history.record_pages(first, '101', 'stage', [_page('https://stage/a', 1)])
+    second = history.start_run(['101'])
+    history.record_pages(second, '101', 'prod', [_page('https://prod/a', 1), _page('https://prod/b', 1, 'timeout')])
+    history.record_pages(second, '101', 'stage', [_page('https://stage/a', 0)])
+    third = history.start_run(['101'])
+    history.record_pages(third, '101', 'prod', [_page('https://prod/a', 1), _page('https://prod/b', 1),
+                                                _page('https://prod/new', 1)])
+    history.record_pages(third, '101', 'stage', [_page('https://stage/a', 0)])
+
+    since_first = {(c['env'], c['url']): c for c in history.changed_since(first)}
+    assert set(since_first) == {('prod', 'https://prod/new'), ('stage', 'https://stage/a')}
+    assert since_first[('prod', 'https://prod/new')]['status'] == 'new'
+    assert since_first[('stage', 'https://stage/a')]['changes']['h1_total']['difference'] == -1
+
+    since_second = {c['url']: c for c in history.changed_since(second, '101')}
+    assert set(since_second) == {'https://prod/b', 'https://prod/new'}
+    assert since_second['https://prod/b']['error'] == {'previous': 'timeout', 'current': None}
+    assert history.changed_since(second, 'МОЛ') == []
+    history.close()
+
+
+def test_run_history_keeps_prod_and_stage_with_identical_urls(tmp_path):
+    from run_history import RunHistory
+
+    history = RunHistory(str(tmp_path / 'history.sqlite3'))
+    first = history.start_run(['101'])
+    history.record_pages(first, '101', 'prod', [_page('/catalog', 1)])
+    history.record_pages(first, '101', 'stage', [_page('/catalog', 2)])
+    assert history.connection.execute('SELECT COUNT(*) FROM page_metrics').fetchone()[0] == 2
+
+    second = history.start_run(['101'])
+    history.record_pages(second, '101', 'prod', [_page('/catalog', 1)])
+    history.record_pages(second, '101', 'stage', [_page('/catalog', 3)])
+    assert history.compare_with_previous(second, '101', 'prod', [_page('/catalog', 1)])[0]['status'] == 'unchanged'
+    stage = history.compare_with_previous(second, '101', 'stage', [_page('/catalog', 3)])[0]
+    assert stage['changes']['h1_total'] == {'previous': 2, 'current': 3, 'difference': 1}
+
+    changes = history.changed_since(first)
+    assert [(c['env'], c['url'], c['status']) for c in changes] == [('stage', '/catalog', 'changed')]
+    assert changes[0]['changes']['h1_total']['previous'] == 2
+    history.close()
+
+
+def test_run_history_migrates_key_without_env(tmp_path):
+    import sqlite3
+    from result_types import METRIC_FIELDS
+    from run_history import RunHistory
+
+    path = str(tmp_path / 'history.sqlite3')
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        'CREATE TABLE runs (run_id INTEGER PRIMARY KEY AUTOINCREMENT, run_ts TEXT NOT NULL, sites TEXT NOT NULL);'
+        'CREATE TABLE page_metrics (site TEXT NOT NULL, url TEXT NOT NULL, run_ts TEXT NOT NULL, '
+        'run_id INTEGER NOT NULL, env TEXT NOT NULL, error TEXT, '
+        + ', '.join(f'{name} INTEGER NOT NULL DEFAULT 0' for name in METRIC_FIELDS)
+        + ', PRIMARY KEY (site, url, run_ts));'
+        "INSERT INTO runs (run_ts, sites) VALUES ('2024-01-01T00:00:00', '101');"
+        "INSERT INTO page_metrics (site, url, run_ts, run_id, env, h1_total) "
+        "VALUES ('101', '/a', '2024-01-01T00:00:00', 1, 'prod', 5);"
+    )
+    connection.commit()
+    connection.close()
+
+    history = RunHistory(path)
+    second = history.start_run(['101'])
+    history.record_pages(second, '101', 'prod', [_page('/a', 5)])
+    history.record_pages(second, '101', 'stage', [_page('/a', 5)])
+    assert history.previous_pages(second, '101', 'prod', ['/a'])['/a'].counts[0] == 5
+    assert history.connection.execute('SELECT COUNT(*) FROM page_metrics').fetchone()[0] == 3
+    history.close()
@@ -0,0 +1,117 @@
+def _page(url, h1=0, error=None):
+    from result_types import PageMetrics
+
+    return PageMetrics.from_result({'url': url, 'error': error, 'headings': {'h1_non_empty': h1}, 'seo': {}})
+
+
+def test_journal_resumes_same_run_and_ignores_torn_tail(tmp_path):
+    from run_journal import RunJournal
+    from result_types import METRIC_INDEX
+
+    path = str(tmp_path / 'checkpoint.jsonl')
+    journal = RunJournal(path)
+    assert journal.start('sig') == {}
+    journal.record('101', _page('https://prod/0', h1=2), _page('https://stage/0', error='timeout'), 0.5)
+    journal.close()
+    # Прогон упал посреди записи строки
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"site": "101", "pro')
+
+    done = RunJournal(path).start('sig', resume=True)
+    prod, stage, pair_time = done[('101', 'https://prod/0', 'https://stage/0')]
+    assert prod.counts[METRIC_INDEX['h1_non_empty']] == 2 and stage.error == 'timeout' and pair_time == 0.5
+    assert len(done) == 1
+
+
+def test_journal_survives_crash_while_rewriting(tmp_path, monkeypatch):
+    import pytest
+    from run_journal import RunJournal
+
+    path = str(tmp_path / 'checkpoint.jsonl')
+    journal = RunJournal(path)
+    journal.start('sig')
+    for i in range(3):
+        journal.record('101', _page(f'https://prod/{i}'), _page(f'https://stage/{i}'), 0.1)
+    journal.close()
+
+    # Падение посреди переноса готовых пар: старый журнал остаётся целым
+    def crash(*args):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(RunJournal, 'write_pair', crash)
+    with pytest.raises(KeyboardInterrupt):
+        RunJournal(path).start('sig', resume=True)
+    monkeypatch.undo()
+    assert len(RunJournal(path).load('sig')) == 3
+
+    # После перезаписи новые пары дописываются в конец
+    journal = RunJournal(path)
+    assert len(journal.start('sig', resume=True)) == 3
+    journal.record('101', _page('https://prod/3'), _page('https://stage/3'), 0.1)
+    journal.close()
+    assert len(RunJournal(path).load('sig')) == 4
+
+
+def test_journal_restarts_for_other_run_or_without_resume(tmp_path):
+    from run_journal import RunJournal
+
+    path = str(tmp_path / 'checkpoint.jsonl')
+    journal = RunJournal(path)
+    journal.start('sig')
+    journal.record('101', _page('https://prod/0'), _page('https://stage/0'), 0.1)
+    journal.close()
+
+    assert RunJournal(path).load('other') == {}
+    journal = RunJournal(path)
+    assert journal.start('sig') == {}
+    journal.complete()
+    import os
+    assert not os.path.exists(path)
+
+
+def test_run_sites_resume_skips_pairs_from_journal(monkeypatch, tmp_path):
+    import multi_site_analyzer as mod
+    from run_journal import RunJournal, run_signature
+
+    analyzed = []
+
+    class DummyBot:
+        bot_token = 'token'
+        chat_id = 'chat'
+        def send_message(self, message):
+            pass
+
+    def fake_analyze(url, **kwargs):
+        analyzed.append(url)
+        return {'url': url, 'status': 'success', 'error': None, 'headings': {'h1_non_empty': 1}, 'seo': {}}
+
+    monkeypatch.setattr(mod, 'TelegramBot', DummyBot)
+    monkeypatch.setattr(mod, 'analyze_url', fake_analyze)
+    monkeypatch.setattr(mod, 'load_site_urls', lambda site: (site['prod'], site['stage']))
+
+    path = str(tmp_path / 'checkpoint.jsonl')
+    site = {'prod': [f'https://prod/{i}' for i in range(3)], 'stage': [f'https://stage/{i}' for i in range(3)]}
+    results_dir = tmp_path / 'results'
+    config = {'default_settings': {'upload_to_sheets': False, 'checkpoint_file': path, 'save_local': True,
+                                   'results_dir': str(results_dir), 'local_format': 'jsonl'},
+              'sites': {'a': site}}
+
+    # Прерванный прогон успел проверить вторую пару
+    journal = RunJournal(path)
+    journal.start(run_signature({'a': (site['prod'], site['stage'])}, 'html.parser'))
+    journal.record('a', _page('https://prod/1', h1=5), _page('https://stage/1'), 0.2)
+    journal.close()
+
+    results = mod.run_sites(config=config, parser='html.parser', resume=True)
+
+    assert sorted(analyzed) == ['https://prod/0', 'https://prod/2', 'https://stage/0', 'https://stage/2']
+    assert [r['prod_url'] for r in results['a']] == site['prod']
+    assert results['a'][1]['h1_diff'] == -5 and results['a'][1].pair_time == 0.2
+    # Прогон завершён — журнал удалён
+    import os
+    assert not os.path.exists(path)
+    # В файл нового прогона попали и пары, восстановленные из журнала
+    import json
+    rows = [json.loads(line) for sink_file in results_dir.rglob('*.jsonl')
+            for line in sink_file.read_text(encoding='utf-8').splitlines()]
+    assert sorted(row['prod_url'] for row in rows if 'prod_url' in row) == site['prod']
@@ -0,0 +1,114 @@
+from unittest.mock import Mock
+
+
+HEADER = ['Дата', 'URL', 'H1', 'H2']
+
+
+def _grid(date, h1s):
+    return [HEADER] + [[date, f'https://x/{i}', h1, 0] for i, h1 in enumerate(h1s)]
+
+
+def test_incremental_writer_sends_only_changed_ranges(tmp_path):
+    from sheet_writer import IncrementalSheetWriter
+
+    sheets = Mock()
+    path = str(tmp_path / 'mirror.json')
+    writer = IncrementalSheetWriter(sheets, 'sheet-id', path)
+    writer.write('101', _grid('d1', [1, 1, 1]))
+    writer.flush()
+    sheets.batch_update_values.assert_called_once_with(
+        'sheet-id', [{'range': '101!A1', 'values': _grid('d1', [1, 1, 1])}])
+    sheets.batch_update_values.reset_mock()
+
+    # Новый процесс читает зеркало с диска: меняется дата во всех строках и H1 во второй
+    writer = IncrementalSheetWriter(sheets, 'sheet-id', path)
+    writer.write('101', _grid('d2', [1, 2, 1]))
+    writer.flush()
+    sheets.batch_update_values.assert_called_once_with('sheet-id', [
+        {'range': '101!A2:A4', 'values': [['d2'], ['d2'], ['d2']]},
+        {'range': '101!C3:C3', 'values': [[2]]},
+    ])
+    stats = writer.stats()
+    assert (stats['full_rewrites'], stats['incremental_writes'], stats['cells_sent']) == (0, 1, 4)
+
+    sheets.batch_update_values.reset_mock()
+    writer.write('101', _grid('d2', [1, 2, 1]))
+    writer.flush()
+    sheets.batch_update_values.assert_not_called()
+
+
+def test_incremental_writer_clears_removed_rows_and_rewrites_on_layout_change(tmp_path):
+    from sheet_writer import IncrementalSheetWriter
+
+    sheets = Mock()
+    writer = IncrementalSheetWriter(sheets, 'sheet-id', str(tmp_path / 'mirror.json'))
+    writer.write('101', _grid('d1', [1, 1]))
+    writer.flush()
+    writer.write('101', _grid('d1', [1]))
+    writer.flush()
+    assert sheets.batch_update_values.call_args.args == ('sheet-id', [
+        {'range': '101!A3:D3', 'values': [['', '', '', '']]},
+    ])
+
+    # Новый столбец — раскладка другая, лист переписывается целиком
+    wider = [row + ['x'] for row in _grid('d1', [1])]
+    writer.write('101', wider)
+    writer.flush()
+    assert sheets.batch_update_values.call_args.args == ('sheet-id', [{'range': '101!A1', 'values': wider}])
+    assert writer.stats()['full_rewrites'] == 2
+
+
+def test_incremental_writer_forgets_mirror_after_failed_write(tmp_path):
+    from sheet_writer import IncrementalSheetWriter
+
+    sheets = Mock()
+    sheets.batch_update_values.return_value = None
+    writer = IncrementalSheetWriter(sheets, 'sheet-id', str(tmp_path / 'mirror.json'))
+    writer.write('101', _grid('d1', [1]))
+    writer.flush()
+    assert writer.mirror == {} and writer.stats()['failed_sheets'] == 1
+
+
+def test_writer_coalesces_sheets_into_batches_by_cell_budget(tmp_path):
+    from sheet_writer import IncrementalSheetWriter
+
+    sheets = Mock()
+    writer = IncrementalSheetWriter(sheets, 'sheet-id', None, max_cells_per_request=20)
+    for name in ('101', 'МОЛ', 'ПОЛ'):
+        writer.write(name, _grid('d1', [1, 1]))  # по 12 ячеек
+    writer.flush()
+    ranges = [[block['range'] for block in call.args[1]] for call in sheets.batch_update_values.call_args_list]
+    assert ranges == [['101!A1'], ['МОЛ!A1'], ['ПОЛ!A1']]
+
+    writer = IncrementalSheetWriter(sheets, 'sheet-id', None)
+    for name in ('101', 'МОЛ', 'ПОЛ'):
+        writer.write(name, _grid('d1', [1, 1]))
+    writer.flush()
+    assert len(sheets.batch_update_values.call_args.args[1]) == 3
+    assert writer.stats()['batch_requests'] == 1
+
+
+def test_column_letter():
+    from sheet_writer import column_letter
+
+    assert [column_letter(i) for i in (0, 25, 26, 37, 701, 702)] == ['A', 'Z', 'AA', 'AL', 'ZZ', 'AAA']
+
+
+def test_incremental_writer_clears_emptied_cells_and_narrowed_columns(tmp_path):
+    from sheet_writer import IncrementalSheetWriter
+
+    sheets = Mock()
+    writer = IncrementalSheetWriter(sheets, 'sheet-id', str(tmp_path / 'mirror.json'))
+    writer.write('101', [HEADER, ['d1', 'https://x/0', 'ошибка', 0]])
+    writer.flush()
+    # Ячейка с ошибкой опустела: на лист уходит '', а не null, который batchUpdate пропустил бы
+    writer.write('101', [HEADER, ['d1', 'https://x/0', None, 0]])
+    writer.flush()
+    assert sheets.batch_update_values.call_args.args == ('sheet-id', [{'range': '101!C2:C2', 'values': [['']]}])
+
+    # Раскладка стала уже: старые столбцы C и D затираются
+    writer.write('101', [['Дата', 'URL'], ['d1', 'https://x/0']])
+    writer.flush()
+    assert sheets.batch_update_values.call_args.args == ('sheet-id', [
+        {'range': '101!A1', 'values': [['Дата', 'URL', '', ''], ['d1', 'https://x/0', '', '']]},
+    ])
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+
+INFO = {'client_email': 'bot@example.iam.gserviceaccount.com', 'private_key_id': 'key-1'}
+
+
+class FakeCredentials:
+    refreshes = 0
+
+    def __init__(self):
+        self.token = None
+        self.expiry = None
+
+    def refresh(self, request):
+        FakeCredentials.refreshes += 1
+        self.token = f'token-{FakeCredentials.refreshes}'
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+
+def test_sheets_service_is_built_once_and_token_reused_across_processes(monkeypatch, tmp_path):
+    import sheets_client
+
+    FakeCredentials.refreshes = 0
+    monkeypatch.setattr(sheets_client.service_account.Credentials, 'from_service_account_info',
+                        lambda info, scopes: FakeCredentials())
+    token_file = str(tmp_path / 'token.json')
+    sheets_client.reset_sheets_clients()
+
+    first = sheets_client.get_sheets_service(INFO, token_file)
+    assert sheets_client.get_sheets_service(INFO, token_file) is first
+    assert FakeCredentials.refreshes == 1
+    assert hasattr(first, 'spreadsheets')
+
+    # «Новый процесс»: клиента в памяти нет, но токен из файла ещё действует
+    sheets_client.reset_sheets_clients()
+    second = sheets_client.get_sheets_service(INFO, token_file)
+    assert second is not first and FakeCredentials.refreshes == 1
+    assert second._http.credentials.token == 'token-1'
+    sheets_client.reset_sheets_clients()
+
+
+def test_token_cache_ignores_tokens_about_to_expire(tmp_path):
+    from sheets_client import TokenFileCache
+
+    cache = TokenFileCache(str(tmp_path / 'token.json'))
+    credentials = FakeCredentials()
+    credentials.token = 'old'
+    credentials.expiry = datetime.utcnow() + timedelta(minutes=1)
+    cache.save('key', credentials)
+    assert not cache.load('key', FakeCredentials())
+
+
+def test_token_cache_file_is_private_from_the_start(tmp_path, monkeypatch):
+    import os
+    import stat
+    import result_cache
+    from sheets_client import TokenFileCache
+
+    path = tmp_path / 'token.json'
+    # Временный файл от прошлого запуска с широкими правами не должен их сохранить
+    (tmp_path / 'token.json.tmp').write_text('')
+    os.chmod(tmp_path / 'token.json.tmp', 0o644)
+    modes = []
+    real_replace = os.replace
+
+    def replace(src, dst):
+        modes.append(stat.S_IMODE(os.stat(src).st_mode))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(result_cache.os, 'replace', replace)
+    credentials = FakeCredentials()
+    credentials.token = 'secret'
+    credentials.expiry = datetime.utcnow() + timedelta(hours=1)
+    TokenFileCache(str(path)).save('key', credentials)
+    assert modes == [0o600]
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_token_cache_treats_corrupt_entries_as_miss(tmp_path):
+    import json
+    from sheets_client import TokenFileCache
+
+    path = tmp_path / 'token.json'
+    cache = TokenFileCache(str(path))
+    for entry in ({'token': 'x'}, {'token': 'x', 'expiry': 'завтра'}, {'token': 'x', 'expiry': 5},
+                  {'expiry': (datetime.utcnow() + timedelta(hours=1)).isoformat()}, 'мусор'):
+        path.write_text(json.dumps({'key': entry}), encoding='utf-8')
+        assert not cache.load('key', FakeCredentials())
+    path.write_text('[1, 2', encoding='utf-8')
+    assert not cache.load('key', FakeCredentials())
+    path.write_text('[]', encoding='utf-8')
+    assert not cache.load('key', FakeCredentials())
+
+    # После промаха токен получается заново и сохраняется поверх испорченной записи
+    credentials = FakeCredentials()
+    credentials.refresh(None)
+    cache.save('key', credentials)
+    assert cache.load('key', FakeCredentials())
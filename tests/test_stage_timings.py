@@ -0,0 +1,27 @@
+def test_timer_collects_records_only_while_active():
+    from stage_timings import StageTimer, record
+
+    timer = StageTimer()
+    record('connect', 1.0)
+    with timer.active():
+        record('connect', 0.25)
+        with timer.stage('parse'):
+            pass
+    record('connect', 1.0)
+    assert timer.get('connect') == 0.25 and timer.get('parse') >= 0
+    assert timer.as_dict()['connect'] == 0.25
+
+
+def test_timing_summary_percentiles_and_page_metrics_roundtrip():
+    from result_types import PageMetrics
+    from stage_timings import TimingSummary, TIMING_STAGES
+
+    summary = TimingSummary()
+    for i in range(1, 21):
+        page = PageMetrics.from_result({'url': f'https://x/{i}', 'timings': {'parse': i / 100}})
+        summary.add(page.timings)
+    summary.add(PageMetrics('https://x/cached').timings)
+
+    parse = summary.summary()['parse']
+    assert summary.pages == 20 and set(summary.summary()) == set(TIMING_STAGES)
+    assert parse == {'total': 2.1, 'p50': 0.1, 'p95': 0.19, 'max': 0.2}
@@ -0,0 +1,123 @@
+from unittest.mock import Mock
+
+
+def test_split_html_message_keeps_chunks_short_and_tags_balanced():
+    from telegram_bot import split_html_message
+
+    lines = [f"- <a href='https://x/{i}'>Prod</a> / <a href='https://y/{i}'>Stage</a> &amp;" for i in range(300)]
+    message = '<b>Отчёт</b>\n' + '\n'.join(lines) + '\n<i>' + 'я' * 9000 + '</i>'
+    chunks = split_html_message(message)
+    assert len(chunks) > 3
+    for chunk in chunks:
+        assert len(chunk) <= 4096
+        assert chunk.count('<a ') == chunk.count('</a>') and chunk.count('<i>') == chunk.count('</i>')
+    # Текст не теряется: без тегов на стыках части склеиваются в исходный текст
+    assert ''.join(chunks).replace('</i><i>', '').replace('\n', '') == message.replace('\n', '')
+    assert split_html_message('short') == ['short']
+
+
+def test_bot_backs_off_with_jitter_on_server_errors(monkeypatch):
+    import telegram_bot
+
+    sleeps = []
+    monkeypatch.setattr(telegram_bot.time, 'sleep', sleeps.append)
+    bot = telegram_bot.TelegramBot('token', 'chat', max_retries=2)
+    bot.session = Mock()
+    bot.session.post.return_value = Mock(status_code=502, json=Mock(return_value={}))
+    assert bot.call('sendMessage', {}) is None
+    # Задержки RetryPolicy: случайные в пределах base * 2 ** попытка
+    assert len(sleeps) == 2 and 0 <= sleeps[0] <= 1 and 0 <= sleeps[1] <= 2
+
+
+def test_bot_reuses_session_and_honors_retry_after(monkeypatch):
+    import telegram_bot
+
+    sleeps = []
+    monkeypatch.setattr(telegram_bot.time, 'sleep', sleeps.append)
+    bot = telegram_bot.TelegramBot('token', 'chat')
+    bot.session = Mock()
+    bot.session.post.side_effect = [
+        Mock(status_code=429, json=Mock(return_value={'ok': False, 'parameters': {'retry_after': 7}})),
+        Mock(status_code=200, json=Mock(return_value={'ok': True, 'result': {}})),
+        Mock(status_code=200, json=Mock(return_value={'ok': True, 'result': {}})),
+    ]
+    assert bot.send_message('\n'.join(['<b>строка</b> отчёта'] * 300))
+    assert sleeps == [7]
+    texts = [call.kwargs['data']['text'] for call in bot.session.post.call_args_list]
+    assert len(texts) == 3 and texts[1] == texts[0] and all(len(t) <= 4096 for t in texts)
+
+    bot.session.post.side_effect = None
+    bot.session.post.return_value = Mock(status_code=400, json=Mock(return_value={'ok': False, 'description': 'bad'}))
+    assert not bot.send_message('x')
+
+
+def test_report_attaches_compressed_csv_for_large_diff_sets():
+    import csv
+    import gzip
+    import io
+    from multi_site_analyzer import send_telegram_report, SHEET_HEADER
+    from result_types import PageMetrics, PairResult
+
+    pairs = [
+        PairResult.from_pages(
+            PageMetrics.from_result({'url': f'https://prod/{i}?a=1&b=<2>', 'error': None,
+                                     'headings': {'h1_non_empty': 1}, 'seo': {}}),
+            PageMetrics(f'https://stage/{i}'))
+        for i in range(15)
+    ]
+    bot = Mock(bot_token='t', chat_id='c')
+    send_telegram_report(pairs, 'Сайт 101', bot=bot)
+
+    message = bot.send_message.call_args.args[0]
+    assert 'полный список во вложении' in message and '&lt;2&gt;' in message
+    filename, content, caption = bot.send_document.call_args.args
+    assert filename.startswith('Сайт_101_') and filename.endswith('.csv.gz')
+    rows = list(csv.reader(io.StringIO(gzip.decompress(content).decode('utf-8'))))
+    assert rows[0] == SHEET_HEADER and len(rows) == 16
+
+    bot = Mock(bot_token='t', chat_id='c')
+    send_telegram_report(pairs[:3], 'Сайт 101', bot=bot)
+    bot.send_document.assert_not_called()
+
+
+def test_split_html_message_accounts_for_long_reopened_tags():
+    from telegram_bot import split_html_message
+
+    href = 'https://example.com/' + 'q' * 300
+    # Ссылка открыта через все строки: на каждом стыке её тег открывается заново
+    message = f'<b><a href="{href}">' + '\n'.join(['я' * 4000] * 3 + ['ю' * 9000]) + '</a></b>'
+    chunks = split_html_message(message)
+    for chunk in chunks:
+        assert len(chunk) <= 4096
+        assert chunk.startswith(f'<b><a href="{href}">') and chunk.endswith('</a></b>')
+    assert ''.join(chunks).replace(f'</a></b><b><a href="{href}">', '').replace('\n', '') == \
+        message.replace('\n', '')
+
+
+def test_bot_waits_full_flood_control_retry_after(monkeypatch):
+    import telegram_bot
+
+    sleeps = []
+    monkeypatch.setattr(telegram_bot.time, 'sleep', sleeps.append)
+    bot = telegram_bot.TelegramBot('token', 'chat')
+    bot.session = Mock()
+    bot.session.post.side_effect = [
+        Mock(status_code=429, json=Mock(return_value={'ok': False, 'parameters': {'retry_after': 300}})),
+        Mock(status_code=200, json=Mock(return_value={'ok': True, 'result': {}})),
+    ]
+    # Ожидание дольше BACKOFF_MAX не укорачивается
+    assert bot.call('sendMessage', {}) == {}
+    assert sleeps == [300.0]
+
+
+def test_send_document_trims_html_caption_at_tag_boundary():
+    import telegram_bot
+
+    bot = telegram_bot.TelegramBot('token', 'chat')
+    bot.session = Mock()
+    bot.session.post.return_value = Mock(status_code=200, json=Mock(return_value={'ok': True, 'result': {}}))
+    caption = '<b>Отчёт</b>\n' + 'я' * 1000 + ' <a href="https://example.com/report">ссылка &amp; ещё</a>'
+    assert bot.send_document('report.csv.gz', b'data', caption)
+    sent = bot.session.post.call_args.kwargs['data']['caption']
+    assert len(sent) <= 1024 and sent.startswith('<b>Отчёт</b>')
+    assert sent.count('<a ') == sent.count('</a>') and '&amp' not in sent.replace('&amp;', '')